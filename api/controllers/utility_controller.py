@@ -1,13 +1,39 @@
 """Utility controller for business logic"""
 
-from typing import List, Optional
+import asyncio
+import uuid
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+from sqlalchemy import not_, or_
 from sqlalchemy.orm import Session
+from ingest.restrooms import IMPORT_SOURCES, UTILITY_DATASET
 from models.utility import Utility
+from models.spatial import filter_bbox, postgis_enabled, query_postgis_nearby
 from schemas.utility import UtilityCreate, UtilityUpdate
+from services.delta_sync import WatermarkStore
+from services.location_service import LocationService, limit_results, rank_by_distance
+from services.spatial_index import bounding_box, point_in_bbox
+from utils.exceptions import UnauthorizedError
+
+# Upper bound for the expanding nearest-neighbour search on non-PostGIS databases
+MAX_NEAREST_RADIUS_KM = 20000.0
+# IDs of rows loaded by the OSM/Refuge importers, which own those rows
+IMPORTED_ID_PREFIXES = tuple(f"{source}_" for source in IMPORT_SOURCES)
+# Watermark source user writes are recorded under (dataset UTILITY_DATASET),
+# which tells other API workers to re-index
+USER_SOURCE = "user"
 
 class UtilityController:
     """Controller for utility-related operations"""
     
+    def __init__(
+        self,
+        location_service: Optional[LocationService] = None,
+        watermarks: Optional[WatermarkStore] = None
+    ):
+        self.location_service = location_service or LocationService()
+        self.watermarks = watermarks
+    
     async def search_utilities(
         self, 
         db: Session, 
@@ -18,35 +44,223 @@ class UtilityController:
         limit: int
     ) -> List[dict]:
         """Search utilities based on query and location"""
-        # Mock implementation
+        pattern = f"%{query}%"
+        matching = db.query(Utility).filter(
+            or_(
+                Utility.name.ilike(pattern),
+                Utility.description.ilike(pattern),
+                Utility.category.ilike(pattern)
+            )
+        )
+        
+        if postgis_enabled(db):
+            return self._with_distances(
+                query_postgis_nearby(matching, Utility, latitude, longitude, radius, limit)
+            )
+        
+        candidates = filter_bbox(
+            matching, Utility, *bounding_box(latitude, longitude, radius)
+        )
+        return rank_by_distance(
+            latitude, longitude, [u.to_dict() for u in candidates], radius, limit
+        )
+    
+    async def get_nearby_utilities(
+        self, 
+        db: Session, 
+        latitude: float, 
+        longitude: float, 
+        radius: float, 
+        category: Optional[str], 
+        limit: int
+    ) -> List[dict]:
+        """Get utilities within radius straight from the database spatial index"""
+        utilities = db.query(Utility)
+        if category:
+            utilities = utilities.filter(Utility.category == category)
+        
+        if postgis_enabled(db):
+            return self._with_distances(
+                query_postgis_nearby(utilities, Utility, latitude, longitude, radius, limit)
+            )
+        
+        candidates = filter_bbox(
+            utilities, Utility, *bounding_box(latitude, longitude, radius)
+        )
+        return rank_by_distance(
+            latitude, longitude, [u.to_dict() for u in candidates], radius, limit
+        )
+    
+    async def get_utilities_in_bbox(
+        self, 
+        db: Session, 
+        min_lat: float, 
+        min_lon: float, 
+        max_lat: float, 
+        max_lon: float, 
+        category: Optional[str], 
+        limit: int, 
+        latitude: Optional[float] = None, 
+        longitude: Optional[float] = None
+    ) -> Tuple[List[dict], bool]:
+        """Get utilities inside a viewport from the database spatial index"""
+        utilities = self._query_bbox(db, min_lat, min_lon, max_lat, max_lon, category)
+        
+        # Without a sort origin any `limit` rows will do, so let the database stop early
+        if (latitude is None or longitude is None) and min_lon <= max_lon:
+            utilities = utilities.limit(limit + 1)
+        
+        records = [
+            u.to_dict() for u in utilities
+            if point_in_bbox(u.latitude, u.longitude, min_lat, min_lon, max_lat, max_lon)
+        ]
+        return limit_results(records, limit, latitude, longitude)
+    
+    async def get_nearest_utilities(
+        self, 
+        db: Session, 
+        latitude: float, 
+        longitude: float, 
+        k: int, 
+        category: Optional[str]
+    ) -> List[dict]:
+        """Get the k closest utilities straight from the database spatial index"""
+        utilities = db.query(Utility)
+        if category:
+            utilities = utilities.filter(Utility.category == category)
+        
+        if postgis_enabled(db):
+            return self._with_distances(
+                query_postgis_nearby(utilities, Utility, latitude, longitude, None, k)
+            )
+        
+        # Without KNN support, widen a bounding-box search until it holds k hits
+        radius = 1.0
+        while True:
+            candidates = filter_bbox(
+                utilities, Utility, *bounding_box(latitude, longitude, radius)
+            )
+            nearest = rank_by_distance(
+                latitude, longitude, [u.to_dict() for u in candidates], radius, k
+            )
+            if len(nearest) >= k or radius >= MAX_NEAREST_RADIUS_KM:
+                return nearest
+            radius *= 4
+    
+    def utilities_in_bbox(
+        self, 
+        db: Session, 
+        min_lat: float, 
+        min_lon: float, 
+        max_lat: float, 
+        max_lon: float, 
+        category: Optional[str] = None
+    ) -> List[dict]:
+        """Bounding-box candidates from the database spatial index (synchronous)"""
+        return [
+            u.to_dict()
+            for u in self._query_bbox(db, min_lat, min_lon, max_lat, max_lon, category)
+        ]
+    
+    def _query_bbox(self, db: Session, min_lat, min_lon, max_lat, max_lon, category):
+        utilities = filter_bbox(db.query(Utility), Utility, min_lat, min_lon, max_lat, max_lon)
+        if category:
+            utilities = utilities.filter(Utility.category == category)
+        return utilities
+    
+    def _with_distances(self, rows) -> List[dict]:
+        """Serialize (utility, distance_km) rows returned by the database"""
         return [
-            {
-                "id": "mock_1",
-                "name": f"Mock utility for query: {query}",
-                "category": "public_restroom",
-                "latitude": latitude + 0.001,
-                "longitude": longitude + 0.001,
-                "distance_km": 0.1
-            }
+            {**utility.to_dict(), "distance_km": round(distance_km, 2)}
+            for utility, distance_km in rows
         ]
     
+    async def create_utility(
+        self, 
+        db: Session, 
+        utility_data: UtilityCreate, 
+        user_id: Optional[int] = None
+    ) -> dict:
+        """Create utility and add it to the spatial index"""
+        utility = Utility(id=uuid.uuid4().hex, created_by=user_id, **utility_data.model_dump())
+        db.add(utility)
+        db.commit()
+        db.refresh(utility)
+        
+        self.location_service.index_utility(utility)
+        await self._publish_change(db, inserted=1)
+        return utility.to_dict()
+    
     async def update_utility(
         self, 
         db: Session, 
         utility_id: str, 
         utility_data: UtilityUpdate, 
-        user_id: int
+        user_id: Optional[int]
     ) -> Optional[dict]:
-        """Update utility"""
-        # Mock implementation
-        return None
+        """Update a utility the user created and refresh its spatial index entry"""
+        utility = self._owned_utility(db, utility_id, user_id)
+        if not utility:
+            return None
+        
+        for field, value in utility_data.model_dump(exclude_unset=True).items():
+            setattr(utility, field, value)
+        db.commit()
+        db.refresh(utility)
+        
+        self.location_service.index_utility(utility)
+        await self._publish_change(db, updated=1)
+        return utility.to_dict()
     
     async def delete_utility(
         self, 
         db: Session, 
         utility_id: str, 
-        user_id: int
+        user_id: Optional[int]
     ) -> bool:
-        """Delete utility"""
-        # Mock implementation
-        return False 
\ No newline at end of file
+        """Delete a utility the user created and drop it from the spatial index"""
+        utility = self._owned_utility(db, utility_id, user_id)
+        if not utility:
+            return False
+        
+        db.delete(utility)
+        db.commit()
+        
+        self.location_service.remove_utility(utility_id)
+        await self._publish_change(db, deleted=1)
+        return True
+    
+    async def _publish_change(self, db: Session, inserted: int = 0, updated: int = 0, deleted: int = 0):
+        """Bump the user-writes watermark so other workers re-index utilities"""
+        if self.watermarks is None:
+            return
+        submitted = db.query(Utility).filter(
+            not_(or_(*(Utility.id.startswith(prefix) for prefix in IMPORTED_ID_PREFIXES)))
+        ).count()
+        # synced_at only has second resolution; the watermark tells apart
+        # writes within the same second
+        await asyncio.to_thread(
+            self.watermarks.record_counts,
+            USER_SOURCE, UTILITY_DATASET, submitted, inserted, updated, deleted,
+            datetime.now(timezone.utc).isoformat(timespec="microseconds")
+        )
+    
+    def _owned_utility(self, db: Session, utility_id: str, user_id: Optional[int]) -> Optional[Utility]:
+        """
+        Load a utility for a change by its creator
+        
+        Returns:
+            The utility, or None if it does not exist
+        
+        Raises:
+            UnauthorizedError: The utility was imported (the next import
+                would overwrite any edit) or not submitted by this user
+        """
+        utility = db.query(Utility).filter(Utility.id == utility_id).first()
+        if not utility:
+            return None
+        if utility_id.startswith(IMPORTED_ID_PREFIXES):
+            raise UnauthorizedError(f"Utility {utility_id} is maintained by an import and cannot be changed")
+        if utility.created_by is None or utility.created_by != user_id:
+            raise UnauthorizedError(f"Utility {utility_id} can only be changed by the user who created it")
+        return utility
@@ -0,0 +1 @@
+"""Bulk data ingestion for UrbanAid API"""
@@ -0,0 +1,285 @@
+"""
+HRSA health center sites import
+Streams the Health Center Service Delivery and Look-Alike Sites workbook
+into the facilities table so HRSA queries are served locally. Imports are
+incremental: only new and changed sites are written, sites gone from the
+file are tombstoned, and only the affected cache entries are invalidated
+
+Usage (from the api directory):
+    python -m ingest.hrsa_xlsx path/to/Health_Center_Service_Delivery_and_Look-Alike_Sites_Data.xlsx
+    python -m ingest.hrsa_xlsx --download
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import re
+import tempfile
+import time
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from typing import Any, Callable, Dict, Iterator, List
+
+import httpx
+import openpyxl
+from sqlalchemy.orm import Session
+
+from models.database import SessionLocal, bulk_upsert, init_db
+from models.facility import Facility, facility_row
+from services.cache import TieredCache, TTLCache, redis_from_env
+from services.delta_sync import DatasetDelta, WatermarkStore, diff_records
+from services.hrsa_service import HRSAService
+
+logger = logging.getLogger(__name__)
+
+HRSA_XLSX_URL = (
+    "https://data.hrsa.gov/data/download/hrsa/"
+    "Health_Center_Service_Delivery_and_Look-Alike_Sites_Data.xlsx"
+)
+DEFAULT_BATCH_SIZE = 1000
+# Stay well under SQLite's bound parameter limit in IN (...) clauses
+DELETE_CHUNK_SIZE = 500
+
+# Workbook column (normalized) -> raw field name expected by HRSAService
+HEADER_ALIASES = {
+    "bphc_assigned_number": "site_id",
+    "geocoding_artifact_address_primary_y_coordinate": "latitude",
+    "geocoding_artifact_address_primary_x_coordinate": "longitude",
+    "site_telephone_number": "site_phone",
+    "health_center_type_description": "health_center_type",
+    "health_center_name": "grantee_name",
+    "complete_county_name": "county_name",
+    "state_name": "site_state_name",
+    "site_state_abbreviation": "site_state",
+    "data_warehouse_record_create_date": "last_updated_date",
+}
+
+
+@dataclass
+class ImportStats:
+    read: int = 0
+    imported: int = 0
+    skipped: int = 0
+    inserted: int = 0
+    updated: int = 0
+    removed: int = 0
+    seconds: float = 0.0
+    # States whose sites changed
+    states: List[str] = field(default_factory=list)
+
+
+def _row_summary(row: Dict[str, Any]) -> Dict[str, Any]:
+    """What the delta needs of a facilities row, without the full record"""
+    return {
+        "id": row["id"],
+        "state": row["state"],
+        "latitude": row["latitude"],
+        "longitude": row["longitude"],
+        "content_hash": row["content_hash"],
+        "last_updated": row["last_updated"],
+    }
+
+
+def normalize_header(header: Any) -> str:
+    """Lowercase a column header and collapse punctuation to underscores"""
+    return re.sub(r"[^a-z0-9]+", "_", str(header or "").strip().lower()).strip("_")
+
+
+def iter_sites(path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Stream raw site rows from the workbook
+
+    The workbook is opened read-only, so rows are parsed lazily and memory
+    stays flat regardless of the sheet size. Empty cells are left out so
+    HRSAService defaults apply.
+    """
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        keys = [HEADER_ALIASES.get(key, key) for key in map(normalize_header, header)]
+
+        for values in rows:
+            site = {}
+            for key, value in zip(keys, values):
+                if value is None or value == "":
+                    continue
+                if isinstance(value, (datetime, date)):
+                    value = value.isoformat()
+                elif isinstance(value, str):
+                    value = value.strip()
+                site[key] = value
+            if site:
+                yield site
+    finally:
+        workbook.close()
+
+
+def _load_existing(db: Session, source: str) -> Dict[str, Dict[str, Any]]:
+    """Summaries of a source's current rows by ID"""
+    columns = (
+        Facility.id, Facility.state, Facility.latitude, Facility.longitude,
+        Facility.content_hash, Facility.last_updated
+    )
+    return {
+        row.id: _row_summary(row._asdict())
+        for row in db.query(*columns).filter(Facility.source == source)
+    }
+
+
+def _delete(db: Session, ids: List[str]):
+    for start in range(0, len(ids), DELETE_CHUNK_SIZE):
+        db.query(Facility).filter(
+            Facility.id.in_(ids[start:start + DELETE_CHUNK_SIZE])
+        ).delete(synchronize_session=False)
+    db.commit()
+
+
+def _state_deltas(
+    existing: Dict[str, Dict[str, Any]],
+    incoming: Dict[str, Dict[str, Any]],
+    prune: bool
+) -> List[DatasetDelta]:
+    """Per-state inserts, updates and tombstones between two imports"""
+    by_state: Dict[Any, tuple] = {}
+    for facility_id, row in existing.items():
+        by_state.setdefault(row["state"], ({}, []))[0][facility_id] = row
+    for row in incoming.values():
+        by_state.setdefault(row["state"], ({}, []))[1].append(row)
+
+    deltas = []
+    for state, (previous, rows) in sorted(by_state.items(), key=lambda item: str(item[0])):
+        delta = diff_records(
+            "hrsa", state, previous, rows,
+            same=lambda old, new: old["content_hash"] == new["content_hash"],
+            tombstones=prune
+        )
+        # A site that moved state is an update in its new state, not a delete
+        delta.deleted = [row for row in delta.deleted if row["id"] not in incoming]
+        deltas.append(delta)
+    return deltas
+
+
+def import_hrsa_sites(
+    path: str,
+    session_factory: Callable[[], Session] = SessionLocal,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    prune: bool = True,
+    cache: TieredCache = None
+) -> ImportStats:
+    """
+    Sync the facilities table with every geocoded site in the HRSA workbook
+
+    Args:
+        path: Path to the downloaded xlsx file
+        session_factory: Database session factory
+        batch_size: Rows written per upsert batch
+        prune: Tombstone previously imported sites missing from this file
+        cache: Response cache to invalidate changed sites in (optional)
+
+    Returns:
+        Row counts and elapsed time
+    """
+    service = HRSAService(cache=cache)
+    stats = ImportStats()
+    started = time.perf_counter()
+
+    db = session_factory()
+    try:
+        existing = _load_existing(db, "hrsa")
+        incoming: Dict[str, Dict[str, Any]] = {}
+
+        def changed_rows() -> Iterator[Dict[str, Any]]:
+            for site in iter_sites(path):
+                stats.read += 1
+                if not site.get("site_id") or "latitude" not in site or "longitude" not in site:
+                    stats.skipped += 1
+                    continue
+                record = service._transform_hrsa_data(site)
+                if record is None:
+                    stats.skipped += 1
+                    continue
+                row = facility_row(record, "hrsa", site.get("site_state"))
+                # Later rows for the same site win
+                incoming[row["id"]] = _row_summary(row)
+                # Unchanged sites are not rewritten
+                if existing.get(row["id"], {}).get("content_hash") != row["content_hash"]:
+                    yield row
+
+        written = bulk_upsert(Facility, changed_rows(), bind=db.get_bind(), batch_size=batch_size)
+        logger.info(f"Processed {stats.read} rows, wrote {written} new or changed sites")
+
+        deltas = _state_deltas(existing, incoming, prune)
+        removed = [row["id"] for delta in deltas for row in delta.deleted]
+        if removed:
+            _delete(db, removed)
+    finally:
+        db.close()
+
+    stats.imported = len(incoming)
+    stats.inserted = sum(len(delta.inserted) for delta in deltas)
+    stats.updated = sum(len(delta.updated) for delta in deltas)
+    stats.removed = len(removed)
+    stats.states = sorted(delta.key for delta in deltas if delta.key and delta.changed)
+
+    watermarks = WatermarkStore(session_factory)
+    for delta in deltas:
+        if delta.key:
+            watermarks.record(delta, len(delta.inserted) + len(delta.updated) + delta.unchanged)
+
+    if cache is not None:
+        invalidated = asyncio.run(service.invalidate_cached(deltas))
+        logger.info(f"Invalidated {invalidated} cached HRSA responses")
+
+    stats.seconds = time.perf_counter() - started
+    logger.info(
+        f"HRSA import finished: {stats.imported} sites ({stats.inserted} new, "
+        f"{stats.updated} changed, {stats.removed} removed), {stats.skipped} skipped "
+        f"in {stats.seconds:.1f}s"
+    )
+    return stats
+
+
+def download_workbook(url: str = HRSA_XLSX_URL) -> str:
+    """Download the HRSA workbook to a temporary file and return its path"""
+    fd, path = tempfile.mkstemp(suffix=".xlsx")
+    with os.fdopen(fd, "wb") as f, httpx.stream("GET", url, timeout=120.0, follow_redirects=True) as response:
+        response.raise_for_status()
+        for chunk in response.iter_bytes():
+            f.write(chunk)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import HRSA health center sites")
+    parser.add_argument("path", nargs="?", help="Path to the HRSA sites xlsx file")
+    parser.add_argument("--download", action="store_true", help="Download the latest workbook from HRSA")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--no-prune", action="store_true", help="Keep sites missing from this file")
+    args = parser.parse_args()
+
+    if not args.path and not args.download:
+        parser.error("either a path or --download is required")
+
+    logging.basicConfig(level=logging.INFO)
+    init_db()
+
+    path = args.path or download_workbook()
+    try:
+        import_hrsa_sites(
+            path,
+            batch_size=args.batch_size,
+            prune=not args.no_prune,
+            # Drops affected entries from the Redis tier shared with the API
+            cache=TieredCache(TTLCache(), redis_from_env())
+        )
+    finally:
+        if not args.path:
+            os.unlink(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Synthetic HRSA and VA upstreams for exercising refreshes offline
+Responses are deterministic per state and page, follow the shape each
+service parses, and can be slowed down or made flaky to test concurrency
+and retries
+"""
+
+import asyncio
+import random
+from typing import Any, Dict, List
+
+import httpx
+
+# Rough bounding box of the US and territories used for synthetic coordinates
+MOCK_LAT_RANGE = (18.0, 64.0)
+MOCK_LON_RANGE = (-160.0, -66.0)
+
+
+def _rng(*parts: Any) -> random.Random:
+    return random.Random("|".join(str(part) for part in parts))
+
+
+def _hrsa_sites(state: str, count: int) -> List[Dict[str, Any]]:
+    rng = _rng("hrsa", state)
+    return [
+        {
+            "site_id": f"{state}{index:05d}",
+            "site_name": f"{state} Community Health Center {index}",
+            "latitude": rng.uniform(*MOCK_LAT_RANGE),
+            "longitude": rng.uniform(*MOCK_LON_RANGE),
+            "site_address": f"{100 + index} Main St",
+            "site_city": "Springfield",
+            "site_state_name": state,
+            "site_postal_code": f"{rng.randint(10000, 99999)}",
+            "health_center_type": "Community Health Center",
+            "primary_care": True,
+        }
+        for index in range(count)
+    ]
+
+
+def _va_facilities(state: str, facility_type: str, page: int, per_page: int, total: int) -> List[Dict[str, Any]]:
+    rng = _rng("va", state, facility_type, page)
+    first = (page - 1) * per_page
+    return [
+        {
+            "id": f"vha_{state}{index:04d}",
+            "type": "va_facilities",
+            "attributes": {
+                "name": f"{state} VA Clinic {index}",
+                "facility_type": f"va_{facility_type}_facility",
+                "lat": rng.uniform(*MOCK_LAT_RANGE),
+                "long": rng.uniform(*MOCK_LON_RANGE),
+                "address": {"physical": {"address_1": f"{index} Veterans Way", "state": state}},
+                "phone": {"main": "555-0100"},
+            },
+        }
+        for index in range(first, min(first + per_page, total))
+    ]
+
+
+class MockUpstream:
+    """
+    httpx transport handler serving synthetic HRSA and VA responses
+
+    Args:
+        hrsa_sites_per_state: Health centers returned per state
+        va_facilities_per_state: VA facilities per state and type (paged)
+        latency: Seconds each response is delayed
+        failure_rate: Fraction of requests answered with a 503
+        seed: Seed for latency jitter and injected failures
+    """
+
+    def __init__(
+        self,
+        hrsa_sites_per_state: int = 25,
+        va_facilities_per_state: int = 450,
+        latency: float = 0.05,
+        failure_rate: float = 0.0,
+        seed: int = 0
+    ):
+        self.hrsa_sites_per_state = hrsa_sites_per_state
+        self.va_facilities_per_state = va_facilities_per_state
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.requests = 0
+        self._random = random.Random(seed)
+
+    def transport(self) -> httpx.MockTransport:
+        return httpx.MockTransport(self.handle)
+
+    def client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(transport=self.transport(), timeout=30.0)
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency * (0.5 + self._random.random()))
+        if self._random.random() < self.failure_rate:
+            return httpx.Response(503, json={"error": "injected failure"})
+
+        params = request.url.params
+        state = params.get("state", "").upper()
+        if request.url.host == "data.hrsa.gov":
+            return httpx.Response(200, json={"data": _hrsa_sites(state, self.hrsa_sites_per_state)})
+
+        if request.url.host == "api.va.gov":
+            per_page = int(params.get("per_page", 200))
+            page = int(params.get("page", 1))
+            total = self.va_facilities_per_state
+            total_pages = max(1, -(-total // per_page))
+            return httpx.Response(200, json={
+                "data": _va_facilities(state, params.get("type", "health"), page, per_page, total),
+                "meta": {"pagination": {
+                    "current_page": page,
+                    "per_page": per_page,
+                    "total_pages": total_pages,
+                    "total_entries": total,
+                }},
+            })
+
+        return httpx.Response(404, json={"error": f"no mock for {request.url}"})
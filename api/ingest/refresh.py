@@ -0,0 +1,323 @@
+"""
+Nationwide federal facility refresh
+Fans per-source, per-state fetches out across every state, DC and the
+territories under a global concurrency cap and per-host caps
+
+Usage (from the api directory):
+    python -m ingest.refresh                       # every source and state
+    python -m ingest.refresh --sources va --states CA,NY
+    python -m ingest.refresh --mock                # synthetic upstreams
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+from services.cache import MISSING, TieredCache, TTLCache, redis_from_env
+from services.facility_store import FACILITY_SOURCES, FacilityStore
+from services.hrsa_service import HRSAService
+from services.usda_service import USDAService
+from services.va_service import VAService
+
+logger = logging.getLogger(__name__)
+
+STATE_CODES = (
+    "AL", "AK", "AZ", "AR", "CA", "CO", "CT", "DE", "FL", "GA",
+    "HI", "ID", "IL", "IN", "IA", "KS", "KY", "LA", "ME", "MD",
+    "MA", "MI", "MN", "MS", "MO", "MT", "NE", "NV", "NH", "NJ",
+    "NM", "NY", "NC", "ND", "OH", "OK", "OR", "PA", "RI", "SC",
+    "SD", "TN", "TX", "UT", "VT", "VA", "WA", "WV", "WI", "WY",
+    "DC",
+    # Territories
+    "AS", "GU", "MP", "PR", "VI",
+)
+
+REFRESH_CONCURRENCY = int(os.getenv("REFRESH_CONCURRENCY", "8"))
+REFRESH_TASK_TIMEOUT = float(os.getenv("REFRESH_TASK_TIMEOUT", "120"))
+# Concurrent state fetches allowed against each upstream host
+DEFAULT_HOST_LIMITS = {"data.hrsa.gov": 4, "api.va.gov": 4, "usda": 8}
+SOURCE_HOSTS = {"hrsa": "data.hrsa.gov", "va": "api.va.gov", "usda": "usda"}
+# Every type the /va-facilities endpoints accept, so each is precomputed
+DEFAULT_VA_TYPES = ("health", "benefits", "cemetery", "vet_center")
+# Matches the default of the /usda-facilities/state endpoint
+DEFAULT_USDA_TYPES = ("rural_development", "snap", "fsa")
+
+
+@dataclass
+class RefreshTask:
+    source: str
+    state: str
+    variant: str = ""
+    rows: int = 0
+    seconds: float = 0.0
+    error: Optional[str] = None
+
+    @property
+    def name(self) -> str:
+        return ":".join(part for part in (self.source, self.state, self.variant) if part)
+
+    @property
+    def dataset_key(self) -> str:
+        """Key of the FacilityStore dataset this task refreshes"""
+        return f"{self.state}:{self.variant}" if self.variant else self.state
+
+
+@dataclass
+class RefreshReport:
+    tasks: List[RefreshTask] = field(default_factory=list)
+    seconds: float = 0.0
+
+    @property
+    def rows(self) -> int:
+        return sum(task.rows for task in self.tasks)
+
+    @property
+    def failed(self) -> List[RefreshTask]:
+        return [task for task in self.tasks if task.error]
+
+    @property
+    def empty(self) -> List[RefreshTask]:
+        return [task for task in self.tasks if not task.error and not task.rows]
+
+    def summary(self) -> str:
+        slowest = max(self.tasks, key=lambda task: task.seconds, default=None)
+        text = (
+            f"{len(self.tasks)} tasks, {self.rows} rows in {self.seconds:.1f}s "
+            f"({len(self.failed)} failed, {len(self.empty)} empty)"
+        )
+        if slowest is not None:
+            text += f"; slowest {slowest.name} {slowest.seconds:.1f}s"
+        return text
+
+
+def plan_refresh(
+    sources: Sequence[str] = FACILITY_SOURCES,
+    states: Sequence[str] = STATE_CODES,
+    va_types: Sequence[str] = DEFAULT_VA_TYPES,
+    usda_types: Sequence[str] = DEFAULT_USDA_TYPES
+) -> List[RefreshTask]:
+    """List the tasks a refresh of these sources and states would run"""
+    tasks = []
+    for state in states:
+        state = state.upper()
+        if "hrsa" in sources:
+            tasks.append(RefreshTask("hrsa", state))
+        if "va" in sources:
+            tasks.extend(RefreshTask("va", state, facility_type) for facility_type in va_types)
+        if "usda" in sources:
+            tasks.append(RefreshTask("usda", state, ",".join(sorted(usda_types))))
+    return tasks
+
+
+class NationwideRefresher:
+    """
+    Refreshes every (source, state) dataset through the federal services
+
+    Each task calls the service's state method through ``refresh`` so the
+    upstream is always hit, then the service replaces the dataset in the
+    FacilityStore in one locked swap and the result overwrites the cached
+    entry. A failed or empty fetch leaves the previous data in place.
+
+    Args:
+        hrsa_service, va_service, usda_service: Services to refresh through
+        max_concurrency: Tasks running at once across all sources
+        host_limits: Tasks running at once per upstream host
+        task_timeout: Seconds before a single state fetch is abandoned
+        va_types: VA facility types refreshed per state
+        usda_types: USDA facility types refreshed per state
+    """
+
+    def __init__(
+        self,
+        hrsa_service: HRSAService,
+        va_service: VAService,
+        usda_service: USDAService,
+        max_concurrency: int = REFRESH_CONCURRENCY,
+        host_limits: Optional[Dict[str, int]] = None,
+        task_timeout: float = REFRESH_TASK_TIMEOUT,
+        va_types: Sequence[str] = DEFAULT_VA_TYPES,
+        usda_types: Sequence[str] = DEFAULT_USDA_TYPES
+    ):
+        self.hrsa_service = hrsa_service
+        self.va_service = va_service
+        self.usda_service = usda_service
+        self.max_concurrency = max_concurrency
+        self.host_limits = {**DEFAULT_HOST_LIMITS, **(host_limits or {})}
+        self.task_timeout = task_timeout
+        self.va_types = tuple(va_types)
+        self.usda_types = list(usda_types)
+        self.last_report: Optional[RefreshReport] = None
+
+    def plan(
+        self,
+        sources: Sequence[str] = FACILITY_SOURCES,
+        states: Sequence[str] = STATE_CODES
+    ) -> List[RefreshTask]:
+        """List the tasks a refresh of these sources and states would run"""
+        return plan_refresh(sources, states, self.va_types, self.usda_types)
+
+    def _method(self, task: RefreshTask) -> Tuple[Any, Any, Tuple[Any, ...]]:
+        """(service, cached state method, its arguments) behind a task"""
+        if task.source == "hrsa":
+            service = self.hrsa_service
+            return service, service.fetch_health_centers_by_state, (task.state,)
+        if task.source == "va":
+            service = self.va_service
+            return service, service.get_va_facilities_by_state, (task.state, task.variant)
+        service = self.usda_service
+        usda_types = task.variant.split(",") if task.variant else self.usda_types
+        return service, service.get_usda_facilities_by_state, (task.state, usda_types)
+
+    def _fetch(self, task: RefreshTask) -> Awaitable[List[Dict[str, Any]]]:
+        service, method, args = self._method(task)
+        return method.refresh(service, *args)
+
+    async def peek(self, task: RefreshTask, prefer_l2: bool = False) -> Optional[List[Dict[str, Any]]]:
+        """The cached result of a task's dataset, without calling upstream"""
+        service, method, args = self._method(task)
+        records = await method.peek(service, *args, prefer_l2=prefer_l2)
+        return None if records is MISSING else records
+
+    def restore(self, task: RefreshTask, records: List[Dict[str, Any]], age: float = 0.0):
+        """Load a task's dataset computed elsewhere into the store and cache"""
+        service, _, _ = self._method(task)
+        service.restore_dataset(task.dataset_key, records, age)
+
+    async def run(
+        self,
+        sources: Sequence[str] = FACILITY_SOURCES,
+        states: Sequence[str] = STATE_CODES,
+        on_task: Optional[Callable[[RefreshTask], None]] = None
+    ) -> RefreshReport:
+        """
+        Refresh every planned task and report per-task timing and row counts
+
+        Args:
+            sources: Sources to refresh
+            states: State codes to refresh
+            on_task: Called as each task finishes
+        """
+        return await self.run_tasks(self.plan(sources, states), on_task)
+
+    async def run_tasks(
+        self,
+        tasks: List[RefreshTask],
+        on_task: Optional[Callable[[RefreshTask], None]] = None
+    ) -> RefreshReport:
+        """Run planned tasks under the global and per-host caps"""
+        report = RefreshReport(tasks)
+        limit = asyncio.Semaphore(self.max_concurrency)
+        hosts = {host: asyncio.Semaphore(cap) for host, cap in self.host_limits.items()}
+        started = time.perf_counter()
+
+        async def run_task(task: RefreshTask):
+            host = hosts[SOURCE_HOSTS[task.source]]
+            # Take the host slot first so a saturated host does not hold
+            # global slots other sources could use
+            async with host, limit:
+                task_started = time.perf_counter()
+                try:
+                    records = await asyncio.wait_for(self._fetch(task), self.task_timeout)
+                    task.rows = len(records)
+                except asyncio.TimeoutError:
+                    task.error = f"timed out after {self.task_timeout:.0f}s"
+                except Exception as e:
+                    task.error = str(e) or type(e).__name__
+                task.seconds = time.perf_counter() - task_started
+
+            if task.error:
+                logger.warning(f"Refresh {task.name} failed: {task.error}")
+            else:
+                logger.debug(f"Refreshed {task.name}: {task.rows} rows in {task.seconds:.2f}s")
+            if on_task is not None:
+                on_task(task)
+
+        await asyncio.gather(*(run_task(task) for task in report.tasks))
+        report.seconds = time.perf_counter() - started
+        self.last_report = report
+        logger.info(f"Nationwide refresh finished: {report.summary()}")
+        return report
+
+    async def run_periodic(self, interval: float, initial_delay: float = 0.0, **kwargs):
+        """Refresh every interval seconds until cancelled"""
+        await asyncio.sleep(initial_delay)
+        while True:
+            try:
+                await self.run(**kwargs)
+            except Exception as e:
+                logger.error(f"Error in nationwide refresh: {e}")
+            await asyncio.sleep(interval)
+
+
+def _csv(value: str) -> List[str]:
+    return [part.strip() for part in value.split(",") if part.strip()]
+
+
+async def _main(args: argparse.Namespace):
+    facility_store = FacilityStore()
+    # Refreshed entries reach running API workers through the shared Redis tier
+    response_cache = TieredCache(TTLCache(), redis_from_env())
+    hrsa_service = HRSAService(facility_store, response_cache)
+    va_service = VAService(facility_store, response_cache)
+    usda_service = USDAService(facility_store, response_cache)
+
+    upstream = None
+    if args.mock:
+        from ingest.mock_upstream import MockUpstream
+        upstream = MockUpstream(latency=args.mock_latency, failure_rate=args.mock_failure_rate)
+        hrsa_service.session = upstream.client()
+        va_service.session = upstream.client()
+
+    refresher = NationwideRefresher(
+        hrsa_service, va_service, usda_service,
+        max_concurrency=args.concurrency,
+        host_limits={SOURCE_HOSTS["hrsa"]: args.host_limit, SOURCE_HOSTS["va"]: args.host_limit},
+        va_types=_csv(args.va_types)
+    )
+
+    await response_cache.connect()
+    try:
+        report = await refresher.run(sources=_csv(args.sources), states=_csv(args.states))
+    finally:
+        await hrsa_service.close_session()
+        await va_service.close_session()
+        await response_cache.close()
+
+    for task in sorted(report.tasks, key=lambda task: task.seconds, reverse=True):
+        status = task.error or f"{task.rows} rows"
+        print(f"{task.name:<32} {task.seconds:6.2f}s  {status}")
+    print(report.summary())
+    if upstream is not None:
+        print(f"{upstream.requests} mock upstream requests")
+
+    if args.snapshot_dir:
+        from services.snapshot import SnapshotStore
+        written = SnapshotStore(args.snapshot_dir).write_changed(facility_store)
+        print(f"Wrote {written} snapshots to {args.snapshot_dir}")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Refresh federal facility data for every state")
+    parser.add_argument("--sources", default=",".join(FACILITY_SOURCES), help="Comma-separated sources")
+    parser.add_argument("--states", default=",".join(STATE_CODES), help="Comma-separated state codes")
+    parser.add_argument("--va-types", default=",".join(DEFAULT_VA_TYPES), help="Comma-separated VA facility types")
+    parser.add_argument("--concurrency", type=int, default=REFRESH_CONCURRENCY, help="Global task cap")
+    parser.add_argument("--host-limit", type=int, default=4, help="Task cap per upstream host")
+    parser.add_argument("--snapshot-dir", default=os.getenv("SNAPSHOT_DIR", ""), help="Write snapshots here afterwards")
+    parser.add_argument("--mock", action="store_true", help="Use synthetic upstreams instead of HRSA/VA")
+    parser.add_argument("--mock-latency", type=float, default=0.05)
+    parser.add_argument("--mock-failure-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    report = asyncio.run(_main(args))
+    raise SystemExit(1 if report.failed else 0)
+
+
+if __name__ == "__main__":
+    main()
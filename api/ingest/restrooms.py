@@ -0,0 +1,379 @@
+"""
+OpenStreetMap and Refuge Restrooms import
+Loads public toilets and drinking fountains from local OSM extracts (PBF
+or Overpass JSON) and Refuge Restrooms dumps (JSON, JSON lines or CSV)
+into the utilities table, so clients query one indexed API instead of
+calling Overpass and Refuge from every device. Imports are incremental:
+only new and changed rows are written
+
+Usage (from the api directory):
+    python -m ingest.restrooms us-latest.osm.pbf
+    python -m ingest.restrooms overpass-toilets.json refuge-restrooms.json
+    python -m ingest.restrooms refuge-restrooms.csv --prune
+"""
+
+import argparse
+import csv
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence
+
+from sqlalchemy.orm import Session
+
+from models.database import SessionLocal, bulk_upsert, init_db
+from models.facility import content_hash
+from models.utility import Utility
+from services.delta_sync import WatermarkStore
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 5000
+DELETE_CHUNK_SIZE = 500
+
+# Watermark dataset every restroom import is recorded under, per source
+UTILITY_DATASET = "utilities"
+IMPORT_SOURCES = ("osm", "refuge")
+
+OSM_AMENITY_CATEGORIES = {
+    "toilets": "restroom",
+    "drinking_water": "water_fountain",
+}
+DEFAULT_NAMES = {
+    "restroom": "Public Restroom",
+    "water_fountain": "Drinking Water",
+}
+# Mapped features with these access values are not open to the public
+PRIVATE_ACCESS = {"private", "no"}
+
+# Columns compared to decide whether an imported row changed
+UTILITY_COLUMNS = (
+    "id", "name", "category", "subcategory", "latitude", "longitude",
+    "description", "verified", "wheelchair_accessible",
+)
+
+
+@dataclass
+class RestroomImportStats:
+    read: int = 0
+    imported: int = 0
+    skipped: int = 0
+    inserted: int = 0
+    updated: int = 0
+    removed: int = 0
+    seconds: float = 0.0
+    by_category: Dict[str, int] = field(default_factory=dict)
+
+
+def _truthy(value: Any) -> bool:
+    if isinstance(value, str):
+        return value.strip().lower() in ("true", "t", "yes", "1")
+    return bool(value)
+
+
+def _join(parts: Iterable[Any], separator: str = ", ") -> str:
+    return separator.join(str(part).strip() for part in parts if part and str(part).strip())
+
+
+def osm_utility_row(
+    osm_type: str,
+    osm_id: int,
+    latitude: float,
+    longitude: float,
+    tags: Dict[str, str]
+) -> Optional[Dict[str, Any]]:
+    """
+    Map an OSM toilets or drinking_water feature to a utilities row
+
+    Args:
+        osm_type: 'node', 'way' or 'relation'
+        osm_id: OSM element ID
+        latitude, longitude: Node position or way center
+        tags: Element tags
+
+    Returns:
+        Row dict, or None for other amenities and non-public features
+    """
+    category = OSM_AMENITY_CATEGORIES.get(tags.get("amenity", ""))
+    if category is None or tags.get("access") in PRIVATE_ACCESS:
+        return None
+
+    if category == "restroom":
+        subcategory = "unisex" if tags.get("unisex") == "yes" else None
+        features = [
+            "Unisex" if tags.get("unisex") == "yes" else None,
+            "Changing table" if tags.get("changing_table") == "yes" else None,
+        ]
+    else:
+        subcategory = "bottle_filler" if tags.get("bottle") == "yes" else None
+        features = ["Bottle filler" if tags.get("bottle") == "yes" else None]
+
+    address = _join([
+        _join([tags.get("addr:housenumber"), tags.get("addr:street")], " "),
+        tags.get("addr:city"),
+        tags.get("addr:state"),
+    ])
+    description = _join([
+        tags.get("description") or tags.get("note"),
+        address,
+        f"Hours: {tags['opening_hours']}" if tags.get("opening_hours") else None,
+        f"Fee: {tags['fee']}" if tags.get("fee") else None,
+        *features,
+    ], "; ")
+
+    return {
+        "id": f"osm_{osm_type[0]}{osm_id}",
+        "name": tags.get("name") or DEFAULT_NAMES[category],
+        "category": category,
+        "subcategory": subcategory,
+        "latitude": float(latitude),
+        "longitude": float(longitude),
+        "description": description or None,
+        "verified": False,
+        "wheelchair_accessible": tags.get("wheelchair") in ("yes", "designated")
+        or tags.get("toilets:wheelchair") == "yes",
+    }
+
+
+def refuge_utility_row(restroom: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Map a Refuge Restrooms record to a utilities row (None without coordinates)"""
+    if restroom.get("id") in (None, "") or restroom.get("latitude") in (None, ""):
+        return None
+    if restroom.get("longitude") in (None, ""):
+        return None
+
+    description = _join([
+        restroom.get("comment"),
+        _join([restroom.get("street"), restroom.get("city"), restroom.get("state")]),
+        f"Directions: {restroom['directions']}" if restroom.get("directions") else None,
+        "Changing table" if _truthy(restroom.get("changing_table")) else None,
+    ], "; ")
+
+    return {
+        "id": f"refuge_{restroom['id']}",
+        "name": restroom.get("name") or DEFAULT_NAMES["restroom"],
+        "category": "restroom",
+        "subcategory": "unisex" if _truthy(restroom.get("unisex")) else None,
+        "latitude": float(restroom["latitude"]),
+        "longitude": float(restroom["longitude"]),
+        "description": description or None,
+        "verified": _truthy(restroom.get("approved")),
+        "wheelchair_accessible": _truthy(restroom.get("accessible")),
+    }
+
+
+def iter_overpass_json(data: Dict[str, Any]) -> Iterator[Optional[Dict[str, Any]]]:
+    """
+    Rows from an Overpass API JSON result
+
+    Ways and relations need a position, so query them with ``out center``.
+    """
+    for element in data.get("elements", []):
+        if element.get("type") == "node":
+            latitude, longitude = element.get("lat"), element.get("lon")
+        else:
+            center = element.get("center") or {}
+            latitude, longitude = center.get("lat"), center.get("lon")
+        if latitude is None or longitude is None:
+            yield None
+            continue
+        yield osm_utility_row(element["type"], element["id"], latitude, longitude, element.get("tags") or {})
+
+
+def iter_osm_pbf(path: str) -> Iterator[Optional[Dict[str, Any]]]:
+    """
+    Rows from an OSM PBF extract, streamed with pyosmium
+
+    Only nodes and ways tagged with a mapped amenity are yielded; a way
+    (e.g. a toilet building) is placed at the average of its nodes.
+    """
+    try:
+        import osmium
+    except ImportError:
+        raise ImportError('Reading .pbf extracts requires pyosmium 4 or later (pip install osmium==4.3.1)')
+
+    amenities = osmium.filter.TagFilter(*(("amenity", amenity) for amenity in OSM_AMENITY_CATEGORIES))
+    processor = (
+        osmium.FileProcessor(path, osmium.osm.NODE | osmium.osm.WAY)
+        .with_locations()
+        .with_filter(amenities)
+    )
+    for element in processor:
+        tags = {tag.k: tag.v for tag in element.tags}
+        if element.is_node():
+            yield osm_utility_row("node", element.id, element.location.lat, element.location.lon, tags)
+            continue
+        points = [(node.lat, node.lon) for node in element.nodes if node.location.valid()]
+        if not points:
+            yield None
+            continue
+        latitude = sum(lat for lat, _ in points) / len(points)
+        longitude = sum(lon for _, lon in points) / len(points)
+        yield osm_utility_row("way", element.id, latitude, longitude, tags)
+
+
+def iter_refuge(path: str) -> Iterator[Optional[Dict[str, Any]]]:
+    """Rows from a Refuge Restrooms dump: a JSON array, JSON lines or CSV"""
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.endswith(".csv"):
+            for restroom in csv.DictReader(f):
+                yield refuge_utility_row(restroom)
+        elif path.endswith((".jsonl", ".ndjson")):
+            for line in f:
+                if line.strip():
+                    yield refuge_utility_row(json.loads(line))
+        else:
+            for restroom in json.load(f):
+                yield refuge_utility_row(restroom)
+
+
+def iter_dump(path: str) -> Iterator[Optional[Dict[str, Any]]]:
+    """
+    Rows from any supported dump, detected from its name and contents
+
+    Yields None for records that were read but could not be mapped.
+    """
+    if path.endswith(".pbf"):
+        return iter_osm_pbf(path)
+    if path.endswith((".csv", ".jsonl", ".ndjson")):
+        return iter_refuge(path)
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    if isinstance(data, dict) and "elements" in data:
+        return iter_overpass_json(data)
+    if isinstance(data, dict):
+        data = data.get("restrooms", [])
+    return (refuge_utility_row(restroom) for restroom in data)
+
+
+def dump_source(row: Dict[str, Any]) -> str:
+    return row["id"].split("_", 1)[0]
+
+
+def _load_existing(db: Session, sources: Sequence[str]) -> Dict[str, str]:
+    """Content hashes of the imported sources' current rows by ID"""
+    existing = {}
+    for source in sources:
+        rows = db.query(*(getattr(Utility, name) for name in UTILITY_COLUMNS)).filter(
+            Utility.id.like(f"{source}\\_%", escape="\\")
+        )
+        for row in rows.yield_per(DEFAULT_BATCH_SIZE):
+            existing[row.id] = content_hash(row._asdict())
+    return existing
+
+
+def _delete(db: Session, ids: List[str]):
+    for start in range(0, len(ids), DELETE_CHUNK_SIZE):
+        db.query(Utility).filter(
+            Utility.id.in_(ids[start:start + DELETE_CHUNK_SIZE])
+        ).delete(synchronize_session=False)
+    db.commit()
+
+
+def import_restrooms(
+    paths: Sequence[str],
+    session_factory: Callable[[], Session] = SessionLocal,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    prune: bool = False
+) -> RestroomImportStats:
+    """
+    Upsert every public toilet and drinking fountain in the given dumps
+
+    Args:
+        paths: OSM (.pbf, Overpass .json) and Refuge (.json, .jsonl, .csv) dumps
+        session_factory: Database session factory
+        batch_size: Rows written per upsert batch
+        prune: Delete rows of the imported sources missing from these dumps;
+            only safe when the dumps cover everything previously imported
+
+    Returns:
+        Row counts and elapsed time
+    """
+    stats = RestroomImportStats()
+    started = time.perf_counter()
+    seen: Dict[str, str] = {}
+
+    db = session_factory()
+    try:
+        existing = _load_existing(db, IMPORT_SOURCES)
+
+        def changed_rows() -> Iterator[Dict[str, Any]]:
+            for path in paths:
+                logger.info(f"Reading {path}")
+                for row in iter_dump(path):
+                    stats.read += 1
+                    if row is None:
+                        stats.skipped += 1
+                        continue
+                    digest = content_hash(row)
+                    # Later dumps win for the same ID
+                    is_new = row["id"] not in seen
+                    seen[row["id"]] = digest
+                    if is_new:
+                        stats.by_category[row["category"]] = stats.by_category.get(row["category"], 0) + 1
+                    # Unchanged rows are not rewritten
+                    if existing.get(row["id"]) != digest:
+                        yield row
+
+        written = bulk_upsert(Utility, changed_rows(), bind=db.get_bind(), batch_size=batch_size)
+        logger.info(f"Processed {stats.read} records, wrote {written} new or changed utilities")
+
+        sources = {facility_id.split("_", 1)[0] for facility_id in seen}
+        removed = []
+        if prune:
+            removed = [
+                facility_id for facility_id in existing
+                if facility_id not in seen and facility_id.split("_", 1)[0] in sources
+            ]
+            _delete(db, removed)
+    finally:
+        db.close()
+
+    stats.imported = len(seen)
+    stats.inserted = sum(1 for facility_id in seen if facility_id not in existing)
+    stats.updated = sum(
+        1 for facility_id, digest in seen.items()
+        if facility_id in existing and existing[facility_id] != digest
+    )
+    stats.removed = len(removed)
+
+    watermarks = WatermarkStore(session_factory)
+    for source in sorted(sources):
+        ids = [facility_id for facility_id in seen if facility_id.startswith(f"{source}_")]
+        watermarks.record_counts(
+            source, UTILITY_DATASET,
+            record_count=len(ids),
+            inserted=sum(1 for facility_id in ids if facility_id not in existing),
+            updated=sum(1 for facility_id in ids if facility_id in existing and existing[facility_id] != seen[facility_id]),
+            deleted=sum(1 for facility_id in removed if facility_id.startswith(f"{source}_"))
+        )
+
+    stats.seconds = time.perf_counter() - started
+    logger.info(
+        f"Restroom import finished: {stats.imported} utilities ({stats.inserted} new, "
+        f"{stats.updated} changed, {stats.removed} removed), {stats.skipped} skipped "
+        f"in {stats.seconds:.1f}s"
+    )
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import OSM and Refuge restroom dumps")
+    parser.add_argument("paths", nargs="+", help="OSM .pbf/Overpass .json or Refuge .json/.jsonl/.csv files")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--prune", action="store_true", help="Delete previously imported rows missing from these files")
+    args = parser.parse_args()
+
+    for path in args.paths:
+        if not os.path.exists(path):
+            parser.error(f"no such file: {path}")
+
+    logging.basicConfig(level=logging.INFO)
+    init_db()
+    import_restrooms(args.paths, batch_size=args.batch_size, prune=args.prune)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+"""Background jobs for UrbanAid API"""
@@ -0,0 +1,130 @@
+"""
+Celery application for ingestion, refresh and notification jobs
+Federal refreshes go to one queue per source so a slow upstream only
+backs up its own workers; imports, index rebuilds and notifications get
+queues of their own
+
+Usage (from the api directory):
+    celery -A jobs.celery_app worker -Q refresh,refresh.hrsa,refresh.va,refresh.usda
+    celery -A jobs.celery_app worker -Q import,index,notifications
+    celery -A jobs.celery_app beat
+
+Without CELERY_BROKER_URL (or REDIS_URL), or with CELERY_EAGER=1, jobs
+run in the process that enqueues them against an in-memory broker and
+result backend, so the whole pipeline works without Redis.
+"""
+
+import os
+from typing import Any, Dict, Optional
+
+from celery import Celery
+from kombu import Exchange, Queue
+
+from services.cache import LocalRedis, redis_from_env
+from services.facility_store import FACILITY_SOURCES
+
+CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL") or os.getenv("REDIS_URL", "")
+CELERY_RESULT_BACKEND = os.getenv("CELERY_RESULT_BACKEND") or CELERY_BROKER_URL
+CELERY_EAGER = os.getenv("CELERY_EAGER", "0") == "1" or not CELERY_BROKER_URL
+
+# Job results (state, return value, traceback) are kept this long
+JOB_RESULT_EXPIRES = int(os.getenv("JOB_RESULT_EXPIRES", str(24 * 3600)))
+# Nationwide refresh scheduled by celery beat; 0 disables it
+FEDERAL_REFRESH_INTERVAL = float(os.getenv("FEDERAL_REFRESH_INTERVAL", "0"))
+# Cross-source deduplication pass over all facilities and utilities
+DEDUP_INTERVAL = float(os.getenv("DEDUP_INTERVAL", "600"))
+
+JOBS_EXCHANGE = Exchange("urbanaid.jobs", type="direct")
+
+REFRESH_QUEUES = {source: f"refresh.{source}" for source in FACILITY_SOURCES}
+
+TASK_ROUTES = {
+    "jobs.refresh_all": "refresh",
+    "jobs.import_hrsa_workbook": "import",
+    "jobs.import_restrooms": "import",
+    "jobs.rebuild_spatial_index": "index",
+    "jobs.deduplicate_facilities": "index",
+    "jobs.send_notification": "notifications",
+}
+
+TASK_QUEUES = [
+    Queue(name, JOBS_EXCHANGE, routing_key=name)
+    for name in ("default", "refresh", *REFRESH_QUEUES.values(), "import", "index", "notifications")
+]
+
+# Stands in for Redis as the cache tier shared by the API and eager jobs
+EAGER_REDIS = LocalRedis()
+
+
+def shared_redis() -> Optional[Any]:
+    """Client for the cache tier jobs write results to and the API reads"""
+    redis = redis_from_env()
+    if redis is None and CELERY_EAGER:
+        return EAGER_REDIS
+    return redis
+
+
+def route_task(name: str, args: tuple, kwargs: Dict[str, Any], options: Dict[str, Any], task=None, **kw) -> Optional[Dict[str, str]]:
+    """Route dataset refreshes by their source argument, other jobs by name"""
+    if name == "jobs.refresh_dataset":
+        source = kwargs.get("source") or (args[0] if args else "")
+        queue = REFRESH_QUEUES.get(source)
+    else:
+        queue = TASK_ROUTES.get(name)
+    if queue is None:
+        return None
+    return {"queue": queue, "exchange": JOBS_EXCHANGE.name, "routing_key": queue}
+
+
+def beat_schedule() -> Dict[str, Dict[str, Any]]:
+    schedule = {}
+    if FEDERAL_REFRESH_INTERVAL > 0:
+        schedule["nationwide-federal-refresh"] = {
+            "task": "jobs.refresh_all",
+            "schedule": FEDERAL_REFRESH_INTERVAL,
+        }
+    if DEDUP_INTERVAL > 0:
+        schedule["deduplicate-facilities"] = {
+            "task": "jobs.deduplicate_facilities",
+            "schedule": DEDUP_INTERVAL,
+        }
+    return schedule
+
+
+def create_app(eager: bool = CELERY_EAGER) -> Celery:
+    """
+    Build the Celery app
+
+    Args:
+        eager: Run jobs inline in the caller with an in-memory broker and
+            result backend instead of sending them to workers
+    """
+    app = Celery("urbanaid", include=["jobs.tasks"])
+    app.conf.update(
+        broker_url="memory://" if eager else CELERY_BROKER_URL,
+        result_backend="cache+memory://" if eager else CELERY_RESULT_BACKEND,
+        task_always_eager=eager,
+        # Eager failures are recorded on the result like a worker's would be
+        task_eager_propagates=False,
+        task_store_eager_result=True,
+        task_track_started=True,
+        result_extended=True,
+        result_expires=JOB_RESULT_EXPIRES,
+        # A job lost with its worker is redelivered rather than dropped
+        task_acks_late=True,
+        task_reject_on_worker_lost=True,
+        worker_prefetch_multiplier=1,
+        task_serializer="json",
+        result_serializer="json",
+        accept_content=["json"],
+        task_queues=TASK_QUEUES,
+        task_default_queue="default",
+        task_default_exchange=JOBS_EXCHANGE.name,
+        task_default_routing_key="default",
+        task_routes=(route_task,),
+        beat_schedule=beat_schedule(),
+    )
+    return app
+
+
+celery_app = create_app()
@@ -0,0 +1,81 @@
+"""
+Non-blocking job submission for request handlers
+Jobs are published (or, in eager mode, run) in a thread under a job ID
+assigned up front, so a handler can answer with the ID right away
+"""
+
+import asyncio
+import logging
+import time
+import uuid
+from typing import Any, Dict, Optional, Set, Tuple
+
+from celery import Celery, Task
+
+from jobs.celery_app import celery_app
+
+logger = logging.getLogger(__name__)
+
+# Identical submissions within this window share one job
+DEDUPE_WINDOW = 300.0
+
+
+class JobDispatcher:
+    """
+    Enqueues jobs without holding up the caller and reports their results
+
+    Args:
+        app: Celery app whose result backend tracks the jobs
+        dedupe_window: Seconds a deduplicated submission reuses its job
+    """
+
+    def __init__(self, app: Celery = celery_app, dedupe_window: float = DEDUPE_WINDOW):
+        self.app = app
+        self.dedupe_window = dedupe_window
+        self._recent: Dict[str, Tuple[str, float]] = {}
+        self._publishing: Set[asyncio.Future] = set()
+
+    def submit(self, task: Task, dedupe_key: Optional[str] = None, **kwargs) -> str:
+        """
+        Enqueue a job from a running event loop and return its ID
+
+        Args:
+            task: Celery task to run
+            dedupe_key: Submissions with the same key share one job while
+                it is recent, e.g. many requests missing one dataset
+            **kwargs: Task keyword arguments (JSON-serializable)
+        """
+        now = time.monotonic()
+        if dedupe_key is not None:
+            recent = self._recent.get(dedupe_key)
+            if recent is not None and now - recent[1] < self.dedupe_window:
+                return recent[0]
+
+        job_id = str(uuid.uuid4())
+        if dedupe_key is not None:
+            self._recent[dedupe_key] = (job_id, now)
+        publishing = asyncio.ensure_future(asyncio.to_thread(self._publish, task, job_id, kwargs))
+        self._publishing.add(publishing)
+        publishing.add_done_callback(self._publishing.discard)
+        return job_id
+
+    def _publish(self, task: Task, job_id: str, kwargs: Dict[str, Any]):
+        try:
+            task.apply_async(kwargs=kwargs, task_id=job_id)
+        except Exception as e:
+            logger.error(f"Error enqueueing {task.name} job {job_id}: {e}")
+
+    def status(self, job_id: str) -> Dict[str, Any]:
+        """State of a job and, once finished, its result or error"""
+        result = self.app.AsyncResult(job_id)
+        state = result.state
+        job = {"job_id": job_id, "state": state}
+        if result.name:
+            job["task"] = result.name
+        if state == "SUCCESS":
+            job["result"] = result.result
+        elif state in ("FAILURE", "RETRY"):
+            job["error"] = str(result.result)
+        if result.date_done is not None:
+            job["finished_at"] = result.date_done.isoformat()
+        return job
@@ -0,0 +1,243 @@
+"""
+Celery tasks for federal refreshes, imports, index rebuilds, deduplication
+and notifications
+Each job builds its services inside its own event loop and writes its
+results to the shared cache tier (and database), which API workers read
+"""
+
+import asyncio
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from dataclasses import asdict
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import httpx
+
+from ingest.refresh import RefreshTask, NationwideRefresher, plan_refresh
+from jobs.celery_app import EAGER_REDIS, celery_app, shared_redis
+from models.database import SessionLocal, engine
+from models.utility import Utility
+from services.cache import TieredCache, TTLCache
+from services.dedup import compute_merges, publish_merges
+from services.delta_sync import DatasetDelta, WatermarkStore
+from services.facility_store import FACILITY_SOURCES, FacilityStore
+from services.hrsa_service import HRSAService
+from services.notification_service import NotificationService
+from services.usda_service import USDAService
+from services.va_service import VAService
+
+logger = logging.getLogger(__name__)
+
+REFRESH_MAX_RETRIES = int(os.getenv("REFRESH_MAX_RETRIES", "3"))
+HRSA_WORKBOOK_PATH = os.getenv("HRSA_WORKBOOK_PATH", "")
+
+
+class RefreshFailed(Exception):
+    """A dataset refresh failed or came back empty and should be retried"""
+
+
+@asynccontextmanager
+async def job_refresher() -> AsyncIterator[NationwideRefresher]:
+    """A NationwideRefresher over fresh services writing to the shared cache"""
+    cache = TieredCache(TTLCache(), shared_redis())
+    store = FacilityStore()
+    watermarks = WatermarkStore(SessionLocal)
+
+    def record_sync(delta: DatasetDelta):
+        # Recorded inline: a job syncs one dataset and serves no requests
+        if delta.key is not None:
+            watermarks.record(delta, len(store.get_dataset(delta.source, delta.key) or []))
+
+    store.subscribe(record_sync)
+    hrsa_service = HRSAService(store, cache, SessionLocal)
+    va_service = VAService(store, cache)
+    usda_service = USDAService(store, cache)
+    await cache.connect()
+    try:
+        yield NationwideRefresher(hrsa_service, va_service, usda_service)
+    finally:
+        await hrsa_service.close_session()
+        await va_service.close_session()
+        await usda_service.close_session()
+        # The in-memory stand-in is shared with the API and must outlive the job
+        if cache.redis is not EAGER_REDIS:
+            await cache.close()
+
+
+async def _refresh(task: RefreshTask) -> RefreshTask:
+    async with job_refresher() as refresher:
+        await refresher.run_tasks([task])
+    return task
+
+
+@celery_app.task(
+    name="jobs.refresh_dataset",
+    autoretry_for=(RefreshFailed,),
+    max_retries=REFRESH_MAX_RETRIES,
+    retry_backoff=30,
+    retry_backoff_max=600,
+    retry_jitter=True
+)
+def refresh_dataset(source: str, state: str, variant: str = "") -> Dict[str, Any]:
+    """
+    Refresh one (source, state) dataset into the shared cache
+
+    Services report upstream failures as empty results, so an empty
+    dataset is retried too; the previous data stays in place meanwhile.
+
+    Returns:
+        The finished RefreshTask as a dict
+    """
+    task = asyncio.run(_refresh(RefreshTask(source, state.upper(), variant)))
+    if task.error or not task.rows:
+        raise RefreshFailed(f"{task.name}: {task.error or 'no rows'}")
+    return asdict(task)
+
+
+@celery_app.task(name="jobs.refresh_all")
+def refresh_all(sources: Optional[List[str]] = None, states: Optional[List[str]] = None) -> List[str]:
+    """
+    Fan a nationwide refresh out as one refresh_dataset job per dataset
+
+    Returns:
+        IDs of the enqueued refresh_dataset jobs
+    """
+    kwargs = {}
+    if states:
+        kwargs["states"] = states
+    tasks = plan_refresh(sources or FACILITY_SOURCES, **kwargs)
+    job_ids = [
+        refresh_dataset.apply_async(kwargs={
+            "source": task.source,
+            "state": task.state,
+            "variant": task.variant,
+        }).id
+        for task in tasks
+    ]
+    logger.info(f"Enqueued {len(job_ids)} federal dataset refreshes")
+    return job_ids
+
+
+@celery_app.task(
+    name="jobs.import_hrsa_workbook",
+    autoretry_for=(httpx.HTTPError,),
+    max_retries=3,
+    retry_backoff=60,
+    retry_jitter=True
+)
+def import_hrsa_workbook(path: str = "", prune: bool = True) -> Dict[str, Any]:
+    """
+    Import the HRSA sites workbook, downloading it when no path is given
+
+    Changed states are then refreshed from the imported rows so API
+    workers pick them up from the shared cache.
+
+    Returns:
+        The import's ImportStats as a dict, plus the refresh job IDs
+    """
+    from ingest.hrsa_xlsx import download_workbook, import_hrsa_sites
+
+    path = path or HRSA_WORKBOOK_PATH
+    downloaded = not path
+    if downloaded:
+        path = download_workbook()
+    try:
+        cache = TieredCache(TTLCache(), shared_redis())
+        stats = import_hrsa_sites(path, SessionLocal, prune=prune, cache=cache)
+    finally:
+        if downloaded:
+            os.unlink(path)
+
+    job_ids = [
+        refresh_dataset.apply_async(kwargs={"source": "hrsa", "state": state}).id
+        for state in stats.states
+    ]
+    return {**asdict(stats), "refresh_jobs": job_ids}
+
+
+@celery_app.task(name="jobs.import_restrooms")
+def import_restrooms(paths: List[str], prune: bool = False) -> Dict[str, Any]:
+    """
+    Import OSM and Refuge restroom dumps into the utilities table
+
+    API workers re-index utilities when they see the import's watermark.
+
+    Returns:
+        The import's RestroomImportStats as a dict
+    """
+    from ingest.restrooms import import_restrooms as run_import
+
+    return asdict(run_import(paths, SessionLocal, prune=prune))
+
+
+@celery_app.task(name="jobs.rebuild_spatial_index")
+def rebuild_spatial_index() -> Dict[str, Any]:
+    """Rebuild the utilities spatial index of the configured database"""
+    from models.spatial import rebuild_sqlite_rtree, reindex_postgis
+
+    started = time.perf_counter()
+    dialect = engine.dialect.name
+    if dialect == "sqlite":
+        rebuild_sqlite_rtree(engine)
+        rebuilt = True
+    elif dialect == "postgresql":
+        rebuilt = reindex_postgis(engine)
+    else:
+        rebuilt = False
+    seconds = time.perf_counter() - started
+    logger.info(f"Spatial index rebuild on {dialect}: {'done' if rebuilt else 'skipped'} in {seconds:.1f}s")
+    return {"dialect": dialect, "rebuilt": rebuilt, "seconds": seconds}
+
+
+async def _deduplicate() -> Dict[str, int]:
+    async with job_refresher() as refresher:
+        # The same records an API process holds: imported HRSA sites, every
+        # precomputed federal dataset and the utilities table
+        refresher.hrsa_service.load_local_datasets()
+        for task in refresher.plan():
+            records = await refresher.peek(task, prefer_l2=True)
+            if records:
+                refresher.restore(task, records)
+        records = refresher.hrsa_service.store.records()
+        db = SessionLocal()
+        try:
+            records += [utility.to_dict() for utility in db.query(Utility).yield_per(10000)]
+        finally:
+            db.close()
+
+        merged = compute_merges(records)
+        await publish_merges(refresher.hrsa_service.cache, merged)
+    return {"records": len(records), "merged": len(merged)}
+
+
+@celery_app.task(name="jobs.deduplicate_facilities")
+def deduplicate_facilities() -> Dict[str, Any]:
+    """
+    Merge listings of the same facility across sources
+
+    The merges are published to the shared cache, which API workers load
+    from instead of running the pass themselves.
+
+    Returns:
+        Records compared, facilities merged and elapsed seconds
+    """
+    started = time.perf_counter()
+    counts = asyncio.run(_deduplicate())
+    seconds = time.perf_counter() - started
+    logger.info(f"Deduplicated {counts['records']} records into {counts['merged']} merged facilities in {seconds:.1f}s")
+    return {**counts, "seconds": seconds}
+
+
+@celery_app.task(
+    name="jobs.send_notification",
+    autoretry_for=(httpx.HTTPError,),
+    max_retries=5,
+    retry_backoff=10,
+    retry_jitter=True
+)
+def send_notification(notification: Dict[str, Any]) -> Dict[str, Any]:
+    """Deliver a moderator notification, retrying webhook failures"""
+    NotificationService().deliver(notification)
+    return notification
@@ -2,16 +2,25 @@
 UrbanAid API - FastAPI backend for public utility discovery
 Provides endpoints for finding, adding, and managing public utilities
 """
-from fastapi import FastAPI, HTTPException, Depends, Query, status
+from fastapi import FastAPI, HTTPException, Depends, Query, Request, Response, status
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+import asyncio
+import hashlib
+import os
+import re
+import time
+import uuid
 import uvicorn
 from contextlib import asynccontextmanager
 
-from models.database import get_db, init_db
+from models.database import get_db, init_db, SessionLocal
 from models.utility import Utility as UtilityModel
+from models.facility import SyncWatermark
 from models.user import User as UserModel
 from models.rating import Rating as RatingModel
 from schemas.utility import (
@@ -22,28 +31,110 @@ from schemas.utility import (
 )
 from schemas.user import UserCreate, UserResponse
 from schemas.rating import RatingCreate, RatingResponse
-from controllers.utility_controller import UtilityController
+from schemas.route import RouteSearchRequest
+from schemas.nearest import BatchNearestRequest
+from controllers.utility_controller import USER_SOURCE, UtilityController
 from controllers.user_controller import UserController
 from controllers.rating_controller import RatingController
-from services.location_service import LocationService
+from services.location_service import LocationService, limit_results, rank_by_distance
 from services.notification_service import NotificationService
 from services.hrsa_service import HRSAService
-from services.va_service import VAService
+from services.va_service import KM_PER_MILE, VAService
 from services.usda_service import USDAService
+from services.facility_store import FacilityStore, FACILITY_SOURCES
+from services.cache import TieredCache, TTLCache
+from services.tile_service import TileService
+from services.snapshot import SnapshotStore
+from services.delta_sync import DatasetDelta, WatermarkStore
+from services.dedup import DedupIndex
+from services.route_service import decode_polyline, search_along_route
+from ingest.refresh import NationwideRefresher, RefreshTask
+from ingest.restrooms import IMPORT_SOURCES, UTILITY_DATASET
+from jobs import tasks as jobs
+from jobs.celery_app import CELERY_EAGER, DEDUP_INTERVAL, shared_redis
+from jobs.dispatch import JobDispatcher
 from utils.auth import get_current_user, create_access_token
 from utils.exceptions import UtilityNotFoundError, UnauthorizedError
 
 # Security
 security = HTTPBearer(auto_error=False)
 
+# Server-side cap on points returned by a bounding-box (viewport) query
+MAX_BBOX_RESULTS = int(os.getenv("MAX_BBOX_RESULTS", "500"))
+# Widest viewport (degrees on either axis) point queries accept; zoomed-out
+# maps should use /utilities/clusters
+MAX_BBOX_SPAN_DEGREES = float(os.getenv("MAX_BBOX_SPAN_DEGREES", "45"))
+# Largest radius (km) a utility radius query may cover
+MAX_SEARCH_RADIUS_KM = float(os.getenv("MAX_SEARCH_RADIUS_KM", "100"))
+
+# Federal dataset snapshots for warm starts; an empty SNAPSHOT_DIR disables them
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", "data/snapshots")
+SNAPSHOT_INTERVAL = float(os.getenv("SNAPSHOT_INTERVAL", "300"))
+# Nationwide federal refresh in the background; 0 disables it. Enable it on
+# one process only, other workers pick results up from Redis
+FEDERAL_REFRESH_INTERVAL = float(os.getenv("FEDERAL_REFRESH_INTERVAL", "0"))
+# Federal endpoints answer only from datasets the job queue precomputed; a
+# miss enqueues a refresh instead of waiting on upstream. Meant for
+# deployments running job workers and beat; off, the services' cached
+# upstream paths serve every request
+SERVE_PRECOMPUTED_ONLY = os.getenv("SERVE_PRECOMPUTED_ONLY", "0") == "1"
+# How often datasets refreshed by job workers are pulled into this process
+PRECOMPUTED_SYNC_INTERVAL = float(os.getenv("PRECOMPUTED_SYNC_INTERVAL", "300"))
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan events"""
     # Startup
     init_db()
+    # Stamped before indexing so a change landing meanwhile is reloaded
+    utility_changes.update(utility_change_stamps())
+    db = SessionLocal()
+    try:
+        location_service.build_index(db)
+    finally:
+        db.close()
+    if not await response_cache.connect():
+        print("⚠️  Redis cache unavailable, using in-process cache only")
+    # Imported HRSA sites take precedence over snapshotted API responses
+    imported = hrsa_service.load_local_datasets()
+    if imported:
+        print(f"🏥 Loaded {imported} imported HRSA health centers")
+    snapshot_task = None
+    restored = 0
+    if snapshot_store is not None:
+        restored = restore_snapshots()
+        print(f"📦 Restored {restored} federal datasets from snapshots")
+        snapshot_task = asyncio.create_task(
+            snapshot_store.run_periodic(facility_store, SNAPSHOT_INTERVAL)
+        )
+    dedup_task = None
+    # With a broker, deduplication runs as a scheduled job and its merges
+    # are loaded here and by the precomputed sync
+    if CELERY_EAGER:
+        dedup_task = asyncio.create_task(dedup_index.run_periodic(dedup_records, DEDUP_INTERVAL))
+    elif await dedup_index.sync(response_cache):
+        print(f"🔗 Loaded {len(dedup_index)} merged facilities")
+    sync_task = asyncio.create_task(run_precomputed_sync(PRECOMPUTED_SYNC_INTERVAL))
+    refresh_task = None
+    # With a broker, celery beat schedules the refresh on the job workers
+    if FEDERAL_REFRESH_INTERVAL > 0 and CELERY_EAGER:
+        # With warm snapshots the first nationwide pass can wait a cycle
+        refresh_task = asyncio.create_task(federal_refresher.run_periodic(
+            FEDERAL_REFRESH_INTERVAL,
+            initial_delay=FEDERAL_REFRESH_INTERVAL if restored else 0.0
+        ))
     print("🚀 UrbanAid API started successfully")
     yield
     # Shutdown
+    if dedup_task is not None:
+        dedup_task.cancel()
+    sync_task.cancel()
+    if refresh_task is not None:
+        refresh_task.cancel()
+    if snapshot_task is not None:
+        snapshot_task.cancel()
+        snapshot_store.write_changed(facility_store)
+    await response_cache.close()
     print("👋 UrbanAid API shutting down")
 
 # Initialize FastAPI app
@@ -62,16 +153,318 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(GZipMiddleware, minimum_size=1000)
 
 # Initialize controllers
-utility_controller = UtilityController()
+location_service = LocationService()
+# Last restroom import or user write per source already in location_service's indexes
+utility_changes: Dict[str, Tuple[Any, int]] = {}
+sync_watermarks = WatermarkStore(SessionLocal)
+utility_controller = UtilityController(location_service, sync_watermarks)
 user_controller = UserController()
 rating_controller = RatingController()
-location_service = LocationService()
-notification_service = NotificationService()
-hrsa_service = HRSAService()
-va_service = VAService()
-usda_service = USDAService()
+facility_store = FacilityStore()
+response_cache = TieredCache(
+    TTLCache(
+        max_entries=int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "2048")),
+        max_bytes=int(os.getenv("RESPONSE_CACHE_MAX_MB", "256")) * 1024 * 1024
+    ),
+    shared_redis()
+)
+hrsa_service = HRSAService(facility_store, response_cache, SessionLocal)
+va_service = VAService(facility_store, response_cache)
+usda_service = USDAService(facility_store, response_cache)
+dedup_index = DedupIndex()
+tile_service = TileService(location_service, facility_store, dedup=dedup_index)
+snapshot_store = SnapshotStore(SNAPSHOT_DIR) if SNAPSHOT_DIR else None
+federal_refresher = NationwideRefresher(hrsa_service, va_service, usda_service)
+job_dispatcher = JobDispatcher()
+
+def enqueue_notification(notification: Dict[str, Any]):
+    job_dispatcher.submit(jobs.send_notification, notification=notification)
+
+notification_service = NotificationService(dispatch=enqueue_notification)
+
+watermark_writes: Set[asyncio.Future] = set()
+
+def record_sync(delta: DatasetDelta):
+    """Persist the watermark of every federal dataset sync that changed data"""
+    if delta.key is None:
+        return
+    records = facility_store.get_dataset(delta.source, delta.key) or []
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        sync_watermarks.record(delta, len(records))
+        return
+    # Written off the event loop; deltas arrive from request handlers
+    writing = asyncio.ensure_future(asyncio.to_thread(sync_watermarks.record, delta, len(records)))
+    watermark_writes.add(writing)
+    writing.add_done_callback(watermark_writes.discard)
+
+facility_store.subscribe(record_sync)
+
+def dedup_records() -> List[Dict[str, Any]]:
+    """Every federal facility and in-memory utility, for deduplication"""
+    return facility_store.records() + location_service.index.records()
+
+def restore_snapshots() -> int:
+    """Load on-disk federal snapshots into the facility store and response cache"""
+    services = {"hrsa": hrsa_service, "va": va_service, "usda": usda_service}
+    restored = 0
+    for snapshot in snapshot_store.load():
+        if facility_store.get_dataset(snapshot.source, snapshot.key) is not None:
+            continue
+        services[snapshot.source].restore_dataset(
+            snapshot.key, snapshot.records, time.time() - snapshot.written_at
+        )
+        snapshot_store.mark_written(
+            snapshot.source, snapshot.key,
+            facility_store.dataset_version(snapshot.source, snapshot.key)
+        )
+        restored += 1
+    return restored
+
+async def sync_precomputed() -> int:
+    """Pull the federal datasets job workers refreshed into this process"""
+    synced = 0
+    for task in federal_refresher.plan():
+        records = await federal_refresher.peek(task, prefer_l2=True)
+        if records:
+            federal_refresher.restore(task, records)
+            synced += 1
+    return synced
+
+def utility_change_stamps() -> Dict[str, Tuple[Any, int]]:
+    """(Sync time, watermark) and row changes of the last OSM/Refuge import or user write per source"""
+    db = SessionLocal()
+    try:
+        rows = db.query(SyncWatermark).filter(
+            SyncWatermark.dataset == UTILITY_DATASET,
+            SyncWatermark.source.in_((*IMPORT_SOURCES, USER_SOURCE))
+        )
+        return {
+            row.source: (
+                (row.synced_at, row.watermark),
+                (row.inserted or 0) + (row.updated or 0) + (row.deleted or 0)
+            )
+            for row in rows
+        }
+    finally:
+        db.close()
+
+def reload_changed_utilities() -> bool:
+    """Re-index utilities when an import or another worker changed the table"""
+    stamps = utility_change_stamps()
+    changed = any(
+        changes and utility_changes.get(source, (None, 0))[0] != stamp
+        for source, (stamp, changes) in stamps.items()
+    )
+    utility_changes.update(stamps)
+    if not changed:
+        return False
+    db = SessionLocal()
+    try:
+        count = location_service.build_index(db)
+    finally:
+        db.close()
+    print(f"🚻 Re-indexed {count} utilities after changes from another process")
+    return True
+
+async def run_precomputed_sync(interval: float):
+    """
+    Right away and then every interval seconds until cancelled, pull in
+    precomputed datasets, utility changes made by other processes and
+    (with a broker) the deduplication job's merges
+    """
+    while True:
+        try:
+            await sync_precomputed()
+            await asyncio.to_thread(reload_changed_utilities)
+            if not CELERY_EAGER:
+                await dedup_index.sync(response_cache)
+        except Exception as e:
+            print(f"⚠️  Error syncing precomputed datasets: {e}")
+        await asyncio.sleep(interval)
+
+async def state_dataset(
+    task: RefreshTask,
+    fetch: Callable[[], Awaitable[List[dict]]]
+) -> Optional[List[dict]]:
+    """
+    Records of a federal state dataset for a request handler
+
+    In precomputed mode only the facility store and then the shared cache
+    are read, and None means the dataset has not been computed yet.
+    Otherwise ``fetch`` goes through to upstream on a cache miss.
+    """
+    if not SERVE_PRECOMPUTED_ONLY:
+        return await fetch()
+    records = facility_store.get_dataset(task.source, task.dataset_key)
+    if records is not None:
+        return records
+    records = await federal_refresher.peek(task)
+    if records is not None:
+        federal_refresher.restore(task, records)
+    return records
+
+def refresh_pending(task: RefreshTask) -> JSONResponse:
+    """202 for a dataset not computed yet, after enqueueing its refresh"""
+    job_id = job_dispatcher.submit(
+        jobs.refresh_dataset,
+        dedupe_key=task.name,
+        source=task.source,
+        state=task.state,
+        variant=task.variant
+    )
+    return JSONResponse(
+        status_code=status.HTTP_202_ACCEPTED,
+        content={
+            "status": "pending",
+            "job_id": job_id,
+            "state": task.state,
+            "detail": "Dataset is being refreshed; retry shortly or poll /jobs/{job_id}"
+        }
+    )
+
+async def facility_details(
+    facility_id: str,
+    fetch: Callable[[], Awaitable[Optional[dict]]]
+) -> Optional[dict]:
+    """
+    A facility for a detail endpoint
+
+    A listing merged with other sources resolves to the canonical record;
+    in precomputed mode the facility store is read instead of upstream.
+    """
+    merged = dedup_index.resolve(facility_id)
+    if merged is not None:
+        return merged
+    if SERVE_PRECOMPUTED_ONLY:
+        return facility_store.get(facility_id)
+    return await fetch()
+
+def precomputed_nearby(
+    source: str,
+    latitude: float,
+    longitude: float,
+    radius_km: float,
+    limit: int,
+    include: Optional[Callable[[dict], bool]] = None,
+    variant: Optional[str] = None
+) -> List[dict]:
+    """
+    Nearby facilities from the facility store, nearest first
+
+    While no dataset of the source (or, given ``variant``, of that
+    facility type) has been computed, e.g. right after a deploy, a
+    refresh of the whole source is enqueued and the first callers get an
+    empty list until it lands.
+    """
+    candidates = facility_store.candidates_near(source, latitude, longitude, radius_km)
+    if include is not None:
+        candidates = [f for f in candidates if include(f)]
+    if not candidates and not any(
+        held == source and (variant is None or key.endswith(f":{variant}"))
+        for held, key in facility_store.datasets()
+    ):
+        job_dispatcher.submit(jobs.refresh_all, dedupe_key=f"refresh_all:{source}", sources=[source])
+    return rank_by_distance(latitude, longitude, candidates, radius_km, limit)
+
+def parse_bbox(bbox: str, max_span: Optional[float] = MAX_BBOX_SPAN_DEGREES) -> Tuple[float, float, float, float]:
+    """
+    Parse a 'minLon,minLat,maxLon,maxLat' query parameter
+
+    Boxes wider or taller than ``max_span`` degrees are rejected; pass
+    None where any viewport is fine, such as cluster queries.
+    """
+    try:
+        min_lon, min_lat, max_lon, max_lat = (float(value) for value in bbox.split(","))
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="bbox must be 'minLon,minLat,maxLon,maxLat'"
+        )
+    
+    if not (-90.0 <= min_lat <= max_lat <= 90.0 and -180.0 <= min_lon <= 180.0 and -180.0 <= max_lon <= 180.0):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="bbox coordinates are out of range"
+        )
+    
+    lon_span = max_lon - min_lon if min_lon <= max_lon else max_lon + 360.0 - min_lon
+    if max_span is not None and max(lon_span, max_lat - min_lat) > max_span:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"bbox may span at most {max_span:g} degrees; use /utilities/clusters for wider views"
+        )
+    return min_lon, min_lat, max_lon, max_lat
+
+def require_origin(latitude: Optional[float], longitude: Optional[float]):
+    """Reject radius queries that are missing their origin"""
+    if latitude is None or longitude is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="latitude and longitude are required unless bbox is given"
+        )
+
+# ========== HTTP CACHING ==========
+
+# Identifies this process in ETags built from in-process version counters,
+# so one worker never answers 304 for another worker's data version
+BOOT_ID = uuid.uuid4().hex[:8]
+
+STATE_CACHE_CONTROL = f"public, max-age={int(os.getenv('STATE_CACHE_MAX_AGE', '300'))}"
+UTILITY_CACHE_CONTROL = f"public, max-age={int(os.getenv('UTILITY_CACHE_MAX_AGE', '30'))}"
+TILE_CACHE_CONTROL = f"public, max-age={int(os.getenv('TILE_CACHE_MAX_AGE', '60'))}"
+
+def make_etag(*parts: Any) -> str:
+    """Build a strong ETag; characters that would break If-None-Match lists are replaced"""
+    return '"' + "-".join(re.sub(r"[^\w.:+]", "_", str(part)) for part in parts) + '"'
+
+def check_etag(
+    request: Request,
+    response: Response,
+    etag: Optional[str],
+    cache_control: str
+) -> Optional[Response]:
+    """Set caching headers, or return a 304 when the client's copy is current"""
+    if etag is None:
+        return None
+    
+    header = request.headers.get("if-none-match", "")
+    candidates = [tag.strip() for tag in header.split(",") if tag.strip()]
+    if "*" in candidates or etag in candidates or f"W/{etag}" in candidates:
+        return Response(
+            status_code=status.HTTP_304_NOT_MODIFIED,
+            headers={"ETag": etag, "Cache-Control": cache_control}
+        )
+    
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = cache_control
+    return None
+
+def utility_etag(request: Request) -> Optional[str]:
+    """
+    ETag for in-memory utility reads: this process's index version plus
+    the query string, so it is known before any work is done
+    """
+    if not location_service.in_memory:
+        # Writes through other workers are not visible to this counter
+        return None
+    query = hashlib.sha1(request.url.query.encode()).hexdigest()[:12]
+    return make_etag("u", BOOT_ID, location_service.clusters.version, query)
+
+def dataset_etag(source: str, key: str, records: List[dict], *params: Any) -> Optional[str]:
+    """ETag for a federal state list, from the facility store's dataset tag"""
+    tag = facility_store.dataset_tag(source, key)
+    if tag is None:
+        if not records:
+            return None
+        # Served from the shared cache without passing through this worker's store
+        facility_store.put_dataset(source, key, records)
+        tag = facility_store.dataset_tag(source, key)
+    return make_etag(source, key, tag, *params)
 
 # ========== HEALTH CHECK ==========
 
@@ -84,50 +477,222 @@ async def health_check():
 
 @app.get("/utilities", response_model=List[UtilityResponse], tags=["Utilities"])
 async def get_utilities(
-    latitude: float = Query(...),
-    longitude: float = Query(...),
-    radius: float = Query(5.0),
+    request: Request,
+    response: Response,
+    latitude: Optional[float] = Query(None),
+    longitude: Optional[float] = Query(None),
+    radius: float = Query(5.0, gt=0, le=MAX_SEARCH_RADIUS_KM),
     category: Optional[str] = Query(None),
-    limit: int = Query(50, le=100)
+    limit: int = Query(50, ge=1, le=MAX_BBOX_RESULTS),
+    bbox: Optional[str] = Query(None, description="Viewport as minLon,minLat,maxLon,maxLat"),
+    db: Session = Depends(get_db)
 ):
-    mock_utilities = [
-        {
-            "id": "1",
-            "name": "Central Park Water Fountain",
-            "category": "water_fountain",
-            "latitude": latitude + 0.001,
-            "longitude": longitude + 0.001,
-            "description": "Clean water fountain",
-            "verified": True,
-            "wheelchair_accessible": True,
-            "rating": 4.5
-        }
-    ]
+    """
+    Get nearby utilities, nearest first
+
+    Served from the in-memory geohash index, or from the database spatial
+    index when IN_MEMORY_GEO_INDEX is disabled. With ``bbox`` every utility
+    in the viewport is returned (up to the server cap, with an
+    ``X-Truncated`` header when cut off); latitude/longitude then only set
+    an optional sort origin.
+    """
+    not_modified = check_etag(request, response, utility_etag(request), UTILITY_CACHE_CONTROL)
+    if not_modified:
+        return not_modified
     
-    if category:
-        mock_utilities = [u for u in mock_utilities if u["category"] == category]
+    if bbox:
+        min_lon, min_lat, max_lon, max_lat = parse_bbox(bbox)
+        if location_service.in_memory:
+            utilities, truncated = location_service.get_points_in_bbox(
+                min_lat, min_lon, max_lat, max_lon, category, limit, latitude, longitude
+            )
+        else:
+            utilities, truncated = await utility_controller.get_utilities_in_bbox(
+                db, min_lat, min_lon, max_lat, max_lon, category, limit, latitude, longitude
+            )
+        response.headers["X-Truncated"] = "true" if truncated else "false"
+        return utilities
     
-    return mock_utilities[:limit]
+    require_origin(latitude, longitude)
+    limit = min(limit, 100)
+    if location_service.in_memory:
+        return location_service.get_nearby_points(
+            latitude, longitude, radius, category, limit
+        )
+    return await utility_controller.get_nearby_utilities(
+        db, latitude, longitude, radius, category, limit
+    )
 
-@app.post("/utilities", response_model=UtilityResponse, tags=["Utilities"])
-async def create_utility(utility_data: dict):
-    required_fields = ["name", "category", "latitude", "longitude"]
-    for field in required_fields:
-        if field not in utility_data:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Missing required field: {field}"
+@app.get("/utilities/nearest", response_model=List[UtilityResponse], tags=["Utilities"])
+async def get_nearest_utilities(
+    request: Request,
+    response: Response,
+    latitude: float = Query(..., description="User's latitude"),
+    longitude: float = Query(..., description="User's longitude"),
+    k: int = Query(5, ge=1, le=100, description="Number of utilities to return"),
+    category: Optional[str] = Query(None, description="Filter by utility category"),
+    db: Session = Depends(get_db)
+):
+    """
+    Get the k closest utilities, nearest first
+
+    Served from per-category KD-trees, or pushed down to the database when
+    IN_MEMORY_GEO_INDEX is disabled
+    """
+    not_modified = check_etag(request, response, utility_etag(request), UTILITY_CACHE_CONTROL)
+    if not_modified:
+        return not_modified
+    
+    if location_service.in_memory:
+        return location_service.get_nearest_points(latitude, longitude, k, category)
+    return await utility_controller.get_nearest_utilities(
+        db, latitude, longitude, k, category
+    )
+
+@app.post("/utilities/nearest/batch", tags=["Utilities"])
+async def get_nearest_utilities_batch(
+    request: BatchNearestRequest,
+    db: Session = Depends(get_db)
+):
+    """
+    Get the k closest utilities for up to 10,000 origins in one call
+
+    With the in-memory index every origin is answered by a single
+    vectorized KD-tree pass; otherwise each origin is pushed down to the
+    database in turn.
+    """
+    try:
+        if location_service.in_memory:
+            matches = location_service.get_nearest_points_batch(
+                [o.latitude for o in request.origins],
+                [o.longitude for o in request.origins],
+                request.k,
+                request.category,
+                request.max_distance_km
+            )
+        else:
+            matches = []
+            for origin in request.origins:
+                nearest = await utility_controller.get_nearest_utilities(
+                    db, origin.latitude, origin.longitude, request.k, request.category
+                )
+                if request.max_distance_km is not None:
+                    nearest = [u for u in nearest if u["distance_km"] <= request.max_distance_km]
+                matches.append(nearest)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error finding nearest utilities: {str(e)}"
+        )
+    
+    return batch_nearest_response(request, matches, "UrbanAid")
+
+@app.get("/utilities/clusters", tags=["Utilities"])
+async def get_utility_clusters(
+    request: Request,
+    response: Response,
+    bbox: str = Query(..., description="Viewport as minLon,minLat,maxLon,maxLat"),
+    zoom: int = Query(..., ge=0, le=22, description="Map zoom level"),
+    max_items: int = Query(1000, ge=1, le=5000, description="Maximum clusters/points returned")
+):
+    """
+    Get marker clusters for a map viewport
+
+    Returns cluster centroids with counts at low zoom and individual
+    utilities once the zoom is high enough to show them unclustered.
+    """
+    query = hashlib.sha1(request.url.query.encode()).hexdigest()[:12]
+    etag = make_etag("c", BOOT_ID, location_service.clusters.version, query)
+    not_modified = check_etag(request, response, etag, UTILITY_CACHE_CONTROL)
+    if not_modified:
+        return not_modified
+    
+    min_lon, min_lat, max_lon, max_lat = parse_bbox(bbox, max_span=None)
+    return location_service.get_clusters(min_lon, min_lat, max_lon, max_lat, zoom, max_items)
+
+@app.post("/utilities/along-route", tags=["Utilities"])
+async def get_utilities_along_route(
+    route: RouteSearchRequest,
+    db: Session = Depends(get_db)
+):
+    """
+    Find utilities (and cached federal facilities) along a route
+
+    Accepts an encoded polyline and a corridor buffer; results are ordered
+    by their position along the route. One call replaces the dozens of
+    radius queries otherwise needed to cover a trip.
+    """
+    try:
+        points = decode_polyline(route.polyline, route.precision)
+    except (ValueError, IndexError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid encoded polyline"
+        )
+    if not points:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Route polyline has no points"
+        )
+    
+    def lookup(min_lat: float, min_lon: float, max_lat: float, max_lon: float) -> List[dict]:
+        if location_service.in_memory:
+            candidates = location_service.index.candidates_in_bbox(min_lat, min_lon, max_lat, max_lon)
+            if route.category:
+                candidates = [c for c in candidates if c.get("category") == route.category]
+        else:
+            candidates = utility_controller.utilities_in_bbox(
+                db, min_lat, min_lon, max_lat, max_lon, route.category
             )
+        if route.include_facilities:
+            for source in FACILITY_SOURCES:
+                candidates.extend(facility_store.in_bbox(source, min_lat, min_lon, max_lat, max_lon))
+        return candidates
+    
+    try:
+        results, length_km, truncated = search_along_route(
+            points, route.buffer_m / 1000.0, lookup, route.limit
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error searching along route: {str(e)}"
+        )
     
     return {
-        "id": "new_id",
-        "name": utility_data["name"],
-        "category": utility_data["category"],
-        "latitude": utility_data["latitude"],
-        "longitude": utility_data["longitude"],
-        "verified": False
+        "status": "success",
+        "data": results,
+        "count": len(results),
+        "truncated": truncated,
+        "route": {
+            "points": len(points),
+            "length_km": length_km,
+            "buffer_m": route.buffer_m
+        }
     }
 
+@app.post("/utilities", response_model=UtilityResponse, tags=["Utilities"])
+async def create_utility(
+    utility_data: UtilityCreate,
+    db: Session = Depends(get_db),
+    current_user: Optional[UserModel] = Depends(get_current_user)
+):
+    """
+    Create a new utility (anonymous or authenticated)
+    
+    Only utilities created while signed in can be edited or deleted later,
+    by the same user.
+    """
+    try:
+        return await utility_controller.create_utility(
+            db, utility_data, current_user.id if current_user else None
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error creating utility: {str(e)}"
+        )
+
 @app.put("/utilities/{utility_id}", response_model=UtilityResponse, tags=["Utilities"])
 async def update_utility(
     utility_id: str,
@@ -136,14 +701,14 @@ async def update_utility(
     current_user: UserModel = Depends(get_current_user)
 ):
     """
-    Update existing utility (requires authentication)
+    Update existing utility (requires authentication and ownership)
     """
     try:
         utility = await utility_controller.update_utility(
             db, 
             utility_id, 
             utility_data, 
-            current_user.id
+            current_user.id if current_user else None
         )
         
         if not utility:
@@ -170,7 +735,9 @@ async def delete_utility(
     Delete utility (requires authentication and ownership)
     """
     try:
-        success = await utility_controller.delete_utility(db, utility_id, current_user.id)
+        success = await utility_controller.delete_utility(
+            db, utility_id, current_user.id if current_user else None
+        )
         if not success:
             raise UtilityNotFoundError(f"Utility with ID {utility_id} not found")
         
@@ -192,7 +759,7 @@ async def search_utilities(
     query: str = Query(..., description="Search query"),
     latitude: float = Query(..., description="User's latitude"),
     longitude: float = Query(..., description="User's longitude"),
-    radius: float = Query(10.0, description="Search radius in kilometers"),
+    radius: float = Query(10.0, gt=0, le=MAX_SEARCH_RADIUS_KM, description="Search radius in kilometers"),
     limit: int = Query(20, le=50, description="Maximum number of results"),
     db: Session = Depends(get_db)
 ):
@@ -210,25 +777,105 @@ async def search_utilities(
             detail=f"Error searching utilities: {str(e)}"
         )
 
+# ========== FEDERAL FACILITY VIEWPORT QUERIES ==========
+
+def bbox_facilities_response(
+    source: str,
+    bbox: str,
+    limit: int,
+    latitude: Optional[float],
+    longitude: Optional[float],
+    source_name: str,
+    include: Optional[Callable[[dict], bool]] = None
+) -> dict:
+    """Answer a federal facility endpoint's bbox mode from the facility store"""
+    min_lon, min_lat, max_lon, max_lat = parse_bbox(bbox)
+    facilities = facility_store.in_bbox(source, min_lat, min_lon, max_lat, max_lon)
+    if include is not None:
+        facilities = [f for f in facilities if include(f)]
+    
+    data, truncated = limit_results(facilities, limit, latitude, longitude)
+    return {
+        "status": "success",
+        "data": data,
+        "count": len(data),
+        "truncated": truncated,
+        "search_params": {
+            "bbox": [min_lon, min_lat, max_lon, max_lat],
+            "latitude": latitude,
+            "longitude": longitude,
+            "limit": limit
+        },
+        "source": source_name
+    }
+
+def batch_nearest_response(request: BatchNearestRequest, matches: List[List[dict]], source_name: str) -> dict:
+    """Pair each origin with its nearest matches"""
+    return {
+        "status": "success",
+        "results": [
+            {
+                "origin": origin.model_dump(),
+                "data": data,
+                "count": len(data)
+            }
+            for origin, data in zip(request.origins, matches)
+        ],
+        "count": len(request.origins),
+        "k": request.k,
+        "source": source_name
+    }
+
+def batch_nearest_facilities(source: str, request: BatchNearestRequest, source_name: str) -> dict:
+    """Answer a federal facility batch-nearest request from the facility store"""
+    try:
+        matches = facility_store.nearest_batch(
+            source,
+            [o.latitude for o in request.origins],
+            [o.longitude for o in request.origins],
+            request.k,
+            request.max_distance_km
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error finding nearest facilities: {str(e)}"
+        )
+    return batch_nearest_response(request, matches, source_name)
+
 # ========== HRSA HEALTH CENTERS ENDPOINTS ==========
 
 @app.get("/health-centers", tags=["Health Centers"])
 async def get_nearby_health_centers(
-    latitude: float = Query(..., description="User's latitude"),
-    longitude: float = Query(..., description="User's longitude"),
+    latitude: Optional[float] = Query(None, description="User's latitude"),
+    longitude: Optional[float] = Query(None, description="User's longitude"),
     radius_km: float = Query(25.0, description="Search radius in kilometers"),
-    limit: int = Query(20, le=50, description="Maximum number of results")
+    limit: int = Query(20, ge=1, le=MAX_BBOX_RESULTS, description="Maximum number of results"),
+    bbox: Optional[str] = Query(None, description="Viewport as minLon,minLat,maxLon,maxLat")
 ):
     """
     Find nearby HRSA Federally Qualified Health Centers (FQHCs)
     
     Returns health centers from the Health Resources & Services Administration database
     including community health centers, migrant health centers, and other FQHCs.
+    With ``bbox``, cached health centers inside the viewport are returned
+    instead, sorted by distance only when latitude/longitude are given.
     """
-    try:
-        health_centers = await hrsa_service.search_nearby_health_centers(
-            latitude, longitude, radius_km, limit
+    if bbox:
+        return bbox_facilities_response(
+            "hrsa", bbox, limit, latitude, longitude,
+            "HRSA - Health Resources & Services Administration"
         )
+    
+    require_origin(latitude, longitude)
+    limit = min(limit, 50)
+    try:
+        if SERVE_PRECOMPUTED_ONLY:
+            health_centers = precomputed_nearby("hrsa", latitude, longitude, radius_km, limit)
+        else:
+            health_centers = await hrsa_service.search_nearby_health_centers(
+                latitude, longitude, radius_km, limit
+            )
         
         return {
             "status": "success",
@@ -249,8 +896,20 @@ async def get_nearby_health_centers(
             detail=f"Error fetching HRSA health centers: {str(e)}"
         )
 
+@app.post("/health-centers/nearest/batch", tags=["Health Centers"])
+async def get_nearest_health_centers_batch(request: BatchNearestRequest):
+    """
+    Get the k closest cached health centers for up to 10,000 origins
+
+    Served from the facility store, so only states already fetched from
+    HRSA are covered.
+    """
+    return batch_nearest_facilities("hrsa", request, "HRSA - Health Resources & Services Administration")
+
 @app.get("/health-centers/state/{state_code}", tags=["Health Centers"])
 async def get_health_centers_by_state(
+    request: Request,
+    response: Response,
     state_code: str,
     limit: int = Query(100, le=500, description="Maximum number of results")
 ):
@@ -269,9 +928,17 @@ async def get_health_centers_by_state(
                 detail="State code must be 2 characters (e.g., 'CA', 'NY')"
             )
         
-        health_centers = await hrsa_service.fetch_health_centers_by_state(
-            state_code.upper()
+        task = RefreshTask("hrsa", state_code.upper())
+        health_centers = await state_dataset(
+            task, lambda: hrsa_service.fetch_health_centers_by_state(task.state)
         )
+        if health_centers is None:
+            return refresh_pending(task)
+        
+        etag = dataset_etag("hrsa", state_code.upper(), health_centers, limit)
+        not_modified = check_etag(request, response, etag, STATE_CACHE_CONTROL)
+        if not_modified:
+            return not_modified
         
         # Apply limit
         limited_centers = health_centers[:limit]
@@ -306,7 +973,9 @@ async def get_health_center_details(center_id: str):
         if not center_id.startswith("hrsa_"):
             center_id = f"hrsa_{center_id}"
         
-        health_center = await hrsa_service.get_health_center_details(center_id)
+        health_center = await facility_details(
+            center_id, lambda: hrsa_service.get_health_center_details(center_id)
+        )
         
         if not health_center:
             raise HTTPException(
@@ -332,11 +1001,12 @@ async def get_health_center_details(center_id: str):
 
 @app.get("/va-facilities", tags=["VA Facilities"])
 async def get_nearby_va_facilities(
-    latitude: float = Query(..., description="User's latitude"),
-    longitude: float = Query(..., description="User's longitude"),
+    latitude: Optional[float] = Query(None, description="User's latitude"),
+    longitude: Optional[float] = Query(None, description="User's longitude"),
     radius_miles: float = Query(50.0, description="Search radius in miles"),
     facility_type: str = Query("health", description="Facility type: health, benefits, cemetery, vet_center"),
-    limit: int = Query(20, le=50, description="Maximum number of results")
+    limit: int = Query(20, ge=1, le=MAX_BBOX_RESULTS, description="Maximum number of results"),
+    bbox: Optional[str] = Query(None, description="Viewport as minLon,minLat,maxLon,maxLat")
 ):
     """
     Find nearby VA (Veterans Affairs) medical facilities and services
@@ -347,11 +1017,31 @@ async def get_nearby_va_facilities(
     - Vet Centers
     - Regional Benefit Offices
     - National Cemeteries
+    
+    With ``bbox``, cached VA facilities of every type inside the viewport
+    are returned instead, sorted by distance only when latitude/longitude
+    are given.
     """
-    try:
-        va_facilities = await va_service.search_nearby_va_facilities(
-            latitude, longitude, radius_miles, facility_type, limit
+    if bbox:
+        return bbox_facilities_response(
+            "va", bbox, limit, latitude, longitude,
+            "VA - Department of Veterans Affairs"
         )
+    
+    require_origin(latitude, longitude)
+    limit = min(limit, 50)
+    try:
+        # Types the refresh does not precompute are served live
+        if SERVE_PRECOMPUTED_ONLY and facility_type in federal_refresher.va_types:
+            va_facilities = precomputed_nearby(
+                "va", latitude, longitude, radius_miles * KM_PER_MILE, limit,
+                lambda f: facility_type in f.get("metadata", {}).get("facility_type", ""),
+                variant=facility_type
+            )
+        else:
+            va_facilities = await va_service.search_nearby_va_facilities(
+                latitude, longitude, radius_miles, facility_type, limit
+            )
         
         return {
             "status": "success",
@@ -373,8 +1063,20 @@ async def get_nearby_va_facilities(
             detail=f"Error fetching VA facilities: {str(e)}"
         )
 
+@app.post("/va-facilities/nearest/batch", tags=["VA Facilities"])
+async def get_nearest_va_facilities_batch(request: BatchNearestRequest):
+    """
+    Get the k closest cached VA facilities for up to 10,000 origins
+
+    Served from the facility store, so only facilities already fetched
+    from the VA are covered.
+    """
+    return batch_nearest_facilities("va", request, "VA - Department of Veterans Affairs")
+
 @app.get("/va-facilities/state/{state_code}", tags=["VA Facilities"])
 async def get_va_facilities_by_state(
+    request: Request,
+    response: Response,
     state_code: str,
     facility_type: str = Query("health", description="Facility type"),
     limit: int = Query(200, le=500, description="Maximum number of results")
@@ -395,9 +1097,17 @@ async def get_va_facilities_by_state(
                 detail="State code must be 2 characters (e.g., 'CA', 'NY')"
             )
         
-        va_facilities = await va_service.get_va_facilities_by_state(
-            state_code.upper(), facility_type
+        task = RefreshTask("va", state_code.upper(), facility_type)
+        va_facilities = await state_dataset(
+            task, lambda: va_service.get_va_facilities_by_state(task.state, facility_type)
         )
+        if va_facilities is None:
+            return refresh_pending(task)
+        
+        etag = dataset_etag("va", f"{state_code.upper()}:{facility_type}", va_facilities, limit)
+        not_modified = check_etag(request, response, etag, STATE_CACHE_CONTROL)
+        if not_modified:
+            return not_modified
         
         # Apply limit
         limited_facilities = va_facilities[:limit]
@@ -433,7 +1143,9 @@ async def get_va_facility_details(facility_id: str):
         if not facility_id.startswith("va_"):
             facility_id = f"va_{facility_id}"
         
-        va_facility = await va_service.get_va_facility_details(facility_id)
+        va_facility = await facility_details(
+            facility_id, lambda: va_service.get_va_facility_details(facility_id)
+        )
         
         if not va_facility:
             raise HTTPException(
@@ -459,11 +1171,12 @@ async def get_va_facility_details(facility_id: str):
 
 @app.get("/usda-facilities", tags=["USDA Facilities"])
 async def get_nearby_usda_facilities(
-    latitude: float = Query(..., description="User's latitude"),
-    longitude: float = Query(..., description="User's longitude"),
+    latitude: Optional[float] = Query(None, description="User's latitude"),
+    longitude: Optional[float] = Query(None, description="User's longitude"),
     radius_km: float = Query(50.0, description="Search radius in kilometers"),
     facility_types: str = Query("rural_development,snap,fsa", description="Comma-separated facility types"),
-    limit: int = Query(20, le=50, description="Maximum number of results")
+    limit: int = Query(20, ge=1, le=MAX_BBOX_RESULTS, description="Maximum number of results"),
+    bbox: Optional[str] = Query(None, description="Viewport as minLon,minLat,maxLon,maxLat")
 ):
     """
     Find nearby USDA (United States Department of Agriculture) facilities
@@ -473,14 +1186,34 @@ async def get_nearby_usda_facilities(
     - SNAP/Food Assistance Offices (food benefits, nutrition programs)
     - Farm Service Agency Centers (farm loans, conservation, crop insurance)
     - Extension Offices (agricultural education, 4-H programs)
+    
+    With ``bbox``, cached USDA facilities of the requested types inside the
+    viewport are returned instead, sorted by distance only when
+    latitude/longitude are given.
     """
-    try:
-        # Parse facility types
-        types_list = [t.strip() for t in facility_types.split(',') if t.strip()]
-        
-        usda_facilities = await usda_service.search_nearby_usda_facilities(
-            latitude, longitude, radius_km, types_list, limit
+    # Parse facility types
+    types_list = [t.strip() for t in facility_types.split(',') if t.strip()]
+    
+    if bbox:
+        return bbox_facilities_response(
+            "usda", bbox, limit, latitude, longitude,
+            "USDA - United States Department of Agriculture",
+            lambda f: f.get("metadata", {}).get("facility_type") in types_list
         )
+    
+    require_origin(latitude, longitude)
+    limit = min(limit, 50)
+    try:
+        # Types the refresh does not precompute (e.g. extension) are served live
+        if SERVE_PRECOMPUTED_ONLY and set(types_list) <= set(federal_refresher.usda_types):
+            usda_facilities = precomputed_nearby(
+                "usda", latitude, longitude, radius_km, limit,
+                lambda f: f.get("metadata", {}).get("facility_type") in types_list
+            )
+        else:
+            usda_facilities = await usda_service.search_nearby_usda_facilities(
+                latitude, longitude, radius_km, types_list, limit
+            )
         
         return {
             "status": "success",
@@ -502,8 +1235,20 @@ async def get_nearby_usda_facilities(
             detail=f"Error fetching USDA facilities: {str(e)}"
         )
 
+@app.post("/usda-facilities/nearest/batch", tags=["USDA Facilities"])
+async def get_nearest_usda_facilities_batch(request: BatchNearestRequest):
+    """
+    Get the k closest cached USDA facilities for up to 10,000 origins
+
+    Served from the facility store, so only states already fetched from
+    USDA are covered.
+    """
+    return batch_nearest_facilities("usda", request, "USDA - United States Department of Agriculture")
+
 @app.get("/usda-facilities/state/{state_code}", tags=["USDA Facilities"])
 async def get_usda_facilities_by_state(
+    request: Request,
+    response: Response,
     state_code: str,
     facility_types: str = Query("rural_development,snap,fsa", description="Comma-separated facility types"),
     limit: int = Query(100, le=500, description="Maximum number of results")
@@ -527,9 +1272,20 @@ async def get_usda_facilities_by_state(
         # Parse facility types
         types_list = [t.strip() for t in facility_types.split(',') if t.strip()]
         
-        usda_facilities = await usda_service.get_usda_facilities_by_state(
-            state_code.upper(), types_list
+        task = RefreshTask("usda", state_code.upper(), ",".join(sorted(types_list)))
+        usda_facilities = await state_dataset(
+            task, lambda: usda_service.get_usda_facilities_by_state(task.state, types_list)
+        )
+        if usda_facilities is None:
+            return refresh_pending(task)
+        
+        etag = dataset_etag(
+            "usda", f"{state_code.upper()}:{','.join(sorted(types_list))}",
+            usda_facilities, ",".join(types_list), limit
         )
+        not_modified = check_etag(request, response, etag, STATE_CACHE_CONTROL)
+        if not_modified:
+            return not_modified
         
         # Apply limit
         limited_facilities = usda_facilities[:limit]
@@ -565,7 +1321,9 @@ async def get_usda_facility_details(facility_id: str):
         if not facility_id.startswith("usda_"):
             facility_id = f"usda_{facility_id}"
         
-        usda_facility = await usda_service.get_usda_facility_details(facility_id)
+        usda_facility = await facility_details(
+            facility_id, lambda: usda_service.get_usda_facility_details(facility_id)
+        )
         
         if not usda_facility:
             raise HTTPException(
@@ -587,6 +1345,42 @@ async def get_usda_facility_details(facility_id: str):
             detail=f"Error fetching USDA facility details: {str(e)}"
         )
 
+# ========== VECTOR TILE ENDPOINTS ==========
+
+@app.get("/tiles/{z}/{x}/{y}.pbf", tags=["Tiles"])
+async def get_vector_tile(z: int, x: int, y: int, request: Request):
+    """
+    Get a Mapbox Vector Tile with utilities and cached federal facilities
+
+    Layers: utilities, health_centers, va_facilities and usda_facilities,
+    each clustered below zoom 17. Features carry category, verified and
+    wheelchair_accessible attributes.
+    """
+    if not (0 <= z <= 22 and 0 <= x < (1 << z) and 0 <= y < (1 << z)):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid tile coordinates {z}/{x}/{y}"
+        )
+    
+    etag = make_etag("t", BOOT_ID, *tile_service.data_version(z, x, y), z, x, y)
+    not_modified = check_etag(request, Response(), etag, TILE_CACHE_CONTROL)
+    if not_modified:
+        return not_modified
+    
+    try:
+        tile = tile_service.get_tile(z, x, y)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error rendering tile: {str(e)}"
+        )
+    
+    return Response(
+        content=tile,
+        media_type="application/vnd.mapbox-vector-tile",
+        headers={"ETag": etag, "Cache-Control": TILE_CACHE_CONTROL}
+    )
+
 # ========== RATING ENDPOINTS ==========
 
 @app.post("/utilities/{utility_id}/ratings", response_model=RatingResponse, tags=["Ratings"])
@@ -716,6 +1510,22 @@ async def report_utility(
             detail=f"Error submitting report: {str(e)}"
         )
 
+# ========== JOBS ENDPOINTS ==========
+
+@app.get("/jobs/{job_id}", tags=["Jobs"])
+async def get_job_status(job_id: str):
+    """
+    Get the state of a background job (refresh, import, index rebuild or
+    notification) and its result once finished
+    """
+    try:
+        return await asyncio.to_thread(job_dispatcher.status, job_id)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error fetching job status: {str(e)}"
+        )
+
 # ========== ANALYTICS ENDPOINTS ==========
 
 @app.get("/analytics/stats", tags=["Analytics"])
@@ -1,9 +1,17 @@
 """Database configuration and session management"""
 
-from sqlalchemy import create_engine
+from sqlalchemy import BigInteger, Column, MetaData, Table, create_engine, inspect, select, text
+from sqlalchemy.engine import Connection, Engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Union
+import csv
+import io
+import itertools
+import json
+import logging
 import os
+import uuid
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./urbanaid.db")
 
@@ -14,6 +22,18 @@ engine = create_engine(
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+logger = logging.getLogger(__name__)
+
+# Columns added to existing tables after their first release. create_all
+# only creates missing tables, so init_db adds these in place
+ADDED_COLUMNS = {
+    "utilities": ("created_by",),
+}
+
+# Rows per executemany batch (SQLite) and per COPY chunk (PostgreSQL)
+UPSERT_BATCH_SIZE = 5000
+COPY_CHUNK_SIZE = 50000
+
 def get_db():
     """Get database session"""
     db = SessionLocal()
@@ -25,5 +45,162 @@ def get_db():
 def init_db():
     """Initialize database tables"""
     # Import all models here to ensure they are registered
-    from . import utility, user, rating
-    Base.metadata.create_all(bind=engine) 
\ No newline at end of file
+    from . import utility, user, rating, facility
+    Base.metadata.create_all(bind=engine)
+    _add_missing_columns()
+    
+    if engine.dialect.name == "sqlite":
+        from .spatial import install_sqlite_rtree
+        install_sqlite_rtree(engine)
+    elif engine.dialect.name == "postgresql":
+        from .spatial import install_postgis
+        install_postgis(engine)
+
+def _add_missing_columns():
+    """Add ADDED_COLUMNS to tables created before they existed (nullable, no constraints)"""
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table_name, names in ADDED_COLUMNS.items():
+            existing = {column["name"] for column in inspector.get_columns(table_name)}
+            table = Base.metadata.tables[table_name]
+            for name in names:
+                if name in existing:
+                    continue
+                column_type = table.c[name].type.compile(dialect=engine.dialect)
+                conn.execute(text(f'ALTER TABLE "{table_name}" ADD COLUMN "{name}" {column_type}'))
+                logger.info(f"Added column {table_name}.{name}")
+
+def _batches(rows: Iterable[Dict[str, Any]], size: int) -> Iterator[List[Dict[str, Any]]]:
+    iterator = iter(rows)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+def _upsert_statement(insert, table: Table, columns: List[str], changed_column: Optional[str]):
+    """Build the ON CONFLICT (primary key) DO UPDATE clause shared by both dialects"""
+    keys = [column.name for column in table.primary_key.columns]
+    excluded = insert.excluded
+    set_ = {name: excluded[name] for name in columns if name not in keys}
+    # Core upserts skip Column.onupdate, so apply it like the ORM would
+    for column in table.columns:
+        if column.name not in set_ and column.onupdate is not None and column.onupdate.is_clause_element:
+            set_[column.name] = column.onupdate.arg
+    where = None
+    if changed_column is not None:
+        where = table.c[changed_column].is_distinct_from(excluded[changed_column])
+    if not set_:
+        return insert.on_conflict_do_nothing(index_elements=keys)
+    return insert.on_conflict_do_update(index_elements=keys, set_=set_, where=where)
+
+def _copy_value(value: Any) -> Any:
+    if value is None:
+        return "\\N"
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, default=str)
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    return value
+
+def _sqlite_upsert(conn: Connection, table: Table, rows: Iterable[Dict[str, Any]], batch_size: int, changed_column: Optional[str]) -> int:
+    from sqlalchemy.dialects.sqlite import insert
+
+    written = 0
+    statement = None
+    for batch in _batches(rows, batch_size):
+        if statement is None:
+            columns = list(batch[0])
+            statement = _upsert_statement(insert(table), table, columns, changed_column)
+        conn.execute(statement, batch)
+        written += len(batch)
+    return written
+
+def _postgres_upsert(conn: Connection, table: Table, rows: Iterable[Dict[str, Any]], batch_size: int, changed_column: Optional[str]) -> int:
+    from sqlalchemy.dialects.postgresql import insert
+
+    written = 0
+    staging = None
+    columns: List[str] = []
+    cursor = conn.connection.cursor()
+    try:
+        for chunk in _batches(rows, max(batch_size, COPY_CHUNK_SIZE)):
+            if staging is None:
+                columns = list(chunk[0])
+                staging = Table(
+                    f"{table.name}_staging_{uuid.uuid4().hex[:8]}",
+                    MetaData(),
+                    *(Column(name, table.c[name].type) for name in columns),
+                    Column("_seq", BigInteger)
+                )
+                conn.execute(text(
+                    f'CREATE TEMPORARY TABLE "{staging.name}" '
+                    f'(LIKE "{table.name}" INCLUDING DEFAULTS) ON COMMIT DROP'
+                ))
+                conn.execute(text(f'ALTER TABLE "{staging.name}" ADD COLUMN _seq bigserial'))
+
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            for row in chunk:
+                writer.writerow([_copy_value(row.get(name)) for name in columns])
+            buffer.seek(0)
+            column_list = ", ".join(f'"{name}"' for name in columns)
+            cursor.copy_expert(
+                f'COPY "{staging.name}" ({column_list}) FROM STDIN WITH (FORMAT csv, NULL \'\\N\')',
+                buffer
+            )
+            written += len(chunk)
+    finally:
+        cursor.close()
+
+    if staging is None:
+        return 0
+
+    # The last copy of a key wins, as it would with row-by-row upserts
+    keys = [staging.c[column.name] for column in table.primary_key.columns]
+    latest = (
+        select(*(staging.c[name] for name in columns))
+        .distinct(*keys)
+        .order_by(*keys, staging.c._seq.desc())
+    )
+    conn.execute(_upsert_statement(insert(table).from_select(columns, latest), table, columns, changed_column))
+    return written
+
+def bulk_upsert(
+    table: Any,
+    rows: Iterable[Dict[str, Any]],
+    bind: Union[Engine, Connection, None] = None,
+    batch_size: int = UPSERT_BATCH_SIZE,
+    changed_column: Optional[str] = None
+) -> int:
+    """
+    Insert or update many rows keyed on the primary key, streaming
+
+    SQLite runs INSERT ... ON CONFLICT DO UPDATE as executemany batches;
+    PostgreSQL COPYs the rows into a temporary staging table and merges it
+    with one INSERT ... SELECT ... ON CONFLICT DO UPDATE. Either way the
+    whole load is a single transaction and only one batch is held in
+    memory at a time. Every row must have the same keys.
+
+    Args:
+        table: Model class or Table to load into
+        rows: Iterable of column dicts (may be a generator)
+        bind: Engine or connection to use (defaults to the app engine)
+        batch_size: Rows per executemany batch
+        changed_column: When set, existing rows are only rewritten if this
+            column (e.g. a content hash) differs
+
+    Returns:
+        Number of rows processed
+    """
+    table = getattr(table, "__table__", table)
+    bind = bind if bind is not None else engine
+    upsert = _postgres_upsert if bind.dialect.name == "postgresql" else _sqlite_upsert
+
+    if isinstance(bind, Connection):
+        written = upsert(bind, table, rows, batch_size, changed_column)
+    else:
+        with bind.begin() as conn:
+            written = upsert(conn, table, rows, batch_size, changed_column)
+    logger.info(f"Upserted {written} rows into {table.name}")
+    return written
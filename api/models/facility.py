@@ -0,0 +1,81 @@
+"""Facility model for imported federal facility data (HRSA, VA, USDA)"""
+
+import hashlib
+import json
+
+from sqlalchemy import Column, String, Float, DateTime, Integer, JSON, Index
+from sqlalchemy.sql import func
+from .database import Base
+
+class Facility(Base):
+    __tablename__ = "facilities"
+    __table_args__ = (
+        Index("ix_facilities_source_state", "source", "state"),
+        Index("ix_facilities_lat_lon", "latitude", "longitude"),
+    )
+
+    # Prefixed ID as served by the API, e.g. 'hrsa_<site id>'
+    id = Column(String, primary_key=True)
+    source = Column(String, nullable=False)
+    state = Column(String(2))
+    name = Column(String)
+    category = Column(String)
+    subcategory = Column(String)
+    latitude = Column(Float)
+    longitude = Column(Float)
+    # Full transformed record, exactly as the API returns it
+    data = Column(JSON, nullable=False)
+    content_hash = Column(String(40))
+    last_updated = Column(String)
+    imported_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    def to_dict(self) -> dict:
+        """Return the stored API record"""
+        return dict(self.data)
+
+class SyncWatermark(Base):
+    __tablename__ = "sync_watermarks"
+
+    source = Column(String, primary_key=True)
+    # Dataset key within the source, e.g. 'CA' or 'CA:health'
+    dataset = Column(String, primary_key=True)
+    # Highest upstream last_updated value seen so far
+    watermark = Column(String)
+    record_count = Column(Integer, default=0)
+    inserted = Column(Integer, default=0)
+    updated = Column(Integer, default=0)
+    deleted = Column(Integer, default=0)
+    synced_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    def to_dict(self) -> dict:
+        return {
+            "source": self.source,
+            "dataset": self.dataset,
+            "watermark": self.watermark,
+            "record_count": self.record_count,
+            "inserted": self.inserted,
+            "updated": self.updated,
+            "deleted": self.deleted,
+            "synced_at": self.synced_at.isoformat() if self.synced_at else None,
+        }
+
+def content_hash(record: dict) -> str:
+    """Stable digest of a transformed API record"""
+    payload = json.dumps(record, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+def facility_row(record: dict, source: str, state: str = None) -> dict:
+    """Build a facilities table row from a transformed API record"""
+    return {
+        "id": record["id"],
+        "source": source,
+        "state": (state or "").upper()[:2] or None,
+        "name": record.get("name"),
+        "category": record.get("category"),
+        "subcategory": record.get("subcategory"),
+        "latitude": record.get("latitude"),
+        "longitude": record.get("longitude"),
+        "data": record,
+        "content_hash": content_hash(record),
+        "last_updated": str(record.get("verification", {}).get("last_updated") or "") or None,
+    }
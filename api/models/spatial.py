@@ -0,0 +1,204 @@
+"""Spatial index support for the utilities table"""
+
+import logging
+from typing import List, Optional, Tuple
+
+from sqlalchemy import Column, Float, Integer, MetaData, Table, func, literal_column, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Query, Session
+
+logger = logging.getLogger(__name__)
+
+# Set once install_postgis has created the geography column and its index
+_postgis_ready = False
+
+# Kept out of Base.metadata so create_all never tries to build it as a plain table
+rtree_metadata = MetaData()
+
+utilities_rtree = Table(
+    "utilities_rtree",
+    rtree_metadata,
+    Column("id", Integer, primary_key=True),
+    Column("min_lat", Float),
+    Column("max_lat", Float),
+    Column("min_lon", Float),
+    Column("max_lon", Float),
+)
+
+SQLITE_RTREE_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS utilities_rtree
+    USING rtree(id, min_lat, max_lat, min_lon, max_lon)
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS utilities_rtree_insert
+    AFTER INSERT ON utilities
+    WHEN new.latitude IS NOT NULL AND new.longitude IS NOT NULL
+    BEGIN
+        INSERT OR REPLACE INTO utilities_rtree
+        VALUES (new.rowid, new.latitude, new.latitude, new.longitude, new.longitude);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS utilities_rtree_update
+    AFTER UPDATE OF latitude, longitude ON utilities
+    BEGIN
+        DELETE FROM utilities_rtree WHERE id = old.rowid;
+        INSERT INTO utilities_rtree
+        SELECT new.rowid, new.latitude, new.latitude, new.longitude, new.longitude
+        WHERE new.latitude IS NOT NULL AND new.longitude IS NOT NULL;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS utilities_rtree_delete
+    AFTER DELETE ON utilities
+    BEGIN
+        DELETE FROM utilities_rtree WHERE id = old.rowid;
+    END
+    """,
+]
+
+POSTGIS_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS postgis",
+    """
+    ALTER TABLE utilities ADD COLUMN IF NOT EXISTS geog geography(Point, 4326)
+    GENERATED ALWAYS AS (
+        ST_SetSRID(ST_MakePoint(longitude, latitude), 4326)::geography
+    ) STORED
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_utilities_geog ON utilities USING GIST (geog)",
+]
+
+
+def install_sqlite_rtree(engine: Engine):
+    """
+    Create the R*Tree virtual table and its sync triggers on SQLite
+
+    Rows that predate the triggers are backfilled. The R*Tree is keyed on
+    the utilities rowid, which VACUUM may renumber; run
+    ``rebuild_sqlite_rtree`` after vacuuming the database file.
+    """
+    with engine.begin() as connection:
+        for statement in SQLITE_RTREE_DDL:
+            connection.execute(text(statement))
+        connection.execute(text("""
+            INSERT INTO utilities_rtree
+            SELECT rowid, latitude, latitude, longitude, longitude FROM utilities
+            WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+            AND rowid NOT IN (SELECT id FROM utilities_rtree)
+        """))
+
+
+def rebuild_sqlite_rtree(engine: Engine):
+    """Repopulate the R*Tree from scratch"""
+    with engine.begin() as connection:
+        connection.execute(text("DELETE FROM utilities_rtree"))
+        connection.execute(text("""
+            INSERT INTO utilities_rtree
+            SELECT rowid, latitude, latitude, longitude, longitude FROM utilities
+            WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+        """))
+
+
+def reindex_postgis(engine: Engine) -> bool:
+    """Rebuild the GiST index and refresh planner statistics on PostgreSQL"""
+    try:
+        with engine.begin() as connection:
+            connection.execute(text("REINDEX INDEX ix_utilities_geog"))
+            connection.execute(text("ANALYZE utilities"))
+    except SQLAlchemyError as e:
+        logger.warning(f"Could not rebuild the PostGIS index: {e}")
+        return False
+    return True
+
+
+def install_postgis(engine: Engine) -> bool:
+    """
+    Add a generated geography(Point) column with a GiST index on PostgreSQL
+
+    The column is derived from latitude/longitude, so ORM writes keep it
+    current without extra code. Returns False (and queries fall back to
+    plain range predicates) when the PostGIS extension is unavailable.
+    """
+    global _postgis_ready
+    try:
+        with engine.begin() as connection:
+            for statement in POSTGIS_DDL:
+                connection.execute(text(statement))
+    except SQLAlchemyError as e:
+        logger.warning(f"PostGIS unavailable, using lat/lon range queries: {e}")
+        _postgis_ready = False
+        return False
+
+    _postgis_ready = True
+    return True
+
+
+def postgis_enabled(db: Session) -> bool:
+    """Whether radius queries on this session can be pushed down to PostGIS"""
+    return _postgis_ready and db.get_bind().dialect.name == "postgresql"
+
+
+def query_postgis_nearby(
+    query: Query,
+    model,
+    latitude: float,
+    longitude: float,
+    radius_km: Optional[float],
+    limit: int
+) -> List[Tuple[object, float]]:
+    """
+    Radius and/or k-nearest search answered entirely by PostGIS
+
+    Uses ST_DWithin for the radius cut (GiST-indexed) and KNN ``<->``
+    ordering, so filtering, sorting and limiting all happen in the database.
+
+    Returns:
+        List of (model instance, distance_km) tuples, nearest first
+    """
+    geog = literal_column(f"{model.__tablename__}.geog")
+    origin = func.geography(func.ST_SetSRID(func.ST_MakePoint(longitude, latitude), 4326))
+
+    query = query.add_columns(func.ST_Distance(geog, origin).label("distance_m"))
+    if radius_km is not None:
+        query = query.filter(func.ST_DWithin(geog, origin, radius_km * 1000.0))
+
+    rows = query.order_by(geog.op("<->")(origin)).limit(limit).all()
+    return [(instance, distance_m / 1000.0) for instance, distance_m in rows]
+
+
+def filter_bbox(
+    query: Query,
+    model,
+    min_lat: float,
+    min_lon: float,
+    max_lat: float,
+    max_lon: float
+) -> Query:
+    """
+    Restrict a utilities query to a bounding box
+
+    On SQLite the box is answered by the R*Tree; other dialects fall back to
+    plain range predicates on the latitude/longitude columns. Boxes that
+    cross the antimeridian (given either as min_lon > max_lon or with
+    longitudes outside [-180, 180]) are widened to the full longitude range.
+    """
+    if min_lon < -180.0 or max_lon > 180.0 or min_lon > max_lon:
+        min_lon, max_lon = -180.0, 180.0
+
+    if query.session.get_bind().dialect.name == "sqlite":
+        return query.join(
+            utilities_rtree,
+            utilities_rtree.c.id == literal_column(f"{model.__tablename__}.rowid")
+        ).filter(
+            utilities_rtree.c.max_lat >= min_lat,
+            utilities_rtree.c.min_lat <= max_lat,
+            utilities_rtree.c.max_lon >= min_lon,
+            utilities_rtree.c.min_lon <= max_lon,
+        )
+
+    return query.filter(
+        model.latitude.between(min_lat, max_lat),
+        model.longitude.between(min_lon, max_lon),
+    )
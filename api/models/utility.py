@@ -1,11 +1,14 @@
 """Utility model for storing public utilities data"""
 
-from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, Text
+from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, Text, Index, ForeignKey
 from sqlalchemy.sql import func
 from .database import Base
 
 class Utility(Base):
     __tablename__ = "utilities"
+    __table_args__ = (
+        Index("ix_utilities_lat_lon", "latitude", "longitude"),
+    )
 
     id = Column(String, primary_key=True, index=True)
     name = Column(String, index=True)
@@ -16,5 +19,23 @@ class Utility(Base):
     description = Column(Text)
     verified = Column(Boolean, default=False)
     wheelchair_accessible = Column(Boolean, default=False)
+    # User who submitted the utility; only they may edit or delete it
+    created_by = Column(Integer, ForeignKey("users.id"), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now()) 
\ No newline at end of file
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+    def to_dict(self) -> dict:
+        """Serialize the utility for API responses and in-memory indexes"""
+        return {
+            "id": self.id,
+            "name": self.name,
+            "category": self.category,
+            "subcategory": self.subcategory,
+            "latitude": self.latitude,
+            "longitude": self.longitude,
+            "description": self.description,
+            "verified": bool(self.verified),
+            "wheelchair_accessible": bool(self.wheelchair_accessible),
+            "created_at": self.created_at,
+            "updated_at": self.updated_at
+        }
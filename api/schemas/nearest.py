@@ -0,0 +1,17 @@
+"""Batch nearest-neighbour schemas"""
+
+from pydantic import BaseModel, Field
+from typing import List, Optional
+
+MAX_BATCH_ORIGINS = 10000
+
+class NearestOrigin(BaseModel):
+    latitude: float = Field(..., ge=-90, le=90)
+    longitude: float = Field(..., ge=-180, le=180)
+    id: Optional[str] = Field(None, description="Caller's reference, echoed in the result")
+
+class BatchNearestRequest(BaseModel):
+    origins: List[NearestOrigin] = Field(..., min_length=1, max_length=MAX_BATCH_ORIGINS)
+    k: int = Field(5, ge=1, le=50, description="Results per origin")
+    category: Optional[str] = Field(None, description="Filter by category (utilities only)")
+    max_distance_km: Optional[float] = Field(None, gt=0, description="Ignore matches farther than this")
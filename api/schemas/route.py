@@ -0,0 +1,12 @@
+"""Route-corridor search schemas"""
+
+from pydantic import BaseModel, Field
+from typing import Optional
+
+class RouteSearchRequest(BaseModel):
+    polyline: str = Field(..., description="Encoded polyline of the route")
+    buffer_m: float = Field(200.0, gt=0, le=5000, description="Corridor half-width in meters")
+    precision: int = Field(5, ge=5, le=6, description="Polyline precision (5 Google, 6 OSRM)")
+    category: Optional[str] = Field(None, description="Only include utilities of this category")
+    include_facilities: bool = Field(True, description="Include cached HRSA/VA/USDA facilities")
+    limit: int = Field(500, ge=1, le=2000, description="Maximum number of results")
@@ -26,6 +26,7 @@ class UtilityResponse(UtilityBase):
     verified: bool
     wheelchair_accessible: bool
     created_at: datetime
+    distance_km: Optional[float] = None
     
     class Config:
         from_attributes = True
@@ -0,0 +1,800 @@
+"""
+Response cache for upstream federal data
+Two tiers: a per-process TTL + LRU cache and an optional Redis store
+shared by every worker, plus a decorator that caches async service
+methods under normalized keys and serves stale entries while they are
+refreshed in the background
+"""
+
+import asyncio
+import functools
+import inspect
+import json
+import logging
+import math
+import os
+import pickle
+import threading
+import time
+import uuid
+import weakref
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+from services.location_service import haversine_km
+from services.spatial_index import (
+    KM_PER_DEGREE_LAT,
+    bounding_box,
+    geohash_cell_size,
+    geohash_cells_in_bbox,
+    geohash_decode,
+    geohash_encode,
+)
+
+logger = logging.getLogger(__name__)
+
+# Federal data changes at most daily; VA operating status moves a bit faster.
+# After the soft TTL an entry is served stale and refreshed in the background.
+DEFAULT_TTLS = {
+    "hrsa": 24 * 3600,
+    "va": 6 * 3600,
+    "usda": 24 * 3600,
+}
+
+# After the hard TTL an entry is gone and callers wait for upstream
+DEFAULT_HARD_TTLS = {
+    "hrsa": 7 * 24 * 3600,
+    "va": 2 * 24 * 3600,
+    "usda": 7 * 24 * 3600,
+}
+
+# Background refreshes allowed in flight per source and process
+DEFAULT_REFRESH_CONCURRENCY = 2
+
+MISSING = object()
+
+L2_KEY_PREFIX = "urbanaid:cache:"
+L2_LOCK_PREFIX = "urbanaid:lock:"
+L2_GENERATION_PREFIX = "urbanaid:generation:"
+
+# Other processes pick up a bumped key generation within this many seconds
+GENERATION_TTL = 30.0
+
+# A fill lock outlives the 30 s upstream timeout so a slow fetch keeps it
+FILL_LOCK_TTL = 35.0
+FILL_POLL_INTERVAL = 0.05
+
+# After a Redis failure, stay on L1 only for this long before retrying
+L2_RETRY_AFTER = 30.0
+
+# Nearby searches are rounded up to one of these radii before caching
+NEARBY_RADIUS_BUCKETS_KM = (1, 2, 5, 10, 25, 50, 100, 250, 500)
+
+# Nearby origins snap to the finest geohash cell at least this fraction of
+# the (bucketed) radius wide; larger values share more, smaller fetch less
+NEARBY_CELL_FRACTION = float(os.getenv("NEARBY_CELL_FRACTION", "0.25"))
+MAX_NEARBY_PRECISION = 8
+
+# Candidates fetched per cell (the VA API's page size limit); a full set is
+# only trusted where nearby_results_exact says it covers the user
+NEARBY_CANDIDATE_LIMIT = 200
+
+
+def source_ttl(source: str) -> int:
+    """Soft TTL in seconds for a source, overridable with CACHE_TTL_<SOURCE>"""
+    default = DEFAULT_TTLS.get(source, 3600)
+    return int(os.getenv(f"CACHE_TTL_{source.upper()}", str(default)))
+
+
+def source_hard_ttl(source: str) -> int:
+    """Hard TTL in seconds for a source, overridable with CACHE_HARD_TTL_<SOURCE>"""
+    default = DEFAULT_HARD_TTLS.get(source, source_ttl(source))
+    return max(int(os.getenv(f"CACHE_HARD_TTL_{source.upper()}", str(default))), source_ttl(source))
+
+
+# Semaphores bind to the loop they first wait on, and jobs run each under
+# their own asyncio.run, so the caps are kept per event loop
+_refresh_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Semaphore]]" = (
+    weakref.WeakKeyDictionary()
+)
+_refresh_semaphores_lock = threading.Lock()
+
+
+def refresh_semaphore(source: str) -> asyncio.Semaphore:
+    """Per-source cap on background refreshes in the running loop, from REFRESH_CONCURRENCY_<SOURCE>"""
+    loop = asyncio.get_running_loop()
+    with _refresh_semaphores_lock:
+        semaphores = _refresh_semaphores.setdefault(loop, {})
+        semaphore = semaphores.get(source)
+        if semaphore is None:
+            limit = int(os.getenv(f"REFRESH_CONCURRENCY_{source.upper()}", str(DEFAULT_REFRESH_CONCURRENCY)))
+            semaphore = semaphores[source] = asyncio.Semaphore(limit)
+    return semaphore
+
+
+class NearbyCell(NamedTuple):
+    """Geo-quantized nearby search: the cell to cache and what to fetch for it"""
+    geohash: str
+    latitude: float
+    longitude: float
+    radius_km: float
+
+
+def nearby_cell(latitude: float, longitude: float, radius_km: float) -> NearbyCell:
+    """
+    Snap a nearby search to a shared geohash cell
+
+    Every origin inside the returned cell shares one cached candidate set:
+    everything within the bucketed radius plus a full cell width of the
+    cell center, which reaches into the neighbouring cells far enough to
+    contain any in-cell user's search circle. Exact distances and ordering
+    are then computed per user from those candidates.
+
+    Args:
+        latitude: User's latitude
+        longitude: User's longitude
+        radius_km: Requested search radius in kilometers
+
+    Returns:
+        NearbyCell with the geohash, its center and the candidate radius
+    """
+    bucket = next((b for b in NEARBY_RADIUS_BUCKETS_KM if b >= radius_km), radius_km)
+    geohash = geohash_encode(latitude, longitude, _nearby_precision(latitude, bucket))
+    return _nearby_cell_for(geohash, bucket)
+
+
+def _nearby_precision(latitude: float, bucket: float) -> int:
+    """Finest geohash precision whose cells are still a fraction of the bucket wide"""
+    cos_lat = max(math.cos(math.radians(latitude)), 0.01)
+    precision = 1
+    for candidate in range(2, MAX_NEARBY_PRECISION + 1):
+        lat_size, lon_size = geohash_cell_size(candidate)
+        width_km = min(lat_size * KM_PER_DEGREE_LAT, lon_size * KM_PER_DEGREE_LAT * cos_lat)
+        if width_km < bucket * NEARBY_CELL_FRACTION:
+            break
+        precision = candidate
+    return precision
+
+
+def _nearby_cell_for(geohash: str, bucket: float) -> NearbyCell:
+    # Sized from the cell center so every origin in the cell shares one key
+    center_lat, center_lon = geohash_decode(geohash)
+    cos_lat = max(math.cos(math.radians(center_lat)), 0.01)
+    lat_size, lon_size = geohash_cell_size(len(geohash))
+    cell_km = max(lat_size * KM_PER_DEGREE_LAT, lon_size * KM_PER_DEGREE_LAT * cos_lat)
+    return NearbyCell(geohash, center_lat, center_lon, round(bucket + cell_km, 3))
+
+
+def nearby_results_exact(
+    cell: NearbyCell,
+    latitude: float,
+    longitude: float,
+    radius_km: float,
+    candidates: Sequence[Dict[str, Any]],
+    results: Sequence[Dict[str, Any]],
+    limit: int
+) -> bool:
+    """
+    Whether results ranked from a cell's candidate set are exact for a user
+
+    A set cut at NEARBY_CANDIDATE_LIMIT holds only the facilities nearest
+    the cell center, out to the farthest one kept. Anything the user's
+    results could be missing lies within their offset from the center
+    plus their reach: the last result's distance when ``limit`` were
+    found, the whole radius otherwise. The results are exact while that
+    stays inside the kept distance; if not, callers query around the user
+    directly.
+
+    Args:
+        cell: The cell the candidates were fetched for
+        latitude, longitude: User's location
+        radius_km: User's search radius
+        candidates: The cell's candidate set, nearest to its center first
+        results: Candidates ranked for the user, with ``distance_km``
+        limit: Results the user asked for
+
+    Returns:
+        True when no facility closer to the user can have been cut
+    """
+    if len(candidates) < NEARBY_CANDIDATE_LIMIT:
+        return True
+    kept_km = max(
+        (
+            haversine_km(cell.latitude, cell.longitude, c["latitude"], c["longitude"])
+            for c in candidates
+            if c.get("latitude") is not None and c.get("longitude") is not None
+        ),
+        default=0.0
+    )
+    # distance_km is rounded to 10 m
+    reach_km = results[-1]["distance_km"] + 0.01 if len(results) >= limit else radius_km
+    return haversine_km(cell.latitude, cell.longitude, latitude, longitude) + reach_km < kept_km
+
+
+def nearby_cells_containing(latitude: float, longitude: float) -> Set[Tuple[str, float]]:
+    """
+    Every bucketed nearby cell whose candidate set can include a point
+
+    Used to invalidate only the cached candidate sets a changed facility
+    appears in. Cells are matched by bounding box, so a few cells just
+    outside the candidate circle are included too; searches wider than
+    the largest bucket are not covered and expire by TTL.
+
+    Returns:
+        Set of (geohash, candidate radius km) as passed to the cached
+        candidate methods
+    """
+    cells = set()
+    for bucket in NEARBY_RADIUS_BUCKETS_KM:
+        cell = nearby_cell(latitude, longitude, bucket)
+        min_lat, min_lon, max_lat, max_lon = bounding_box(latitude, longitude, cell.radius_km)
+        # Origins across the box may snap to a different precision
+        precisions = {_nearby_precision(lat, bucket) for lat in (min_lat, latitude, max_lat)}
+        for precision in precisions:
+            for geohash in geohash_cells_in_bbox(min_lat, min_lon, max_lat, max_lon, precision):
+                neighbour = _nearby_cell_for(geohash, bucket)
+                if abs(neighbour.latitude - latitude) * KM_PER_DEGREE_LAT <= neighbour.radius_km:
+                    cells.add((geohash, neighbour.radius_km))
+    return cells
+
+
+def _normalize(value: Any) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, str):
+        return value.strip().lower()
+    if isinstance(value, float):
+        return repr(round(value, 6))
+    if isinstance(value, (list, tuple, set, frozenset)):
+        # Facility type lists are filters, so their order must not matter
+        return ",".join(sorted(_normalize(item) for item in value))
+    return str(value)
+
+
+def cache_key(source: str, name: str, *parts: Any) -> str:
+    """
+    Build a cache key from a source, an operation name and its arguments
+
+    Strings are case- and whitespace-insensitive and sequences are
+    order-insensitive, so 'ca' and ' CA' or ['snap', 'fsa'] and
+    ['fsa', 'snap'] share an entry.
+    """
+    return f"{source}:{name}:" + "|".join(_normalize(part) for part in parts)
+
+
+def _sizeof(value: Any) -> int:
+    try:
+        return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return 0
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache with per-entry soft and hard expiry
+
+    Bounded both by entry count and by the approximate pickled size of the
+    stored values; the least recently used entries are evicted first.
+    Entries past their soft expiry are still returned, flagged as stale,
+    until their hard expiry.
+    """
+
+    def __init__(self, max_entries: int = 2048, max_bytes: int = 256 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, Tuple[float, float, int, Any]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Any:
+        """Return a cached value (fresh or stale), or MISSING"""
+        return self.get_entry(key)[0]
+
+    def get_entry(self, key: str) -> Tuple[Any, bool]:
+        """Return (value, stale), or (MISSING, False) past the hard expiry"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return MISSING, False
+            fresh_until, expires_at, size, value = entry
+            now = time.monotonic()
+            if expires_at <= now:
+                self._pop(key)
+                self.misses += 1
+                return MISSING, False
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value, fresh_until <= now
+
+    def set(self, key: str, value: Any, ttl: float, hard_ttl: Optional[float] = None):
+        """Store a value, fresh for ttl seconds and kept for hard_ttl"""
+        size = _sizeof(value)
+        if size > self.max_bytes:
+            logger.warning(f"Not caching {key}: {size} bytes exceeds the cache size limit")
+            return
+
+        with self._lock:
+            self._pop(key)
+            now = time.monotonic()
+            self._entries[key] = (now + ttl, now + max(hard_ttl or ttl, ttl), size, value)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._pop(oldest)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._pop(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _pop(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        _, _, size, _ = entry
+        self._bytes -= size
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+class LocalRedis:
+    """
+    In-process stand-in for the subset of ``redis.asyncio.Redis`` the
+    cache uses (get/set with ex/px/nx, incr, delete, ping)
+
+    Several TieredCache instances sharing one LocalRedis behave like
+    workers sharing a Redis server, which is enough for tests and local
+    development without a Redis container.
+    """
+
+    def __init__(self):
+        self._data: Dict[str, Tuple[Optional[float], bytes]] = {}
+
+    def _live(self, name: str) -> Optional[bytes]:
+        entry = self._data.get(name)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._data[name]
+            return None
+        return value
+
+    async def ping(self) -> bool:
+        return True
+
+    async def get(self, name: str) -> Optional[bytes]:
+        return self._live(name)
+
+    async def set(self, name: str, value: Any, ex: Optional[float] = None, px: Optional[float] = None, nx: bool = False):
+        if nx and self._live(name) is not None:
+            return None
+        if isinstance(value, str):
+            value = value.encode()
+        ttl = ex if ex is not None else (px / 1000.0 if px is not None else None)
+        self._data[name] = (time.monotonic() + ttl if ttl is not None else None, value)
+        return True
+
+    async def incr(self, name: str) -> int:
+        entry = self._data.get(name)
+        expires_at = entry[0] if entry is not None else None
+        value = int(self._live(name) or 0) + 1
+        self._data[name] = (expires_at, str(value).encode())
+        return value
+
+    async def delete(self, *names: str) -> int:
+        return sum(self._data.pop(name, None) is not None for name in names)
+
+    async def aclose(self):
+        self._data.clear()
+
+
+def redis_from_env() -> Optional[Any]:
+    """Create a ``redis.asyncio`` client from REDIS_URL, or None when unset"""
+    url = os.getenv("REDIS_URL")
+    if not url:
+        return None
+    import redis.asyncio as redis_asyncio
+    return redis_asyncio.from_url(url, socket_timeout=1.0, socket_connect_timeout=1.0)
+
+
+class TieredCache:
+    """
+    L1 per-process TTLCache in front of an optional shared L2 Redis
+
+    L2 values are JSON so every worker (and any other consumer) can read
+    them. When Redis is not configured or stops answering, the cache keeps
+    working on L1 alone and retries L2 after L2_RETRY_AFTER seconds.
+    """
+
+    def __init__(self, l1: Optional[TTLCache] = None, redis: Optional[Any] = None):
+        self.l1 = l1 if l1 is not None else TTLCache()
+        self.redis = redis
+        self._l2_retry_at = 0.0
+        self._refreshing: Dict[str, asyncio.Task] = {}
+        # Namespace -> (generation, monotonic time it was read from L2)
+        self._generations: Dict[str, Tuple[int, float]] = {}
+
+    @property
+    def l2_enabled(self) -> bool:
+        return self.redis is not None and time.monotonic() >= self._l2_retry_at
+
+    def _l2_failed(self, error: Exception):
+        logger.warning(f"Redis cache unavailable, using in-process cache only: {error}")
+        self._l2_retry_at = time.monotonic() + L2_RETRY_AFTER
+
+    async def connect(self) -> bool:
+        """Check that L2 is reachable; returns False when running on L1 only"""
+        if self.redis is None:
+            return False
+        try:
+            await self.redis.ping()
+            return True
+        except Exception as e:
+            self._l2_failed(e)
+            return False
+
+    async def close(self):
+        for task in list(self._refreshing.values()):
+            task.cancel()
+        if self.redis is not None:
+            try:
+                await self.redis.aclose()
+            except Exception as e:
+                logger.warning(f"Error closing Redis cache: {e}")
+
+    async def get(self, key: str) -> Any:
+        """Return a cached value from L1, then L2, or MISSING"""
+        return (await self.get_entry(key))[0]
+
+    async def get_entry(self, key: str, prefer_l2: bool = False) -> Tuple[Any, bool]:
+        """
+        Return (value, stale) from L1, then L2, or (MISSING, False)
+
+        With ``prefer_l2`` L2 is read first, so a value another process
+        wrote replaces an older copy held in L1.
+        """
+        if not prefer_l2 or not self.l2_enabled:
+            value, stale = self.l1.get_entry(key)
+            if value is not MISSING or not self.l2_enabled:
+                return value, stale
+
+        try:
+            raw = await self.redis.get(L2_KEY_PREFIX + key)
+        except Exception as e:
+            self._l2_failed(e)
+            return self.l1.get_entry(key) if prefer_l2 else (MISSING, False)
+        if raw is None:
+            return self.l1.get_entry(key) if prefer_l2 else (MISSING, False)
+
+        envelope = json.loads(raw)
+        now = time.time()
+        remaining = envelope["expires_at"] - now
+        if remaining <= 0:
+            return MISSING, False
+        fresh_for = envelope.get("fresh_until", envelope["expires_at"]) - now
+        self.l1.set(key, envelope["value"], max(fresh_for, 0.0), remaining)
+        return envelope["value"], fresh_for <= 0
+
+    async def set(self, key: str, value: Any, ttl: float, hard_ttl: Optional[float] = None):
+        """Store a value in both tiers, fresh for ttl and kept for hard_ttl"""
+        hard_ttl = max(hard_ttl or ttl, ttl)
+        self.l1.set(key, value, ttl, hard_ttl)
+        if not self.l2_enabled:
+            return
+        now = time.time()
+        envelope = json.dumps(
+            {"fresh_until": now + ttl, "expires_at": now + hard_ttl, "value": value},
+            default=str
+        )
+        try:
+            await self.redis.set(L2_KEY_PREFIX + key, envelope, px=int(hard_ttl * 1000))
+        except Exception as e:
+            self._l2_failed(e)
+
+    def prime(self, key: str, value: Any, ttl: float, hard_ttl: float) -> bool:
+        """
+        Seed L1 with a value from elsewhere (e.g. an on-disk snapshot)
+
+        Only L1 is touched so an older value never overwrites a fresher
+        shared one, and an existing entry is left alone.
+        """
+        if hard_ttl <= 0 or self.l1.get_entry(key)[0] is not MISSING:
+            return False
+        self.l1.set(key, value, max(ttl, 0.0), hard_ttl)
+        return True
+
+    async def generation(self, namespace: str) -> int:
+        """
+        Current generation of a key namespace, 0 until first bumped
+
+        Callers put it in their cache keys, so bump_generation drops a
+        whole namespace at once. It is re-read from L2 at most every
+        GENERATION_TTL seconds and never goes backwards in this process.
+        """
+        local, checked_at = self._generations.get(namespace, (0, -GENERATION_TTL))
+        if not self.l2_enabled or time.monotonic() - checked_at < GENERATION_TTL:
+            return local
+        try:
+            raw = await self.redis.get(L2_GENERATION_PREFIX + namespace)
+        except Exception as e:
+            self._l2_failed(e)
+            return local
+        generation = max(local, int(raw) if raw is not None else 0)
+        self._generations[namespace] = (generation, time.monotonic())
+        return generation
+
+    async def bump_generation(self, namespace: str) -> int:
+        """Move a key namespace to a new generation; returns the new one"""
+        generation = await self.generation(namespace) + 1
+        if self.l2_enabled:
+            try:
+                generation = max(generation, int(await self.redis.incr(L2_GENERATION_PREFIX + namespace)))
+            except Exception as e:
+                self._l2_failed(e)
+        self._generations[namespace] = (generation, time.monotonic())
+        return generation
+
+    async def delete(self, key: str):
+        self.l1.delete(key)
+        if self.l2_enabled:
+            try:
+                await self.redis.delete(L2_KEY_PREFIX + key)
+            except Exception as e:
+                self._l2_failed(e)
+
+    async def delete_many(self, keys: Iterable[str], chunk_size: int = 500) -> int:
+        """Delete many keys from both tiers; returns how many were given"""
+        keys = list(keys)
+        for key in keys:
+            self.l1.delete(key)
+        if self.l2_enabled:
+            try:
+                for start in range(0, len(keys), chunk_size):
+                    chunk = keys[start:start + chunk_size]
+                    await self.redis.delete(*(L2_KEY_PREFIX + key for key in chunk))
+            except Exception as e:
+                self._l2_failed(e)
+        return len(keys)
+
+    async def get_or_fill(
+        self,
+        key: str,
+        fill: Callable[[], Awaitable[Any]],
+        ttl: float,
+        cache_if: Callable[[Any], bool] = lambda value: True,
+        hard_ttl: Optional[float] = None,
+        refresh_limit: Optional[asyncio.Semaphore] = None
+    ) -> Any:
+        """
+        Return the cached value or produce and store it, at most once
+        across workers
+
+        The first worker to miss takes a short Redis lock, runs ``fill`` and
+        stores the result before releasing it; the others poll L2 until the
+        value lands (or the lock goes away without one) instead of calling
+        upstream themselves.
+
+        A stale entry (past ``ttl`` but not ``hard_ttl``) is returned
+        immediately and refreshed by a background task, throttled by
+        ``refresh_limit``, so only a hard miss waits on upstream.
+        """
+        async def fill_and_store():
+            result = await fill()
+            if cache_if(result):
+                await self.set(key, result, ttl, hard_ttl)
+            return result
+
+        value, stale = await self.get_entry(key)
+        if value is not MISSING:
+            if stale:
+                self._schedule_refresh(key, fill_and_store, refresh_limit)
+            return value
+
+        if not self.l2_enabled:
+            return await fill_and_store()
+
+        token = uuid.uuid4().hex
+        lock_key = L2_LOCK_PREFIX + key
+        try:
+            acquired = await self.redis.set(lock_key, token, px=int(FILL_LOCK_TTL * 1000), nx=True)
+        except Exception as e:
+            self._l2_failed(e)
+            return await fill_and_store()
+
+        if acquired:
+            try:
+                return await fill_and_store()
+            finally:
+                await self._release(lock_key, token)
+
+        deadline = time.monotonic() + FILL_LOCK_TTL
+        while time.monotonic() < deadline:
+            await asyncio.sleep(FILL_POLL_INTERVAL)
+            value = await self.get(key)
+            if value is not MISSING:
+                return value
+            try:
+                if await self.redis.get(lock_key) is None:
+                    break
+            except Exception as e:
+                self._l2_failed(e)
+                break
+        return await fill_and_store()
+
+    def _schedule_refresh(
+        self,
+        key: str,
+        refresh: Callable[[], Awaitable[Any]],
+        limit: Optional[asyncio.Semaphore]
+    ):
+        if key in self._refreshing:
+            return
+        task = asyncio.ensure_future(self._refresh(key, refresh, limit))
+        self._refreshing[key] = task
+        task.add_done_callback(lambda done: self._refreshing.pop(key, None))
+
+    async def _refresh(
+        self,
+        key: str,
+        refresh: Callable[[], Awaitable[Any]],
+        limit: Optional[asyncio.Semaphore]
+    ):
+        """Refill a stale entry; only one worker refreshes a key at a time"""
+        token = lock_key = None
+        try:
+            if self.l2_enabled:
+                token = uuid.uuid4().hex
+                lock_key = L2_LOCK_PREFIX + key
+                if not await self.redis.set(lock_key, token, px=int(FILL_LOCK_TTL * 1000), nx=True):
+                    return
+            if limit is not None:
+                async with limit:
+                    await refresh()
+            else:
+                await refresh()
+            logger.info(f"Refreshed stale cache entry {key}")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Background refresh of {key} failed: {e}")
+        finally:
+            if lock_key is not None:
+                await self._release(lock_key, token)
+
+    async def _release(self, lock_key: str, token: str):
+        try:
+            current = await self.redis.get(lock_key)
+            if current is not None and current.decode() == token:
+                await self.redis.delete(lock_key)
+        except Exception as e:
+            self._l2_failed(e)
+
+
+def _has_value(value: Any) -> bool:
+    # Services swallow upstream errors into [] or None, which must not be cached
+    return bool(value)
+
+
+def cached(
+    source: str,
+    ttl: Optional[float] = None,
+    hard_ttl: Optional[float] = None,
+    cache_if: Callable[[Any], bool] = _has_value
+):
+    """
+    Cache an async service method's results in the service's TieredCache
+
+    The key is built from the method name and its bound arguments
+    (defaults included), so positional and keyword calls share entries.
+    Concurrent identical calls are coalesced through the service's
+    SingleFlight (``flight``) before the cache is consulted, so a
+    thundering herd becomes one upstream request. Services without a cache
+    or flight group skip that layer. Stale entries are served while a
+    background task, capped per source, refreshes them.
+
+    The wrapper also exposes ``key`` (the cache key of a call), ``prime``
+    (seed an entry without calling upstream), ``peek`` (read the entry
+    without calling upstream) and ``refresh`` (call upstream
+    unconditionally and overwrite the entry).
+
+    Args:
+        source: Source name used for the key prefix and default TTLs
+        ttl: Soft TTL in seconds; defaults to source_ttl(source)
+        hard_ttl: Hard TTL in seconds; defaults to source_hard_ttl(source)
+        cache_if: Predicate deciding whether a result may be cached
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        def key_for(self, *args, **kwargs) -> str:
+            bound = signature.bind(self, *args, **kwargs)
+            bound.apply_defaults()
+            return cache_key(source, func.__name__, *list(bound.arguments.values())[1:])
+
+        @functools.wraps(func)
+        async def wrapper(self, *args, **kwargs):
+            cache = getattr(self, "cache", None)
+            flight = getattr(self, "flight", None)
+            if cache is None and flight is None:
+                return await func(self, *args, **kwargs)
+
+            key = key_for(self, *args, **kwargs)
+
+            async def load():
+                if cache is None:
+                    return await func(self, *args, **kwargs)
+                return await cache.get_or_fill(
+                    key,
+                    lambda: func(self, *args, **kwargs),
+                    ttl if ttl is not None else source_ttl(source),
+                    cache_if,
+                    hard_ttl if hard_ttl is not None else source_hard_ttl(source),
+                    refresh_semaphore(source)
+                )
+
+            if flight is None:
+                return await load()
+            return await flight.do(key, load)
+
+        def prime(self, *args, value: Any, age: float = 0.0, **kwargs) -> bool:
+            """
+            Seed the entry a call with these arguments would read, as if it
+            had been filled ``age`` seconds ago; returns False if not stored
+            """
+            cache = getattr(self, "cache", None)
+            if cache is None:
+                return False
+            soft = (ttl if ttl is not None else source_ttl(source)) - age
+            hard = (hard_ttl if hard_ttl is not None else source_hard_ttl(source)) - age
+            return cache.prime(key_for(self, *args, **kwargs), value, soft, hard)
+
+        async def peek(self, *args, prefer_l2: bool = False, **kwargs) -> Any:
+            """
+            Return what a call with these arguments would read from the
+            cache (fresh or stale) without ever calling upstream, or MISSING
+            """
+            cache = getattr(self, "cache", None)
+            if cache is None:
+                return MISSING
+            return (await cache.get_entry(key_for(self, *args, **kwargs), prefer_l2))[0]
+
+        async def refresh(self, *args, **kwargs) -> Any:
+            """
+            Call through to upstream regardless of what is cached and
+            replace the entry with the result (if cacheable)
+            """
+            value = await func(self, *args, **kwargs)
+            cache = getattr(self, "cache", None)
+            if cache is not None and cache_if(value):
+                await cache.set(
+                    key_for(self, *args, **kwargs),
+                    value,
+                    ttl if ttl is not None else source_ttl(source),
+                    hard_ttl if hard_ttl is not None else source_hard_ttl(source)
+                )
+            return value
+
+        wrapper.key = key_for
+        wrapper.prime = prime
+        wrapper.peek = peek
+        wrapper.refresh = refresh
+        return wrapper
+
+    return decorator
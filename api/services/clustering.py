@@ -0,0 +1,214 @@
+"""
+Server-side marker clustering
+Maintains a per-zoom grid hierarchy over point records in Web Mercator
+space, similar to supercluster but updated incrementally on writes
+"""
+
+import math
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+MAX_MERCATOR_LAT = 85.05112878
+
+# Cluster grid is 2^CELLS_PER_TILE_BITS cells across a 256px tile, i.e. ~64px cells
+CELLS_PER_TILE_BITS = 2
+
+# Fields sent for individual (unclustered) points
+POINT_FIELDS = ("id", "name", "category", "latitude", "longitude", "verified", "wheelchair_accessible")
+
+
+def lonlat_to_mercator(longitude: float, latitude: float) -> Tuple[float, float]:
+    """Project a coordinate to normalized Web Mercator ([0, 1) on both axes)"""
+    latitude = max(min(latitude, MAX_MERCATOR_LAT), -MAX_MERCATOR_LAT)
+    x = (longitude + 180.0) / 360.0
+    sin_lat = math.sin(math.radians(latitude))
+    y = 0.5 - math.log((1 + sin_lat) / (1 - sin_lat)) / (4 * math.pi)
+    return min(max(x, 0.0), 1.0 - 1e-12), min(max(y, 0.0), 1.0 - 1e-12)
+
+
+def mercator_to_lonlat(x: float, y: float) -> Tuple[float, float]:
+    """Inverse of lonlat_to_mercator"""
+    longitude = x * 360.0 - 180.0
+    latitude = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y))))
+    return longitude, latitude
+
+
+class ClusterIndex:
+    """
+    Hierarchical grid clustering for map viewports
+
+    Zoom ``z`` aggregates points into a grid of ``2^(z + 2)`` cells per
+    axis, so each cell at zoom z is exactly four cells at zoom z + 1. Every
+    cell stores a count and coordinate sums, which makes inserts and
+    removals O(max_zoom) and lets a viewport query touch only the cells it
+    covers. Above ``max_zoom`` individual points are returned.
+    """
+
+    def __init__(self, max_zoom: int = 16):
+        self.max_zoom = max_zoom
+        self.version = 0
+        self._levels: List[Dict[Tuple[int, int], List[float]]] = [{} for _ in range(max_zoom + 1)]
+        self._points: Dict[Tuple[int, int], Dict[str, Dict[str, Any]]] = {}
+        self._positions: Dict[str, Tuple[float, float]] = {}
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def _level_bits(self, zoom: int) -> int:
+        return zoom + CELLS_PER_TILE_BITS
+
+    def _cell(self, x: float, y: float, zoom: int) -> Tuple[int, int]:
+        scale = 1 << self._level_bits(zoom)
+        return int(x * scale), int(y * scale)
+
+    def clear(self):
+        with self._lock:
+            self._levels = [{} for _ in range(self.max_zoom + 1)]
+            self._points = {}
+            self._positions = {}
+            self.version += 1
+
+    def load(self, records: Iterable[Dict[str, Any]]):
+        """Replace the hierarchy with a fresh set of records"""
+        with self._lock:
+            self.clear()
+            for record in records:
+                self.upsert(record)
+
+    def upsert(self, record: Dict[str, Any]):
+        """Insert a record or move it to its new position"""
+        with self._lock:
+            self.remove(record["id"])
+            if record.get("latitude") is None or record.get("longitude") is None:
+                return
+
+            x, y = lonlat_to_mercator(record["longitude"], record["latitude"])
+            for zoom, level in enumerate(self._levels):
+                cell = level.setdefault(self._cell(x, y, zoom), [0, 0.0, 0.0])
+                cell[0] += 1
+                cell[1] += x
+                cell[2] += y
+
+            point = {field: record.get(field) for field in POINT_FIELDS}
+            self._points.setdefault(self._cell(x, y, self.max_zoom), {})[record["id"]] = point
+            self._positions[record["id"]] = (x, y)
+            self.version += 1
+
+    def remove(self, record_id: str) -> bool:
+        """Remove a record from every zoom level"""
+        with self._lock:
+            position = self._positions.pop(record_id, None)
+            if position is None:
+                return False
+
+            x, y = position
+            for zoom, level in enumerate(self._levels):
+                key = self._cell(x, y, zoom)
+                cell = level[key]
+                cell[0] -= 1
+                cell[1] -= x
+                cell[2] -= y
+                if cell[0] <= 0:
+                    del level[key]
+
+            key = self._cell(x, y, self.max_zoom)
+            bucket = self._points[key]
+            bucket.pop(record_id, None)
+            if not bucket:
+                del self._points[key]
+            self.version += 1
+            return True
+
+    def _cells_in_range(self, cells: Dict[Tuple[int, int], Any], x0: int, x1: int, y0: int, y1: int):
+        """Yield (key, value) for stored cells inside an inclusive cell range"""
+        if (x1 - x0 + 1) * (y1 - y0 + 1) > len(cells):
+            for key, value in cells.items():
+                if x0 <= key[0] <= x1 and y0 <= key[1] <= y1:
+                    yield key, value
+            return
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                value = cells.get((cx, cy))
+                if value is not None:
+                    yield (cx, cy), value
+
+    def _single_point(self, key: Tuple[int, int], zoom: int) -> Dict[str, Any]:
+        """Descend from a one-point cluster to the point it holds"""
+        cx, cy = key
+        for child_zoom in range(zoom + 1, self.max_zoom + 1):
+            level = self._levels[child_zoom]
+            for dx in (0, 1):
+                for dy in (0, 1):
+                    if (2 * cx + dx, 2 * cy + dy) in level:
+                        cx, cy = 2 * cx + dx, 2 * cy + dy
+                        break
+                else:
+                    continue
+                break
+        return next(iter(self._points[(cx, cy)].values()))
+
+    def query(
+        self,
+        min_lon: float,
+        min_lat: float,
+        max_lon: float,
+        max_lat: float,
+        zoom: int,
+        max_items: Optional[int] = None
+    ) -> Tuple[List[Dict[str, Any]], bool]:
+        """
+        Clusters and points visible in a viewport at a zoom level
+
+        Args:
+            min_lon: Western edge of the viewport
+            min_lat: Southern edge of the viewport
+            max_lon: Eastern edge of the viewport
+            max_lat: Northern edge of the viewport
+            zoom: Map zoom level
+            max_items: Cap on returned items
+
+        Returns:
+            Tuple of (items, truncated). Items are cluster dicts with
+            ``count`` and centroid coordinates, or compact point dicts.
+        """
+        if min_lon > max_lon:
+            # Viewport crosses the antimeridian
+            west, west_truncated = self.query(min_lon, min_lat, 180.0, max_lat, zoom, max_items)
+            remaining = None if max_items is None else max_items - len(west)
+            east, east_truncated = self.query(-180.0, min_lat, max_lon, max_lat, zoom, remaining)
+            return west + east, west_truncated or east_truncated
+
+        x_min, y_max = lonlat_to_mercator(min_lon, min_lat)
+        x_max, y_min = lonlat_to_mercator(max_lon, max_lat)
+        items: List[Dict[str, Any]] = []
+
+        with self._lock:
+            if zoom > self.max_zoom:
+                x0, y0 = self._cell(x_min, y_min, self.max_zoom)
+                x1, y1 = self._cell(x_max, y_max, self.max_zoom)
+                for _, bucket in self._cells_in_range(self._points, x0, x1, y0, y1):
+                    for point in bucket.values():
+                        if max_items is not None and len(items) >= max_items:
+                            return items, True
+                        items.append({"type": "point", **point})
+                return items, False
+
+            zoom = max(zoom, 0)
+            x0, y0 = self._cell(x_min, y_min, zoom)
+            x1, y1 = self._cell(x_max, y_max, zoom)
+            for key, (count, sum_x, sum_y) in self._cells_in_range(self._levels[zoom], x0, x1, y0, y1):
+                if max_items is not None and len(items) >= max_items:
+                    return items, True
+                if count == 1:
+                    items.append({"type": "point", **self._single_point(key, zoom)})
+                    continue
+                longitude, latitude = mercator_to_lonlat(sum_x / count, sum_y / count)
+                items.append({
+                    "type": "cluster",
+                    "cluster_id": f"{zoom}/{key[0]}/{key[1]}",
+                    "count": int(count),
+                    "latitude": round(latitude, 6),
+                    "longitude": round(longitude, 6)
+                })
+        return items, False
@@ -0,0 +1,412 @@
+"""
+Cross-source facility deduplication
+Finds the same real-world facility listed by several sources (an HRSA
+site, a VA clinic, a USDA office, a user-submitted utility) and merges
+each group into one canonical record with per-source provenance
+"""
+
+import asyncio
+import copy
+import logging
+import math
+import re
+import threading
+import time
+from difflib import SequenceMatcher
+from typing import Any, Callable, Dict, FrozenSet, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+from services.cache import MISSING, TieredCache
+from services.facility_store import FACILITY_SOURCES, facility_source
+from services.location_service import EARTH_RADIUS_KM, haversine_km
+from services.spatial_index import bounding_box, geohash_cell_size
+
+logger = logging.getLogger(__name__)
+
+# Listings closer than this are candidates for being the same place
+DEDUP_RADIUS_KM = 0.15
+# ~150 m cells, so the radius only reaches into adjacent cells
+GEO_BLOCK_PRECISION = 7
+# Phone/ZIP blocks larger than this are hotlines or shared mailing
+# addresses rather than one facility, and are not compared pairwise
+MAX_BLOCK_SIZE = 25
+
+# Minimum name similarity for a match, by the evidence linking the pair
+PHONE_MATCH_SIMILARITY = 0.5
+NEARBY_MATCH_SIMILARITY = 0.6
+ZIP_MATCH_SIMILARITY = 0.85
+
+# Shared cache entry the deduplication job publishes its merges under
+MERGES_CACHE_KEY = "dedup:merges"
+MERGES_TTL = 7 * 24 * 3600
+
+# Most authoritative first; the canonical record comes from the first
+SOURCE_PRIORITY = ("hrsa", "va", "usda", "utility")
+
+NAME_STOPWORDS = frozenset({
+    "the", "of", "and", "at", "for", "a", "an", "inc", "llc", "co",
+    "center", "centre", "clinic", "office", "health", "medical", "services",
+    "service", "community", "dept", "department", "us", "usda", "va",
+})
+
+
+def record_source(record: Dict[str, Any]) -> str:
+    """Federal source of a record, or 'utility' for user-submitted utilities"""
+    source = facility_source(record)
+    return source if source in FACILITY_SOURCES else "utility"
+
+
+def normalize_phone(phone: Any) -> Optional[str]:
+    """Last ten digits of a US phone number, or None"""
+    digits = re.sub(r"\D", "", str(phone or ""))
+    if len(digits) == 11 and digits.startswith("1"):
+        digits = digits[1:]
+    return digits if len(digits) == 10 else None
+
+
+def normalize_zip(zip_code: Any) -> Optional[str]:
+    match = re.match(r"\s*(\d{5})", str(zip_code or ""))
+    return match.group(1) if match else None
+
+
+def normalize_name(name: Any) -> str:
+    return " ".join(re.findall(r"[a-z0-9]+", str(name or "").lower()))
+
+
+def name_tokens(name: str) -> FrozenSet[str]:
+    """Distinctive words of a normalized name"""
+    return frozenset(token for token in name.split() if token not in NAME_STOPWORDS)
+
+
+def name_similarity(a: "_Entry", b: "_Entry", threshold: float = 0.0) -> float:
+    """
+    Best of distinctive-token Jaccard and character-level similarity
+
+    The character ratio is skipped when the Jaccard score already reaches
+    ``threshold`` or one of its cheap upper bounds cannot.
+    """
+    jaccard = 0.0
+    if a.tokens and b.tokens:
+        jaccard = len(a.tokens & b.tokens) / len(a.tokens | b.tokens)
+    if threshold and jaccard >= threshold:
+        return jaccard
+    matcher = SequenceMatcher(None, a.name, b.name)
+    if threshold and (matcher.real_quick_ratio() < threshold or matcher.quick_ratio() < threshold):
+        return jaccard
+    return max(jaccard, matcher.ratio())
+
+
+class _Entry(NamedTuple):
+    record: Dict[str, Any]
+    source: str
+    name: str
+    tokens: FrozenSet[str]
+    phone: Optional[str]
+    zip_code: Optional[str]
+
+
+def _entry(record: Dict[str, Any], names: Dict[Any, Tuple[str, FrozenSet[str]]]) -> _Entry:
+    raw_name = record.get("name")
+    normalized = names.get(raw_name)
+    if normalized is None:
+        name = normalize_name(raw_name)
+        normalized = names[raw_name] = (name, name_tokens(name))
+    phone = (record.get("contact") or {}).get("phone")
+    zip_code = (record.get("address") or {}).get("zip_code")
+    return _Entry(
+        record,
+        record_source(record),
+        *normalized,
+        normalize_phone(phone) if phone else None,
+        normalize_zip(zip_code) if zip_code else None,
+    )
+
+
+class _Clusters:
+    """Union-find over entry indexes that never joins two listings from one source"""
+
+    def __init__(self, sources: List[str]):
+        self.parent = list(range(len(sources)))
+        self.sources: Dict[int, Set[str]] = {i: {source} for i, source in enumerate(sources)}
+
+    def find(self, i: int) -> int:
+        while self.parent[i] != i:
+            self.parent[i] = self.parent[self.parent[i]]
+            i = self.parent[i]
+        return i
+
+    def union(self, a: int, b: int) -> bool:
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a == root_b:
+            return False
+        # A source's own IDs are distinct facilities (e.g. two HRSA sites
+        # in one building), so a cluster holds at most one per source
+        if self.sources[root_a] & self.sources[root_b]:
+            return False
+        if len(self.sources[root_a]) < len(self.sources[root_b]):
+            root_a, root_b = root_b, root_a
+        self.parent[root_b] = root_a
+        self.sources[root_a] |= self.sources.pop(root_b)
+        return True
+
+    def groups(self) -> List[List[int]]:
+        members: Dict[int, List[int]] = {}
+        for i in range(len(self.parent)):
+            members.setdefault(self.find(i), []).append(i)
+        return [group for group in members.values() if len(group) > 1]
+
+
+def _within_km(a: _Entry, b: _Entry, radius_km: float) -> bool:
+    lat_a, lon_a = a.record.get("latitude"), a.record.get("longitude")
+    lat_b, lon_b = b.record.get("latitude"), b.record.get("longitude")
+    if None in (lat_a, lon_a, lat_b, lon_b):
+        return False
+    # Most neighbourhood pairs are rejected on latitude alone, before any
+    # trigonometry; the meridian arc is a lower bound on the distance
+    if math.radians(abs(lat_a - lat_b)) * EARTH_RADIUS_KM > radius_km:
+        return False
+    return haversine_km(lat_a, lon_a, lat_b, lon_b) <= radius_km
+
+
+def _grid_cell(latitude: float, longitude: float, lat_size: float, lon_size: float) -> Tuple[int, int]:
+    return int((latitude + 90.0) / lat_size), int(math.floor((longitude + 180.0) / lon_size))
+
+
+def _candidate_pairs(entries: List[_Entry], radius_km: float) -> Iterator[Tuple[int, int]]:
+    """
+    Cross-source pairs sharing a geo-cell neighbourhood, a phone number,
+    or a ZIP code and name token; each record is only compared within its
+    blocks, and only against other sources' records there
+    """
+    # Cells are kept as integer (row, column) pairs of the geohash grid;
+    # building geohash strings for every neighbour dominated the pass.
+    # Federal listings are few, so each marks every cell its search circle
+    # reaches; utilities (mostly bulk restroom imports) then look up their
+    # own cell once and are never paired with each other.
+    lat_size, lon_size = geohash_cell_size(GEO_BLOCK_PRECISION)
+    columns = round(360.0 / lon_size)
+    reach: Dict[Tuple[int, int], List[int]] = {}
+    phones: Dict[str, List[int]] = {}
+    zips: Dict[Tuple[str, str], List[int]] = {}
+    order = sorted(range(len(entries)), key=lambda i: entries[i].source == "utility")
+    for i in order:
+        entry = entries[i]
+        latitude, longitude = entry.record.get("latitude"), entry.record.get("longitude")
+        if latitude is not None and longitude is not None:
+            row, col = _grid_cell(latitude, longitude, lat_size, lon_size)
+            for j in reach.get((row, col % columns), ()):
+                if entries[j].source != entry.source:
+                    yield j, i
+            if entry.source != "utility":
+                min_lat, min_lon, max_lat, max_lon = bounding_box(latitude, longitude, radius_km)
+                row_start, col_start = _grid_cell(min_lat, min_lon, lat_size, lon_size)
+                row_end, col_end = _grid_cell(max_lat, max_lon, lat_size, lon_size)
+                for row in range(row_start, row_end + 1):
+                    for col in range(col_start, col_end + 1):
+                        reach.setdefault((row, col % columns), []).append(i)
+        if entry.phone:
+            phones.setdefault(entry.phone, []).append(i)
+        if entry.zip_code and entry.tokens:
+            zips.setdefault((entry.zip_code, min(entry.tokens)), []).append(i)
+
+    for block in list(phones.values()) + list(zips.values()):
+        if 1 < len(block) <= MAX_BLOCK_SIZE:
+            for position, i in enumerate(block):
+                for j in block[position + 1:]:
+                    if entries[i].source != entries[j].source:
+                        yield i, j
+
+
+def _is_match(
+    a: _Entry,
+    b: _Entry,
+    radius_km: float,
+    names: Dict[Tuple[str, str, float], bool]
+) -> bool:
+    same_zip = bool(a.zip_code and a.zip_code == b.zip_code)
+    if a.phone and a.phone == b.phone:
+        threshold = PHONE_MATCH_SIMILARITY
+    elif _within_km(a, b, radius_km):
+        threshold = NEARBY_MATCH_SIMILARITY
+    elif same_zip:
+        threshold = ZIP_MATCH_SIMILARITY
+    else:
+        return False
+    # Imported listings repeat a few names ("Public Restroom"), so the
+    # verdict for each name pair is computed once per pass
+    key = (a.name, b.name, threshold)
+    similar = names.get(key)
+    if similar is None:
+        similar = names[key] = name_similarity(a, b, threshold) >= threshold
+    return similar
+
+
+def find_duplicates(
+    records: Iterable[Dict[str, Any]],
+    radius_km: float = DEDUP_RADIUS_KM
+) -> List[List[Dict[str, Any]]]:
+    """
+    Group listings of the same facility across sources
+
+    Candidates come from blocking (geo-cell neighbourhood, normalized
+    phone, ZIP plus a name token) and only pair different sources, so the
+    work grows with the number of records times the other sources' block
+    sizes rather than with all pairs.
+
+    Args:
+        records: Facility and utility records
+        radius_km: Distance under which nearby listings may match
+
+    Returns:
+        Groups of two or more records describing one facility
+    """
+    # Bulk-imported listings share a handful of names, normalized once each
+    normalized: Dict[Any, Tuple[str, FrozenSet[str]]] = {}
+    entries = [_entry(record, normalized) for record in records if record.get("id")]
+    clusters = _Clusters([entry.source for entry in entries])
+    names: Dict[Tuple[str, str, float], bool] = {}
+
+    # A pair is only offered twice when it shares a geo-cell neighbourhood
+    # and a phone or ZIP block, and re-checking it is harmless
+    for i, j in _candidate_pairs(entries, radius_km):
+        if _is_match(entries[i], entries[j], radius_km, names):
+            clusters.union(i, j)
+
+    return [[entries[i].record for i in group] for group in clusters.groups()]
+
+
+def _fill_missing(target: Dict[str, Any], other: Dict[str, Any]):
+    for key, value in other.items():
+        current = target.get(key)
+        if current in (None, "", [], {}):
+            if value not in (None, "", [], {}):
+                target[key] = copy.deepcopy(value)
+        elif isinstance(current, dict) and isinstance(value, dict):
+            _fill_missing(current, value)
+
+
+def merge_group(records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Merge listings of one facility into a canonical record
+
+    The most authoritative listing keeps its ID and fields; gaps are
+    filled from the others, services are combined, and ``provenance``
+    lists every contributing source record.
+    """
+    ordered = sorted(records, key=lambda record: SOURCE_PRIORITY.index(record_source(record)))
+    canonical = copy.deepcopy(ordered[0])
+    for other in ordered[1:]:
+        _fill_missing(canonical, other)
+        if isinstance(canonical.get("services"), list) and isinstance(other.get("services"), list):
+            canonical["services"] += [s for s in other["services"] if s not in canonical["services"]]
+
+    canonical["provenance"] = [
+        {
+            "source": record_source(record),
+            "id": record["id"],
+            "name": record.get("name"),
+            "category": record.get("category"),
+        }
+        for record in ordered
+    ]
+    canonical["duplicate_ids"] = [record["id"] for record in ordered[1:]]
+    return canonical
+
+
+def compute_merges(
+    records: Iterable[Dict[str, Any]],
+    radius_km: float = DEDUP_RADIUS_KM
+) -> List[Dict[str, Any]]:
+    """Canonical record of every merged facility in a full set of records"""
+    return [merge_group(group) for group in find_duplicates(records, radius_km)]
+
+
+async def publish_merges(cache: TieredCache, merged: List[Dict[str, Any]]):
+    """Share merges computed by the deduplication job with every API process"""
+    await cache.set(MERGES_CACHE_KEY, {"computed_at": time.time(), "merges": merged}, MERGES_TTL)
+
+
+class DedupIndex:
+    """
+    Resolves every listing ID of a merged facility to its canonical record
+
+    Rebuilt from a full pass over all records, in process or by loading
+    the merges the deduplication job published; readers always see either
+    the previous or the new mapping. ``version`` changes only when the
+    merges themselves change, so it can be folded into cache keys.
+    """
+
+    def __init__(self, radius_km: float = DEDUP_RADIUS_KM):
+        self.radius_km = radius_km
+        self.version = 0
+        self._canonical: Dict[str, Dict[str, Any]] = {}
+        self._computed_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        """Number of merged facilities"""
+        return len({id(record) for record in self._canonical.values()})
+
+    def resolve(self, facility_id: str) -> Optional[Dict[str, Any]]:
+        """Canonical record for any ID in a merged group, or None"""
+        return self._canonical.get(facility_id)
+
+    def is_duplicate(self, facility_id: str) -> bool:
+        """Whether a listing was merged into another source's record"""
+        canonical = self._canonical.get(facility_id)
+        return canonical is not None and canonical["id"] != facility_id
+
+    def rebuild(self, records: Iterable[Dict[str, Any]]) -> int:
+        """
+        Recompute merges over a full set of records
+
+        Returns:
+            Number of merged facilities
+        """
+        return self.load(compute_merges(records, self.radius_km))
+
+    def load(self, merged: List[Dict[str, Any]]) -> int:
+        """
+        Replace the merges with canonical records computed elsewhere
+        (e.g. by the deduplication job), as returned by compute_merges
+
+        Returns:
+            Number of merged facilities
+        """
+        canonical = {}
+        for record in merged:
+            for listing in record["provenance"]:
+                canonical[listing["id"]] = record
+
+        with self._lock:
+            if self._merge_keys(canonical) != self._merge_keys(self._canonical):
+                self.version += 1
+            self._canonical = canonical
+        logger.info(f"Merged {len(canonical)} listings into {len(merged)} facilities")
+        return len(merged)
+
+    async def sync(self, cache: TieredCache) -> bool:
+        """
+        Load the merges last published by the deduplication job
+
+        Returns:
+            Whether a newer set of merges was loaded
+        """
+        published, _ = await cache.get_entry(MERGES_CACHE_KEY, prefer_l2=True)
+        if published is MISSING or published["computed_at"] == self._computed_at:
+            return False
+        self.load(published["merges"])
+        self._computed_at = published["computed_at"]
+        return True
+
+    @staticmethod
+    def _merge_keys(canonical: Dict[str, Dict[str, Any]]) -> Dict[str, str]:
+        return {facility_id: record["id"] for facility_id, record in canonical.items()}
+
+    async def run_periodic(self, collect: Callable[[], List[Dict[str, Any]]], interval: float):
+        """Rebuild from collect() every interval seconds until cancelled"""
+        while True:
+            try:
+                await asyncio.to_thread(lambda: self.rebuild(collect()))
+            except Exception as e:
+                logger.error(f"Error deduplicating facilities: {e}")
+            await asyncio.sleep(interval)
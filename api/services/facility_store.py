@@ -0,0 +1,267 @@
+"""
+In-memory store of federal facility records
+Holds HRSA, VA and USDA facilities already fetched from upstream so map
+endpoints can serve them without another upstream round trip
+"""
+
+import hashlib
+import json
+import logging
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from services.clustering import ClusterIndex
+from services.delta_sync import DatasetDelta, diff_records
+from services.nearest_index import NearestNeighborIndex
+from services.spatial_index import GeoGridIndex, bounding_box
+
+logger = logging.getLogger(__name__)
+
+FACILITY_SOURCES = ("hrsa", "va", "usda")
+
+
+def facility_source(record: Dict[str, Any]) -> str:
+    """Return the source ('hrsa', 'va' or 'usda') of a transformed facility"""
+    return str(record.get("id", "")).split("_", 1)[0]
+
+
+class FacilityStore:
+    """
+    Facility records grouped into datasets (e.g. VA health facilities in CA)
+
+    Every record is also kept in a per-source geohash grid, KD-tree and
+    cluster hierarchy so bounding-box, nearest-neighbour and zoomed-out
+    map lookups stay cheap. ``version``
+    increases on every change and is used as the data version for
+    downstream caches. Each dataset also has its own version counter and a
+    content tag (digest) that only change when its records do, which HTTP
+    ETags are built from.
+
+    Writes are applied as deltas: only inserted, updated and deleted
+    records touch the indexes, and subscribers are told exactly which
+    records changed so they can invalidate just the affected areas.
+    """
+
+    def __init__(self, precision: int = 5):
+        self.precision = precision
+        self.version = 0
+        self._records: Dict[str, Dict[str, Any]] = {}
+        # Dataset IDs in upstream order (dict keys as an ordered set)
+        self._datasets: Dict[Tuple[str, str], Dict[str, None]] = {}
+        self._dataset_versions: Dict[Tuple[str, str], int] = {}
+        self._dataset_tags: Dict[Tuple[str, str], str] = {}
+        self._indexes: Dict[str, GeoGridIndex] = {
+            source: GeoGridIndex(precision) for source in FACILITY_SOURCES
+        }
+        self._nearest: Dict[str, NearestNeighborIndex] = {
+            source: NearestNeighborIndex() for source in FACILITY_SOURCES
+        }
+        self._clusters: Dict[str, ClusterIndex] = {
+            source: ClusterIndex() for source in FACILITY_SOURCES
+        }
+        self._listeners: List[Callable[[DatasetDelta], None]] = []
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def get(self, facility_id: str) -> Optional[Dict[str, Any]]:
+        """Return a stored facility by ID"""
+        return self._records.get(facility_id)
+
+    def records(self) -> List[Dict[str, Any]]:
+        """Return every stored facility"""
+        with self._lock:
+            return list(self._records.values())
+
+    def get_dataset(self, source: str, key: str) -> Optional[List[Dict[str, Any]]]:
+        """Return every record in a dataset, or None if it was never stored"""
+        with self._lock:
+            ids = self._datasets.get((source, key))
+            if ids is None:
+                return None
+            return [self._records[facility_id] for facility_id in ids if facility_id in self._records]
+
+    def datasets(self) -> List[Tuple[str, str]]:
+        """Return the (source, key) of every stored dataset"""
+        with self._lock:
+            return list(self._datasets)
+
+    def subscribe(self, listener: Callable[[DatasetDelta], None]):
+        """Call listener with the delta of every write that changed something"""
+        self._listeners.append(listener)
+
+    def put_many(self, records: Iterable[Dict[str, Any]]) -> DatasetDelta:
+        """Upsert records without tying them to a dataset"""
+        records = list(records)
+        with self._lock:
+            previous = {
+                record["id"]: self._records[record["id"]]
+                for record in records if record["id"] in self._records
+            }
+            delta = diff_records(
+                facility_source(records[0]) if records else "", None,
+                previous, records, tombstones=False
+            )
+            if not delta.changed:
+                return delta
+            for record in delta.upserts:
+                self._put(record)
+            self.version += 1
+        self._notify(delta)
+        return delta
+
+    def put_dataset(self, source: str, key: str, records: Iterable[Dict[str, Any]]) -> DatasetDelta:
+        """
+        Sync a dataset to a fresh set of records
+
+        Args:
+            source: Facility source ('hrsa', 'va' or 'usda')
+            key: Dataset key within the source, e.g. 'CA' or 'CA:health'
+            records: Transformed facility records
+
+        Returns:
+            What changed; records missing from the fresh set are tombstoned
+        """
+        dataset = (source, key)
+        records = list(records)
+        with self._lock:
+            ids = dict.fromkeys(record["id"] for record in records)
+            previous_ids = self._datasets.get(dataset)
+            previous = {
+                facility_id: self._records[facility_id]
+                for facility_id in previous_ids or ()
+                if facility_id in self._records
+            }
+            # Records also held through another dataset or put_many count as
+            # known, so a first sync of overlapping data is not a mass insert
+            for facility_id in ids.keys() - previous.keys():
+                if facility_id in self._records:
+                    previous[facility_id] = self._records[facility_id]
+            delta = diff_records(source, key, previous, records, tombstones=False)
+            delta.deleted = [
+                previous[facility_id] for facility_id in (previous_ids or {}).keys() - ids.keys()
+                if facility_id in previous
+            ]
+            if previous_ids is not None and not delta.changed and previous_ids.keys() == ids.keys():
+                # A refresh that returned identical data must not invalidate anything
+                return delta
+
+            for record in delta.upserts:
+                self._put(record)
+            self._datasets[dataset] = ids
+            for record in delta.deleted:
+                if not self._in_other_dataset(record["id"], dataset):
+                    self._remove(record["id"])
+
+            self._dataset_versions[dataset] = self._dataset_versions.get(dataset, 0) + 1
+            ordered = sorted(records, key=lambda record: record["id"])
+            self._dataset_tags[dataset] = hashlib.sha1(
+                json.dumps(ordered, sort_keys=True, default=str).encode()
+            ).hexdigest()[:16]
+            self.version += 1
+        self._notify(delta)
+        return delta
+
+    def _notify(self, delta: DatasetDelta):
+        for listener in self._listeners:
+            try:
+                listener(delta)
+            except Exception as e:
+                logger.error(f"Error in facility store listener: {e}")
+
+    def dataset_version(self, source: str, key: str) -> int:
+        """Number of times a dataset's contents have changed (0 if never stored)"""
+        return self._dataset_versions.get((source, key), 0)
+
+    def dataset_tag(self, source: str, key: str) -> Optional[str]:
+        """
+        Content digest of a dataset, computed once per change
+
+        Unlike the version counter it is identical in every worker holding
+        the same data, so it is safe to use in HTTP ETags.
+        """
+        return self._dataset_tags.get((source, key))
+
+    def _in_other_dataset(self, facility_id: str, dataset: Tuple[str, str]) -> bool:
+        return any(
+            facility_id in ids for key, ids in self._datasets.items() if key != dataset
+        )
+
+    def _put(self, record: Dict[str, Any]):
+        self._records[record["id"]] = record
+        source = facility_source(record)
+        if source in self._indexes:
+            self._indexes[source].upsert(record)
+            self._nearest[source].upsert(record)
+            self._clusters[source].upsert(record)
+
+    def _remove(self, facility_id: str):
+        record = self._records.pop(facility_id, None)
+        if record is not None:
+            source = facility_source(record)
+            if source in self._indexes:
+                self._indexes[source].remove(facility_id)
+                self._nearest[source].remove(facility_id)
+                self._clusters[source].remove(facility_id)
+
+    def in_bbox(
+        self,
+        source: str,
+        min_lat: float,
+        min_lon: float,
+        max_lat: float,
+        max_lon: float
+    ) -> List[Dict[str, Any]]:
+        """Return a source's facilities inside a bounding box"""
+        return self._indexes[source].query_bbox(min_lat, min_lon, max_lat, max_lon)
+
+    def clusters_in_bbox(
+        self,
+        source: str,
+        min_lon: float,
+        min_lat: float,
+        max_lon: float,
+        max_lat: float,
+        zoom: int,
+        max_items: Optional[int] = None
+    ) -> Tuple[List[Dict[str, Any]], bool]:
+        """
+        A source's clusters and points in a viewport at a zoom level
+
+        Cost follows the grid cells the viewport covers at that zoom, not the
+        number of facilities, so zoomed-out map tiles stay cheap.
+        """
+        return self._clusters[source].query(min_lon, min_lat, max_lon, max_lat, zoom, max_items)
+
+    def candidates_near(
+        self,
+        source: str,
+        latitude: float,
+        longitude: float,
+        radius_km: float
+    ) -> List[Dict[str, Any]]:
+        """Return a source's facilities in the bounding box of a search circle"""
+        return self._indexes[source].candidates_in_bbox(*bounding_box(latitude, longitude, radius_km))
+
+    def nearest_batch(
+        self,
+        source: str,
+        latitudes: List[float],
+        longitudes: List[float],
+        k: int,
+        max_distance_km: Optional[float] = None
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Get a source's k closest facilities for many origins in one pass
+
+        Returns:
+            One list of facility dicts with ``distance_km`` per origin
+        """
+        matches = self._nearest[source].query_batch(
+            latitudes, longitudes, k, max_distance_km=max_distance_km
+        )
+        return [
+            [{**record, "distance_km": round(distance, 2)} for distance, record in row]
+            for row in matches
+        ]
@@ -5,22 +5,53 @@ Fetches and processes data from Health Resources & Services Administration
 
 import httpx
 import asyncio
-from typing import List, Dict, Any, Optional
-from geopy.distance import geodesic
+import os
+from typing import Callable, List, Dict, Any, Optional, Tuple
+from sqlalchemy.orm import Session
+from models.facility import Facility
+from services.cache import (
+    NEARBY_CANDIDATE_LIMIT,
+    TieredCache,
+    cached,
+    nearby_cell,
+    nearby_cells_containing,
+    nearby_results_exact,
+)
+from services.delta_sync import DatasetDelta
+from services.facility_store import FacilityStore
+from services.location_service import rank_by_distance
+from services.spatial_index import bounding_box, geohash_decode
+from services.singleflight import SingleFlight
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Cache key namespace (generation) of the nearby candidate sets
+NEARBY_NAMESPACE = "hrsa:nearby"
+# Above this many changed site locations, invalidating cell by cell costs
+# more than refilling, so every nearby candidate set is dropped at once
+NEARBY_INVALIDATE_MAX_POINTS = int(os.getenv("HRSA_NEARBY_INVALIDATE_MAX_POINTS", "200"))
+
 class HRSAService:
     """Service for integrating HRSA health center data"""
     
-    def __init__(self):
+    def __init__(
+        self,
+        store: Optional[FacilityStore] = None,
+        cache: Optional[TieredCache] = None,
+        session_factory: Optional[Callable[[], Session]] = None
+    ):
         self.base_url = "https://data.hrsa.gov"
         self.api_endpoints = {
             "health_centers": "/data/download/hrsa/Health_Center_Service_Delivery_and_Look-Alike_Sites_Data.xlsx",
             "fqhc_lookup": "/data/reports/datagrid?gridName=FQHCs"
         }
         self.session = None
+        self.store = store
+        self.cache = cache
+        self.flight = SingleFlight()
+        # Sites imported from the HRSA workbook (see ingest.hrsa_xlsx)
+        self.session_factory = session_factory
     
     async def get_session(self) -> httpx.AsyncClient:
         """Get or create async HTTP session"""
@@ -34,6 +65,7 @@ class HRSAService:
             await self.session.aclose()
             self.session = None
     
+    @cached("hrsa")
     async def fetch_health_centers_by_state(self, state_code: str) -> List[Dict[str, Any]]:
         """
         Fetch health centers for a specific state
@@ -45,6 +77,13 @@ class HRSAService:
             List of health center data dictionaries
         """
         try:
+            local = self._query_local(state_code=state_code)
+            if local is not None:
+                logger.info(f"Loaded {len(local)} imported health centers for state {state_code}")
+                if self.store is not None:
+                    self.store.put_dataset("hrsa", state_code, local)
+                return local
+            
             session = await self.get_session()
             
             # HRSA provides state-specific data through their API
@@ -67,6 +106,8 @@ class HRSAService:
                     health_centers.append(transformed_center)
             
             logger.info(f"Fetched {len(health_centers)} health centers for state {state_code}")
+            if self.store is not None:
+                self.store.put_dataset("hrsa", state_code, health_centers)
             return health_centers
             
         except httpx.HTTPStatusError as e:
@@ -76,6 +117,19 @@ class HRSAService:
             logger.error(f"Error fetching HRSA data for state {state_code}: {e}")
             return []
     
+    def restore_dataset(self, state_code: str, health_centers: List[Dict[str, Any]], age: float = 0.0):
+        """
+        Load a state's health centers from a snapshot into the store and cache
+        
+        Args:
+            state_code: Dataset key (two-letter state code)
+            health_centers: Snapshot records
+            age: Seconds since the snapshot was written
+        """
+        if self.store is not None:
+            self.store.put_dataset("hrsa", state_code, health_centers)
+        self.fetch_health_centers_by_state.prime(self, state_code, value=health_centers, age=age)
+    
     async def search_nearby_health_centers(
         self, 
         latitude: float, 
@@ -96,20 +150,151 @@ class HRSAService:
             List of nearby health centers
         """
         try:
-            # For demo purposes, we'll use a mock dataset
-            # In production, you'd want to cache HRSA data in your database
-            # and query it efficiently with PostGIS spatial functions
-            
-            nearby_centers = await self._get_mock_health_centers(
-                latitude, longitude, radius_km, limit
-            )
+            # Candidates are cached per geo-cell so nearby users share them;
+            # distances and ordering are still exact for this user
+            cell = nearby_cell(latitude, longitude, radius_km)
+            generation = await self.cache.generation(NEARBY_NAMESPACE) if self.cache is not None else 0
+            candidates = await self._get_nearby_candidates(cell.geohash, cell.radius_km, generation)
+            results = rank_by_distance(latitude, longitude, candidates, radius_km, limit)
+            if nearby_results_exact(cell, latitude, longitude, radius_km, candidates, results, limit):
+                return results
             
-            return nearby_centers
+            # The cell's set was cut short of this user's reach (dense area)
+            candidates = await self._query_nearby(latitude, longitude, radius_km)
+            return rank_by_distance(latitude, longitude, candidates, radius_km, limit)
             
         except Exception as e:
             logger.error(f"Error searching nearby health centers: {e}")
             return []
     
+    @cached("hrsa")
+    async def _get_nearby_candidates(self, geohash: str, radius_km: float, generation: int = 0) -> List[Dict[str, Any]]:
+        """Health centers within radius_km of a geohash cell's center (generation only versions the key)"""
+        center_lat, center_lon = geohash_decode(geohash)
+        return await self._query_nearby(center_lat, center_lon, radius_km)
+    
+    async def _query_nearby(self, latitude: float, longitude: float, radius_km: float) -> List[Dict[str, Any]]:
+        """Up to NEARBY_CANDIDATE_LIMIT health centers within radius_km of a point, nearest first"""
+        local = self._query_local(bbox=bounding_box(latitude, longitude, radius_km))
+        if local is not None:
+            return rank_by_distance(latitude, longitude, local, radius_km, NEARBY_CANDIDATE_LIMIT)
+        
+        # Nothing imported yet; fall back to the demo dataset
+        return await self._get_mock_health_centers(
+            latitude, longitude, radius_km, NEARBY_CANDIDATE_LIMIT
+        )
+    
+    def _query_local(
+        self,
+        state_code: Optional[str] = None,
+        bbox: Optional[Tuple[float, float, float, float]] = None,
+        facility_id: Optional[str] = None
+    ) -> Optional[List[Dict[str, Any]]]:
+        """
+        Query imported HRSA sites from the facilities table
+        
+        Returns:
+            Matching health centers, or None when no sites have been
+            imported (callers then fall back to the upstream API)
+        """
+        if self.session_factory is None:
+            return None
+        
+        db = self.session_factory()
+        try:
+            query = db.query(Facility.data).filter(Facility.source == "hrsa")
+            if query.first() is None:
+                return None
+            if state_code:
+                query = query.filter(Facility.state == state_code.upper())
+            if bbox:
+                min_lat, min_lon, max_lat, max_lon = bbox
+                query = query.filter(
+                    Facility.latitude.between(min_lat, max_lat),
+                    Facility.longitude.between(min_lon, max_lon)
+                )
+            if facility_id:
+                query = query.filter(Facility.id == facility_id)
+            return [dict(data) for (data,) in query.all()]
+        except Exception as e:
+            logger.error(f"Error querying imported HRSA sites: {e}")
+            return None
+        finally:
+            db.close()
+    
+    def load_local_datasets(self) -> int:
+        """
+        Load imported sites into the facility store and response cache,
+        one dataset per state
+        
+        Returns:
+            Number of health centers loaded
+        """
+        if self.session_factory is None or self.store is None:
+            return 0
+        
+        by_state: Dict[str, List[Dict[str, Any]]] = {}
+        db = self.session_factory()
+        try:
+            rows = db.query(Facility.state, Facility.data).filter(
+                Facility.source == "hrsa", Facility.state.isnot(None)
+            )
+            for state, data in rows:
+                by_state.setdefault(state, []).append(dict(data))
+        except Exception as e:
+            logger.error(f"Error loading imported HRSA sites: {e}")
+            return 0
+        finally:
+            db.close()
+        
+        for state, health_centers in by_state.items():
+            self.restore_dataset(state, health_centers)
+        loaded = sum(len(health_centers) for health_centers in by_state.values())
+        if loaded:
+            logger.info(f"Loaded {loaded} imported health centers across {len(by_state)} states")
+        return loaded
+    
+    async def invalidate_cached(self, deltas: List[DatasetDelta]) -> int:
+        """
+        Drop cached responses affected by changes to imported sites
+        
+        Only the nearby candidate cells containing an old or new site
+        location, the changed sites' details and the changed states are
+        invalidated; everything else stays cached. When more than
+        NEARBY_INVALIDATE_MAX_POINTS locations changed, the nearby
+        namespace moves to a new generation instead of being enumerated.
+        
+        Args:
+            deltas: Per-state changes to the imported sites
+            
+        Returns:
+            Number of cache keys deleted
+        """
+        if self.cache is None:
+            return 0
+        
+        keys = set()
+        points = []
+        for delta in deltas:
+            if not delta.changed:
+                continue
+            if delta.key:
+                keys.add(self.fetch_health_centers_by_state.key(self, delta.key))
+            for record in delta.changed_records():
+                keys.add(self.get_health_center_details.key(self, record["id"]))
+            points.extend(delta.points())
+        
+        if len(points) > NEARBY_INVALIDATE_MAX_POINTS:
+            generation = await self.cache.bump_generation(NEARBY_NAMESPACE)
+            logger.info(f"{len(points)} site locations changed, moved nearby candidates to generation {generation}")
+        else:
+            generation = await self.cache.generation(NEARBY_NAMESPACE)
+            for latitude, longitude in points:
+                for geohash, radius_km in nearby_cells_containing(latitude, longitude):
+                    keys.add(self._get_nearby_candidates.key(self, geohash, radius_km, generation))
+        
+        return await self.cache.delete_many(keys)
+    
     def _transform_hrsa_data(self, hrsa_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """
         Transform HRSA health center data to UrbanAid format
@@ -325,22 +510,10 @@ class HRSAService:
             }
         ]
         
-        # Filter by radius and sort by distance
-        filtered_centers = []
-        user_location = (latitude, longitude)
-        
-        for center in mock_centers:
-            center_location = (center["latitude"], center["longitude"])
-            distance = geodesic(user_location, center_location).kilometers
-            
-            if distance <= radius_km:
-                center["distance_km"] = round(distance, 2)
-                filtered_centers.append(center)
-        
-        # Sort by distance and limit results
-        filtered_centers.sort(key=lambda x: x["distance_km"])
-        return filtered_centers[:limit]
+        # Filter by radius, sort by distance and limit results
+        return rank_by_distance(latitude, longitude, mock_centers, radius_km, limit)
     
+    @cached("hrsa")
     async def get_health_center_details(self, center_id: str) -> Optional[Dict[str, Any]]:
         """
         Get detailed information about a specific health center
@@ -352,6 +525,10 @@ class HRSAService:
             Detailed health center information or None if not found
         """
         try:
+            local = self._query_local(facility_id=center_id)
+            if local:
+                return local[0]
+            
             session = await self.get_session()
             
             # Extract the actual HRSA ID from our prefixed ID
@@ -1,14 +1,382 @@
 """Location service for geographic operations"""
 
+import logging
+import math
+import os
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from geopy.distance import geodesic
+from sqlalchemy.orm import Session
+
+from models.utility import Utility
+from services.clustering import ClusterIndex
+from services.nearest_index import NearestNeighborIndex
+from services.spatial_index import GeoGridIndex, bounding_box
+
+logger = logging.getLogger(__name__)
+
+GEO_INDEX_PRECISION = int(os.getenv("GEO_INDEX_PRECISION", "6"))
+# Edge deployments on SQLite can skip the in-process indexes and let the
+# R*Tree answer radius queries instead; on PostgreSQL the default is to push
+# queries down to PostGIS
+IN_MEMORY_GEO_INDEX = os.getenv(
+    "IN_MEMORY_GEO_INDEX",
+    "false" if os.getenv("DATABASE_URL", "").startswith("postgresql") else "true"
+).lower() == "true"
+EARTH_RADIUS_KM = 6371.0088
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance between two coordinates in kilometers"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def batch_distances_km(
+    latitude: float,
+    longitude: float,
+    latitudes: np.ndarray,
+    longitudes: np.ndarray,
+    high_accuracy: bool = False
+) -> np.ndarray:
+    """
+    Distances from one origin to many points in a single vectorized pass
+
+    Args:
+        latitude: Origin latitude in degrees
+        longitude: Origin longitude in degrees
+        latitudes: Array of point latitudes in degrees
+        longitudes: Array of point longitudes in degrees
+        high_accuracy: Use ellipsoidal (WGS-84) geodesic distances instead of
+            the spherical haversine approximation. Much slower; only for
+            callers that need sub-0.5% precision.
+
+    Returns:
+        Array of distances in kilometers; NaN where a coordinate is missing
+    """
+    latitudes = np.asarray(latitudes, dtype=np.float64)
+    longitudes = np.asarray(longitudes, dtype=np.float64)
+
+    if high_accuracy:
+        distances = np.full(latitudes.shape, np.nan)
+        valid = ~(np.isnan(latitudes) | np.isnan(longitudes))
+        origin = (latitude, longitude)
+        distances[valid] = [
+            geodesic(origin, (lat, lon)).kilometers
+            for lat, lon in zip(latitudes[valid], longitudes[valid])
+        ]
+        return distances
+
+    phi1 = math.radians(latitude)
+    phi2 = np.radians(latitudes)
+    d_phi = phi2 - phi1
+    d_lambda = np.radians(longitudes - longitude)
+    a = np.sin(d_phi / 2) ** 2 + math.cos(phi1) * np.cos(phi2) * np.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def coordinate_arrays(records: Sequence[Dict[str, Any]]) -> Tuple[np.ndarray, np.ndarray]:
+    """Pull latitude/longitude arrays out of record dicts (missing -> NaN)"""
+    count = len(records)
+    latitudes = np.fromiter(
+        (r["latitude"] if r.get("latitude") is not None else np.nan for r in records),
+        dtype=np.float64, count=count
+    )
+    longitudes = np.fromiter(
+        (r["longitude"] if r.get("longitude") is not None else np.nan for r in records),
+        dtype=np.float64, count=count
+    )
+    return latitudes, longitudes
+
+
+def rank_by_distance(
+    latitude: float,
+    longitude: float,
+    records: Sequence[Dict[str, Any]],
+    radius_km: Optional[float] = None,
+    limit: Optional[int] = None,
+    high_accuracy: bool = False,
+    keep_unlocated: bool = False
+) -> List[Dict[str, Any]]:
+    """
+    Order records by distance from an origin using the batch engine
+
+    Args:
+        latitude: Origin latitude
+        longitude: Origin longitude
+        records: Dicts with ``latitude``/``longitude`` keys
+        radius_km: Drop records farther than this
+        limit: Maximum number of results
+        high_accuracy: Use ellipsoidal distances
+        keep_unlocated: Keep records without coordinates at the end of the
+            list instead of dropping them (only without a radius)
+
+    Returns:
+        Copies of the records with ``distance_km`` set, nearest first
+    """
+    if not records:
+        return []
+
+    latitudes, longitudes = coordinate_arrays(records)
+    distances = batch_distances_km(latitude, longitude, latitudes, longitudes, high_accuracy)
+
+    located = ~np.isnan(distances)
+    if radius_km is not None:
+        selected = np.flatnonzero(located & (distances <= radius_km))
+    else:
+        selected = np.flatnonzero(located)
+
+    if limit is not None and len(selected) > limit:
+        nearest = np.argpartition(distances[selected], limit - 1)[:limit]
+        selected = selected[nearest]
+    selected = selected[np.argsort(distances[selected], kind="stable")]
+
+    ranked = [
+        {**records[i], "distance_km": round(float(distances[i]), 2)}
+        for i in selected
+    ]
+
+    if keep_unlocated and radius_km is None:
+        ranked.extend(records[i] for i in np.flatnonzero(~located))
+        if limit is not None:
+            ranked = ranked[:limit]
+    return ranked
+
+
+def limit_results(
+    records: Sequence[Dict[str, Any]],
+    limit: int,
+    latitude: Optional[float] = None,
+    longitude: Optional[float] = None
+) -> Tuple[List[Dict[str, Any]], bool]:
+    """
+    Cap a viewport result set, ordering by distance only when an origin is given
+
+    Returns:
+        Tuple of (records, truncated)
+    """
+    truncated = len(records) > limit
+    if latitude is not None and longitude is not None:
+        return rank_by_distance(latitude, longitude, records, limit=limit), truncated
+    return list(records[:limit]), truncated
+
+
 class LocationService:
     """Service for location-related operations"""
-    
+
+    def __init__(self, precision: int = GEO_INDEX_PRECISION, in_memory: bool = IN_MEMORY_GEO_INDEX):
+        self.in_memory = in_memory
+        self.index = GeoGridIndex(precision)
+        self.nearest = NearestNeighborIndex()
+        self.clusters = ClusterIndex()
+        self._rebuild_lock = threading.Lock()
+        self._lock = threading.Lock()
+        # Writes made while build_index reads its snapshot, replayed on top
+        self._replay: Optional[List[Tuple[str, Any]]] = None
+
     def calculate_distance(self, lat1: float, lon1: float, lat2: float, lon2: float) -> float:
-        """Calculate distance between two coordinates"""
-        # Mock implementation - return random distance
-        return 1.5
-    
-    def get_nearby_points(self, latitude: float, longitude: float, radius: float):
-        """Get nearby points within radius"""
-        # Mock implementation
-        return [] 
\ No newline at end of file
+        """Calculate great-circle distance between two coordinates in kilometers"""
+        return haversine_km(lat1, lon1, lat2, lon2)
+
+    def build_index(self, db: Session, batch_size: int = 10000) -> int:
+        """
+        Rebuild the in-memory utility indexes from the utilities table
+
+        Writes indexed while the table is being read may be missing from
+        the snapshot, so they are journaled and replayed onto the rebuilt
+        indexes before the rebuild returns.
+
+        Args:
+            db: Database session
+            batch_size: Number of rows fetched per round trip
+
+        Returns:
+            Number of utilities indexed
+        """
+        with self._rebuild_lock:
+            with self._lock:
+                self._replay = []
+            try:
+                records = [utility.to_dict() for utility in db.query(Utility).yield_per(batch_size)]
+
+                # The cluster hierarchy backs /utilities/clusters in every mode
+                self.clusters.load(records)
+                index = None
+                if self.in_memory:
+                    # Loaded aside and swapped in, so readers never see a half-built index
+                    index = GeoGridIndex(self.index.precision)
+                    index.bulk_load(records)
+                    self.nearest.load(records)
+
+                with self._lock:
+                    if index is not None:
+                        self.index = index
+                    for operation, value in self._replay:
+                        if operation == "upsert":
+                            self._upsert(value)
+                        else:
+                            self._remove(value)
+                    replayed = len(self._replay)
+            finally:
+                with self._lock:
+                    self._replay = None
+
+        if index is None:
+            return len(records)
+        logger.info(
+            f"Indexed {len(index)} utilities in {len(index._cells)} grid cells "
+            f"({replayed} writes replayed)"
+        )
+        return len(index)
+
+    def index_utility(self, utility: Utility):
+        """Add or refresh a utility in the in-memory indexes"""
+        record = utility.to_dict()
+        with self._lock:
+            if self._replay is not None:
+                self._replay.append(("upsert", record))
+            self._upsert(record)
+
+    def remove_utility(self, utility_id: str):
+        """Drop a utility from the in-memory indexes"""
+        with self._lock:
+            if self._replay is not None:
+                self._replay.append(("remove", utility_id))
+            self._remove(utility_id)
+
+    def _upsert(self, record: Dict[str, Any]):
+        self.clusters.upsert(record)
+        if not self.in_memory:
+            return
+        self.index.upsert(record)
+        self.nearest.upsert(record)
+
+    def _remove(self, utility_id: str):
+        self.clusters.remove(utility_id)
+        self.index.remove(utility_id)
+        self.nearest.remove(utility_id)
+
+    def get_nearby_points(
+        self,
+        latitude: float,
+        longitude: float,
+        radius: float,
+        category: Optional[str] = None,
+        limit: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Get indexed utilities within radius, nearest first
+
+        Args:
+            latitude: Search origin latitude
+            longitude: Search origin longitude
+            radius: Search radius in kilometers
+            category: Optional category filter
+            limit: Maximum number of results
+
+        Returns:
+            Utility dicts with a ``distance_km`` field
+        """
+        candidates = self.index.candidates_in_bbox(*bounding_box(latitude, longitude, radius))
+        if category:
+            candidates = [record for record in candidates if record.get("category") == category]
+        return rank_by_distance(latitude, longitude, candidates, radius, limit)
+
+    def get_nearest_points_batch(
+        self,
+        latitudes: Sequence[float],
+        longitudes: Sequence[float],
+        k: int,
+        category: Optional[str] = None,
+        max_distance_km: Optional[float] = None
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Get the k closest indexed utilities for many origins in one pass
+
+        Returns:
+            One list of utility dicts with ``distance_km`` per origin
+        """
+        matches = self.nearest.query_batch(latitudes, longitudes, k, category, max_distance_km)
+        return [
+            [{**record, "distance_km": round(distance, 2)} for distance, record in row]
+            for row in matches
+        ]
+
+    def get_points_in_bbox(
+        self,
+        min_lat: float,
+        min_lon: float,
+        max_lat: float,
+        max_lon: float,
+        category: Optional[str],
+        limit: int,
+        latitude: Optional[float] = None,
+        longitude: Optional[float] = None
+    ) -> Tuple[List[Dict[str, Any]], bool]:
+        """
+        Get indexed utilities inside a viewport
+
+        Distances are only computed when a sort origin is supplied.
+
+        Returns:
+            Tuple of (utilities, truncated)
+        """
+        records = self.index.query_bbox(min_lat, min_lon, max_lat, max_lon)
+        if category:
+            records = [record for record in records if record.get("category") == category]
+        return limit_results(records, limit, latitude, longitude)
+
+    def get_nearest_points(
+        self,
+        latitude: float,
+        longitude: float,
+        k: int,
+        category: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Get the k indexed utilities closest to a point
+
+        Args:
+            latitude: Search origin latitude
+            longitude: Search origin longitude
+            k: Number of utilities to return
+            category: Optional category filter
+
+        Returns:
+            Utility dicts with a ``distance_km`` field, nearest first
+        """
+        return [
+            {**record, "distance_km": round(distance, 2)}
+            for distance, record in self.nearest.query(latitude, longitude, k, category)
+        ]
+
+    def get_clusters(
+        self,
+        min_lon: float,
+        min_lat: float,
+        max_lon: float,
+        max_lat: float,
+        zoom: int,
+        max_items: int
+    ) -> Dict[str, Any]:
+        """
+        Get marker clusters for a map viewport
+
+        Args:
+            min_lon: Western edge of the viewport
+            min_lat: Southern edge of the viewport
+            max_lon: Eastern edge of the viewport
+            max_lat: Northern edge of the viewport
+            zoom: Map zoom level
+            max_items: Cap on returned clusters and points
+
+        Returns:
+            Dict with the clusters/points and a ``truncated`` flag
+        """
+        items, truncated = self.clusters.query(min_lon, min_lat, max_lon, max_lat, zoom, max_items)
+        return {"zoom": zoom, "items": items, "count": len(items), "truncated": truncated}
@@ -0,0 +1,356 @@
+"""
+k-nearest-neighbour index over point records
+One KD-tree per category, built on unit-sphere (x, y, z) coordinates so
+Euclidean chord distance orders points exactly like great-circle distance
+"""
+
+import math
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def to_unit_sphere(latitudes: np.ndarray, longitudes: np.ndarray) -> np.ndarray:
+    """Convert lat/lon arrays in degrees to an (n, 3) array of unit vectors"""
+    phi = np.radians(np.asarray(latitudes, dtype=np.float64))
+    lam = np.radians(np.asarray(longitudes, dtype=np.float64))
+    cos_phi = np.cos(phi)
+    return np.column_stack((cos_phi * np.cos(lam), cos_phi * np.sin(lam), np.sin(phi)))
+
+
+def chord_to_km(chord: np.ndarray) -> np.ndarray:
+    """Convert unit-sphere chord lengths to great-circle kilometers"""
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.clip(np.asarray(chord) / 2, 0.0, 1.0))
+
+
+def km_to_chord(distance_km: float) -> float:
+    """Convert a great-circle distance to a unit-sphere chord length"""
+    return 2 * math.sin(min(distance_km / EARTH_RADIUS_KM, math.pi) / 2)
+
+
+def _object_array(items: List[Any]) -> np.ndarray:
+    """Build a 1-D object array without NumPy trying to unpack dicts"""
+    array = np.empty(len(items), dtype=object)
+    array[:] = items
+    return array
+
+
+def _merge_batch(parts: List[Tuple[np.ndarray, np.ndarray]], m: int, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Merge per-source (chords, records) matrices into the k best per row"""
+    if not parts:
+        return np.full((m, 0), np.inf), np.empty((m, 0), dtype=object)
+    chords = np.hstack([c for c, _ in parts])
+    records = np.hstack([r for _, r in parts])
+    order = np.argsort(chords, axis=1, kind="stable")[:, :k]
+    return np.take_along_axis(chords, order, axis=1), np.take_along_axis(records, order, axis=1)
+
+
+class _CategoryTree:
+    """
+    Static KD-tree plus a small write buffer
+
+    Writes land in ``delta`` (new or moved points) and ``tombstones`` (IDs in
+    the tree that are stale). Queries search the tree, skip tombstones and
+    brute-force the buffer; once the buffer outgrows its budget the tree is
+    rebuilt, so rebuild cost is amortized across many writes.
+    """
+
+    def __init__(self, rebuild_threshold: int):
+        self.rebuild_threshold = rebuild_threshold
+        self.tree: Optional[cKDTree] = None
+        self.ids: List[str] = []
+        self.records: List[Dict[str, Any]] = []
+        self.record_array = _object_array([])
+        self.positions: Dict[str, int] = {}
+        self.tombstones = set()
+        self._dead: Optional[np.ndarray] = None
+        self.delta: Dict[str, Tuple[np.ndarray, Dict[str, Any]]] = {}
+
+    def __len__(self) -> int:
+        return len(self.ids) - len(self.tombstones) + len(self.delta)
+
+    def upsert(self, record: Dict[str, Any]):
+        record_id = record["id"]
+        if record_id in self.positions:
+            self.tombstones.add(record_id)
+            self._dead = None
+        point = to_unit_sphere([record["latitude"]], [record["longitude"]])[0]
+        self.delta[record_id] = (point, record)
+        self._maybe_rebuild()
+
+    def remove(self, record_id: str):
+        if record_id in self.positions:
+            self.tombstones.add(record_id)
+            self._dead = None
+        self.delta.pop(record_id, None)
+        self._maybe_rebuild()
+
+    def _maybe_rebuild(self):
+        pending = len(self.delta) + len(self.tombstones)
+        if pending > max(self.rebuild_threshold, len(self.ids) // 10):
+            self.rebuild()
+
+    def rebuild(self):
+        """Fold the write buffer into a freshly built tree"""
+        records = [
+            record for record_id, record in zip(self.ids, self.records)
+            if record_id not in self.tombstones
+        ]
+        records.extend(record for _, record in self.delta.values())
+        self.load(records)
+
+    def load(self, records: List[Dict[str, Any]]):
+        self.records = records
+        self.record_array = _object_array(records)
+        self.ids = [record["id"] for record in records]
+        self.positions = {record_id: i for i, record_id in enumerate(self.ids)}
+        self.tombstones = set()
+        self._dead = None
+        self.delta = {}
+        if records:
+            points = to_unit_sphere(
+                [record["latitude"] for record in records],
+                [record["longitude"] for record in records]
+            )
+            self.tree = cKDTree(points)
+        else:
+            self.tree = None
+
+    def _dead_mask(self) -> np.ndarray:
+        """Boolean mask over tree positions that are tombstoned"""
+        if self._dead is None:
+            self._dead = np.zeros(len(self.ids), dtype=bool)
+            self._dead[[self.positions[record_id] for record_id in self.tombstones]] = True
+        return self._dead
+
+    def _query_tree(self, point: np.ndarray, k: int, fetch: int) -> List[Tuple[float, Dict[str, Any]]]:
+        """Up to k live (chord, record) pairs from the tree, widening past tombstones"""
+        fetch = min(max(fetch, k), len(self.ids))
+        while True:
+            chords, indices = self.tree.query(point, k=fetch)
+            matches = [
+                (float(chord), self.records[index])
+                for chord, index in zip(np.atleast_1d(chords), np.atleast_1d(indices))
+                if self.ids[index] not in self.tombstones
+            ][:k]
+            if len(matches) == k or fetch == len(self.ids):
+                return matches
+            fetch = min(fetch * 2, len(self.ids))
+
+    def query(self, point: np.ndarray, k: int) -> List[Tuple[float, Dict[str, Any]]]:
+        """Return up to k (chord, record) pairs nearest to a unit vector"""
+        matches: List[Tuple[float, Dict[str, Any]]] = []
+
+        if self.tree is not None:
+            # Widen the search only when tombstones hid some of the neighbours
+            matches = self._query_tree(point, k, k)
+
+        if self.delta:
+            points = np.array([p for p, _ in self.delta.values()])
+            chords = np.linalg.norm(points - point, axis=1)
+            for chord, (_, record) in zip(chords, self.delta.values()):
+                matches.append((float(chord), record))
+
+        matches.sort(key=lambda match: match[0])
+        return matches[:k]
+
+    def query_batch(self, points: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        k nearest for many unit vectors in one vectorized pass
+
+        With tombstones, each origin fetches 2k neighbours rather than
+        k plus every tombstone, and only the origins left short of k live
+        neighbours are widened one at a time.
+
+        Returns:
+            (chords, records) matrices of shape (len(points), <= k); missing
+            neighbours have an infinite chord
+        """
+        m = len(points)
+        parts = []
+
+        if self.tree is not None:
+            n = len(self.ids)
+            fetch = min(2 * k if self.tombstones else k, n)
+            chords, indices = self.tree.query(points, k=fetch)
+            chords = np.asarray(chords, dtype=np.float64).reshape(m, fetch)
+            indices = np.asarray(indices).reshape(m, fetch)
+            records = self.record_array[indices]
+            if self.tombstones:
+                chords = np.where(self._dead_mask()[indices], np.inf, chords)
+                width = min(k, fetch)
+                order = np.argsort(chords, axis=1, kind="stable")[:, :width]
+                chords = np.take_along_axis(chords, order, axis=1)
+                records = np.take_along_axis(records, order, axis=1)
+                live = min(k, n - len(self.tombstones))
+                if fetch < n:
+                    for row in np.flatnonzero(np.isfinite(chords).sum(axis=1) < live):
+                        matches = self._query_tree(points[row], k, 4 * k)
+                        chords[row] = np.inf
+                        chords[row, :len(matches)] = [chord for chord, _ in matches]
+                        records[row, :len(matches)] = _object_array([record for _, record in matches])
+            parts.append((chords, records))
+
+        if self.delta:
+            delta_points = np.array([p for p, _ in self.delta.values()])
+            delta_records = _object_array([record for _, record in self.delta.values()])
+            fetch = min(k, len(delta_records))
+            chords, indices = cKDTree(delta_points).query(points, k=fetch)
+            chords = np.asarray(chords, dtype=np.float64).reshape(m, fetch)
+            indices = np.asarray(indices).reshape(m, fetch)
+            parts.append((chords, delta_records[indices]))
+
+        return _merge_batch(parts, m, k)
+
+
+class NearestNeighborIndex:
+    """
+    Per-category KD-trees answering "the k closest" in O(log n + k)
+
+    Query cost depends on k, not on how many points sit near the origin,
+    so a dense downtown search costs the same as a rural one.
+    """
+
+    def __init__(self, rebuild_threshold: int = 1024):
+        self.rebuild_threshold = rebuild_threshold
+        self._trees: Dict[str, _CategoryTree] = {}
+        self._record_categories: Dict[str, str] = {}
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._record_categories)
+
+    def categories(self) -> List[str]:
+        return list(self._trees)
+
+    def load(self, records: List[Dict[str, Any]]):
+        """Replace the index contents and build every tree in one pass"""
+        by_category: Dict[str, List[Dict[str, Any]]] = {}
+        for record in records:
+            if record.get("latitude") is None or record.get("longitude") is None:
+                continue
+            by_category.setdefault(record.get("category") or "", []).append(record)
+
+        with self._lock:
+            self._trees = {}
+            self._record_categories = {}
+            for category, category_records in by_category.items():
+                tree = _CategoryTree(self.rebuild_threshold)
+                tree.load(category_records)
+                self._trees[category] = tree
+                for record in category_records:
+                    self._record_categories[record["id"]] = category
+
+    def upsert(self, record: Dict[str, Any]):
+        """Insert or move a record, switching trees if its category changed"""
+        if record.get("latitude") is None or record.get("longitude") is None:
+            self.remove(record["id"])
+            return
+
+        category = record.get("category") or ""
+        with self._lock:
+            previous = self._record_categories.get(record["id"])
+            if previous is not None and previous != category:
+                self._trees[previous].remove(record["id"])
+            if category not in self._trees:
+                self._trees[category] = _CategoryTree(self.rebuild_threshold)
+            self._trees[category].upsert(record)
+            self._record_categories[record["id"]] = category
+
+    def remove(self, record_id: str):
+        """Drop a record from its category tree"""
+        with self._lock:
+            category = self._record_categories.pop(record_id, None)
+            if category is not None:
+                self._trees[category].remove(record_id)
+
+    def query(
+        self,
+        latitude: float,
+        longitude: float,
+        k: int,
+        category: Optional[str] = None,
+        max_distance_km: Optional[float] = None
+    ) -> List[Tuple[float, Dict[str, Any]]]:
+        """
+        Find the k records nearest to a point
+
+        Args:
+            latitude: Origin latitude
+            longitude: Origin longitude
+            k: Number of neighbours to return
+            category: Restrict to one category; all categories when omitted
+            max_distance_km: Optional cut-off distance
+
+        Returns:
+            List of (distance_km, record) tuples, nearest first
+        """
+        point = to_unit_sphere([latitude], [longitude])[0]
+
+        with self._lock:
+            if category is not None:
+                trees = [self._trees[category]] if category in self._trees else []
+            else:
+                trees = list(self._trees.values())
+
+            matches = []
+            for tree in trees:
+                matches.extend(tree.query(point, k))
+
+        matches.sort(key=lambda match: match[0])
+        if max_distance_km is not None:
+            max_chord = km_to_chord(max_distance_km)
+            matches = [match for match in matches if match[0] <= max_chord]
+
+        return [
+            (float(chord_to_km(chord)), record)
+            for chord, record in matches[:k]
+        ]
+
+    def query_batch(
+        self,
+        latitudes: np.ndarray,
+        longitudes: np.ndarray,
+        k: int,
+        category: Optional[str] = None,
+        max_distance_km: Optional[float] = None
+    ) -> List[List[Tuple[float, Dict[str, Any]]]]:
+        """
+        Find the k nearest records for many origins at once
+
+        All origins go through each KD-tree in a single vectorized query,
+        instead of one tree walk per request.
+
+        Args:
+            latitudes: Origin latitudes
+            longitudes: Origin longitudes
+            k: Number of neighbours per origin
+            category: Restrict to one category; all categories when omitted
+            max_distance_km: Optional cut-off distance
+
+        Returns:
+            One list of (distance_km, record) tuples per origin, nearest first
+        """
+        points = to_unit_sphere(latitudes, longitudes)
+        m = len(points)
+
+        with self._lock:
+            if category is not None:
+                trees = [self._trees[category]] if category in self._trees else []
+            else:
+                trees = list(self._trees.values())
+            parts = [tree.query_batch(points, k) for tree in trees]
+
+        chords, records = _merge_batch(parts, m, k)
+        max_chord = km_to_chord(max_distance_km) if max_distance_km is not None else np.inf
+        distances = chord_to_km(np.where(np.isfinite(chords), chords, 0.0))
+
+        results = []
+        for row in range(m):
+            keep = np.flatnonzero(np.isfinite(chords[row]) & (chords[row] <= max_chord))
+            results.append([(float(distances[row, i]), records[row, i]) for i in keep])
+        return results
@@ -1 +1,77 @@
- 
\ No newline at end of file
+"""
+Moderator notifications
+Reports and other events worth a human look are posted to a webhook
+(Slack-compatible JSON) and logged
+"""
+
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+MODERATOR_WEBHOOK_URL = os.getenv("MODERATOR_WEBHOOK_URL", "")
+# Recently delivered notifications kept for inspection
+SENT_HISTORY = 100
+
+
+class NotificationService:
+    """
+    Builds and delivers moderator notifications
+
+    Handlers only build the notification; ``dispatch`` hands it to the job
+    queue so delivery (and its retries) never holds up a request. Without
+    a dispatcher it is delivered in a thread.
+
+    Args:
+        dispatch: Enqueues a notification for delivery
+        webhook_url: Webhook to POST notifications to; unset only logs them
+    """
+
+    def __init__(
+        self,
+        dispatch: Optional[Callable[[Dict[str, Any]], Any]] = None,
+        webhook_url: str = MODERATOR_WEBHOOK_URL
+    ):
+        self.dispatch = dispatch
+        self.webhook_url = webhook_url
+        self.sent: Deque[Dict[str, Any]] = deque(maxlen=SENT_HISTORY)
+
+    async def notify_utility_reported(self, utility_id: str, reason: str):
+        """Tell moderators a utility was reported"""
+        await self.notify({
+            "event": "utility_reported",
+            "utility_id": utility_id,
+            "reason": reason,
+            "text": f"Utility {utility_id} was reported: {reason}",
+        })
+
+    async def notify(self, notification: Dict[str, Any]):
+        """Hand a notification to the dispatcher, or deliver it in a thread"""
+        notification = {**notification, "created_at": time.time()}
+        if self.dispatch is not None:
+            self.dispatch(notification)
+        else:
+            await asyncio.to_thread(self.deliver, notification)
+
+    def deliver(self, notification: Dict[str, Any]):
+        """
+        Post a notification to the webhook
+
+        Raises:
+            httpx.HTTPError: When the webhook fails, so the caller can retry
+        """
+        logger.info(f"Notification: {notification.get('text', notification.get('event'))}")
+        if self.webhook_url:
+            response = httpx.post(self.webhook_url, json=notification, timeout=10.0)
+            response.raise_for_status()
+        self.sent.append(notification)
+
+    def recent(self) -> List[Dict[str, Any]]:
+        """Notifications delivered by this instance, oldest first"""
+        return list(self.sent)
@@ -0,0 +1,106 @@
+"""
+Concurrent pagination for page-numbered upstream APIs
+The first page is fetched alone to learn the page count; the remaining
+pages are then requested concurrently and yielded as they arrive
+"""
+
+import asyncio
+import contextlib
+import logging
+import random
+from typing import Any, AsyncIterator, Callable, Dict, Optional, Tuple
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PAGE_RETRIES = 3
+DEFAULT_RETRY_BACKOFF = 0.5
+DEFAULT_PAGE_CONCURRENCY = 4
+
+
+def _retryable(error: Exception) -> bool:
+    if isinstance(error, httpx.HTTPStatusError):
+        status = error.response.status_code
+        return status == 429 or status >= 500
+    return isinstance(error, httpx.TransportError)
+
+
+async def fetch_page(
+    session: httpx.AsyncClient,
+    url: str,
+    params: Dict[str, Any],
+    retries: int = DEFAULT_PAGE_RETRIES,
+    backoff: float = DEFAULT_RETRY_BACKOFF,
+    semaphore: Optional[asyncio.Semaphore] = None
+) -> Dict[str, Any]:
+    """
+    GET one JSON page, retrying timeouts, connection errors, 429s and 5xxs
+
+    Other 4xx responses are raised immediately since retrying cannot help.
+    A semaphore, if given, is held per attempt and released during the
+    backoff sleep, so a flaky page does not hold a slot while it waits.
+    """
+    for attempt in range(retries + 1):
+        try:
+            async with semaphore or contextlib.nullcontext():
+                response = await session.get(url, params=params)
+                response.raise_for_status()
+                return response.json()
+        except Exception as e:
+            if attempt == retries or not _retryable(e):
+                raise
+            delay = backoff * (2 ** attempt) * (1 + random.random())
+            logger.warning(f"Retrying {url} page {params.get('page')} in {delay:.1f}s: {e}")
+            await asyncio.sleep(delay)
+
+
+async def fetch_pages(
+    session: httpx.AsyncClient,
+    url: str,
+    params: Dict[str, Any],
+    total_pages: Callable[[Dict[str, Any]], int],
+    semaphore: Optional[asyncio.Semaphore] = None,
+    page_param: str = "page",
+    retries: int = DEFAULT_PAGE_RETRIES,
+    backoff: float = DEFAULT_RETRY_BACKOFF
+) -> AsyncIterator[Tuple[int, Dict[str, Any]]]:
+    """
+    Yield (page number, payload) for every page of a paginated endpoint
+
+    Pages after the first are yielded in completion order, so a full walk
+    takes roughly as long as the slowest page rather than the sum of all
+    pages. A page that still fails after its retries aborts the walk and
+    cancels the pages still pending.
+
+    Args:
+        session: HTTP client
+        url: Endpoint URL
+        params: Query parameters shared by every page
+        total_pages: Reads the page count from the first page's payload
+        semaphore: Caps concurrent page requests; may be shared between
+            walks to bound the load on one upstream host
+        page_param: Name of the page number query parameter
+        retries: Retries per page on transient errors
+        backoff: Base delay in seconds between retries
+    """
+    semaphore = semaphore or asyncio.Semaphore(DEFAULT_PAGE_CONCURRENCY)
+
+    async def get(page: int) -> Tuple[int, Dict[str, Any]]:
+        return page, await fetch_page(session, url, {**params, page_param: page}, retries, backoff, semaphore)
+
+    first_page = await get(1)
+    yield first_page
+
+    pages = total_pages(first_page[1])
+    if pages <= 1:
+        return
+
+    tasks = [asyncio.ensure_future(get(page)) for page in range(2, pages + 1)]
+    try:
+        for next_page in asyncio.as_completed(tasks):
+            yield await next_page
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
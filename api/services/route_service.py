@@ -0,0 +1,151 @@
+"""
+Route-corridor search
+Finds points within a buffer of an encoded polyline by looking up the
+spatial index one route segment at a time
+"""
+
+import math
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from services.location_service import haversine_km
+from services.spatial_index import KM_PER_DEGREE_LAT
+
+# Long segments are split so each index lookup covers a tight bounding box
+# and the flat-earth projection used for point/segment distance stays accurate
+MAX_SEGMENT_KM = 5.0
+
+BBoxLookup = Callable[[float, float, float, float], List[Dict[str, Any]]]
+
+
+def decode_polyline(encoded: str, precision: int = 5) -> List[Tuple[float, float]]:
+    """
+    Decode a Google encoded polyline
+
+    Args:
+        encoded: Encoded polyline string
+        precision: Coordinate precision (5 for Google, 6 for OSRM/Valhalla)
+
+    Returns:
+        List of (latitude, longitude) tuples
+    """
+    factor = 10 ** precision
+    coordinates = []
+    index = latitude = longitude = 0
+
+    while index < len(encoded):
+        deltas = []
+        for _ in range(2):
+            shift = result = 0
+            while True:
+                if index >= len(encoded):
+                    raise ValueError("Truncated polyline")
+                byte = ord(encoded[index]) - 63
+                index += 1
+                result |= (byte & 0x1F) << shift
+                shift += 5
+                if byte < 0x20:
+                    break
+            deltas.append(~(result >> 1) if result & 1 else result >> 1)
+        latitude += deltas[0]
+        longitude += deltas[1]
+        coordinates.append((latitude / factor, longitude / factor))
+
+    return coordinates
+
+
+def densify(route: List[Tuple[float, float]], max_segment_km: float = MAX_SEGMENT_KM) -> List[Tuple[float, float]]:
+    """Insert intermediate vertices so no segment is longer than max_segment_km"""
+    if len(route) < 2:
+        return list(route)
+
+    dense = [route[0]]
+    for (lat1, lon1), (lat2, lon2) in zip(route, route[1:]):
+        pieces = max(1, math.ceil(haversine_km(lat1, lon1, lat2, lon2) / max_segment_km))
+        for step in range(1, pieces + 1):
+            t = step / pieces
+            dense.append((lat1 + (lat2 - lat1) * t, lon1 + (lon2 - lon1) * t))
+    return dense
+
+
+def search_along_route(
+    route: List[Tuple[float, float]],
+    buffer_km: float,
+    lookup: BBoxLookup,
+    limit: Optional[int] = None
+) -> Tuple[List[Dict[str, Any]], float, bool]:
+    """
+    Find indexed records within a buffer of a route
+
+    Each segment's buffered bounding box is looked up in the spatial index
+    and the candidates are measured against that segment only, so the
+    work is proportional to the corridor area rather than the table.
+
+    Args:
+        route: Route vertices as (latitude, longitude)
+        buffer_km: Corridor half-width in kilometers
+        lookup: Returns candidate records for (min_lat, min_lon, max_lat, max_lon)
+        limit: Maximum number of results
+
+    Returns:
+        Tuple of (records ordered by position along the route, route length
+        in km, truncated). Records carry ``route_position_km`` and
+        ``distance_from_route_km``.
+    """
+    route = densify(route)
+    if len(route) == 1:
+        route = route * 2
+
+    best: Dict[str, Tuple[float, float, Dict[str, Any]]] = {}
+    travelled = 0.0
+    lat_pad = buffer_km / KM_PER_DEGREE_LAT
+
+    for (lat1, lon1), (lat2, lon2) in zip(route, route[1:]):
+        mid_lat = math.radians((lat1 + lat2) / 2)
+        km_per_deg_lon = max(KM_PER_DEGREE_LAT * math.cos(mid_lat), 1e-6)
+        lon_pad = buffer_km / km_per_deg_lon
+
+        candidates = lookup(
+            min(lat1, lat2) - lat_pad, min(lon1, lon2) - lon_pad,
+            max(lat1, lat2) + lat_pad, max(lon1, lon2) + lon_pad
+        )
+
+        # Local flat projection around the segment, in kilometers
+        seg_x = (lon2 - lon1) * km_per_deg_lon
+        seg_y = (lat2 - lat1) * KM_PER_DEGREE_LAT
+        seg_len_sq = seg_x * seg_x + seg_y * seg_y
+        seg_len = math.sqrt(seg_len_sq)
+
+        if candidates:
+            px = (np.array([c["longitude"] for c in candidates]) - lon1) * km_per_deg_lon
+            py = (np.array([c["latitude"] for c in candidates]) - lat1) * KM_PER_DEGREE_LAT
+            if seg_len_sq > 0:
+                t = np.clip((px * seg_x + py * seg_y) / seg_len_sq, 0.0, 1.0)
+            else:
+                t = np.zeros_like(px)
+            distances = np.hypot(px - t * seg_x, py - t * seg_y)
+
+            for i in np.flatnonzero(distances <= buffer_km):
+                record = candidates[i]
+                distance = float(distances[i])
+                previous = best.get(record["id"])
+                if previous is None or distance < previous[0]:
+                    best[record["id"]] = (distance, travelled + float(t[i]) * seg_len, record)
+
+        travelled += seg_len
+
+    ordered = sorted(best.values(), key=lambda match: match[1])
+    truncated = limit is not None and len(ordered) > limit
+    if limit is not None:
+        ordered = ordered[:limit]
+
+    results = [
+        {
+            **record,
+            "route_position_km": round(position, 3),
+            "distance_from_route_km": round(distance, 3)
+        }
+        for distance, position, record in ordered
+    ]
+    return results, round(travelled, 3), truncated
@@ -0,0 +1,56 @@
+"""
+Request coalescing for identical concurrent upstream calls
+Concurrent callers asking for the same key share one in-flight task
+"""
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """
+    Async single-flight group
+
+    The first caller for a key starts the work as a task; callers arriving
+    while it runs await that same task and get its result or its
+    exception. The task is shielded, so a cancelled caller (e.g. a client
+    that disconnected) does not cancel the fetch the others are waiting on.
+    """
+
+    def __init__(self):
+        self.coalesced = 0
+        self._calls: Dict[str, asyncio.Future] = {}
+
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run fn for key unless an identical call is already in flight
+
+        Args:
+            key: Normalized request key
+            fn: Zero-argument coroutine function doing the actual work
+
+        Returns:
+            The shared result of fn
+        """
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            self.coalesced += 1
+            logger.debug(f"Coalesced request for {key}")
+        return await asyncio.shield(task)
+
+    def _forget(self, key: str, task: asyncio.Future):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # Mark the outcome as seen when every waiter was cancelled
+        if not task.cancelled():
+            task.exception()
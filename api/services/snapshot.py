@@ -0,0 +1,139 @@
+"""
+On-disk snapshots of federal facility datasets
+Each FacilityStore dataset (a source and state, e.g. VA health facilities
+in CA) is written as a compressed msgpack file so a restarted process can
+serve it before reaching any upstream API
+"""
+
+import asyncio
+import logging
+import os
+import tempfile
+import time
+import zlib
+from typing import Any, Dict, Iterator, List, NamedTuple, Tuple
+from urllib.parse import quote, unquote
+
+import msgpack
+
+from services.facility_store import FACILITY_SOURCES, FacilityStore
+
+logger = logging.getLogger(__name__)
+
+# Bump when the record layout changes; older snapshots are then ignored
+SNAPSHOT_FORMAT = 1
+SNAPSHOT_SUFFIX = ".msgpack.z"
+
+
+class Snapshot(NamedTuple):
+    source: str
+    key: str
+    records: List[Dict[str, Any]]
+    tag: str
+    written_at: float
+
+
+class SnapshotStore:
+    """
+    Versioned, compressed dataset snapshots under one directory
+
+    Layout is ``<directory>/<source>/<quoted dataset key>.msgpack.z``.
+    Files are replaced atomically, so a crash mid-write leaves the previous
+    snapshot intact, and only datasets whose version changed since the
+    last write are rewritten.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._written: Dict[Tuple[str, str], int] = {}
+
+    def _path(self, source: str, key: str) -> str:
+        return os.path.join(self.directory, source, quote(key, safe="") + SNAPSHOT_SUFFIX)
+
+    def write(self, source: str, key: str, records: List[Dict[str, Any]], tag: str):
+        """Atomically write one dataset snapshot"""
+        payload = {
+            "format": SNAPSHOT_FORMAT,
+            "source": source,
+            "key": key,
+            "tag": tag,
+            "written_at": time.time(),
+            "records": records,
+        }
+        data = zlib.compress(msgpack.packb(payload, use_bin_type=True, default=str), 6)
+
+        path = self._path(source, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+
+    def write_changed(self, store: FacilityStore) -> int:
+        """
+        Write every dataset that changed since the last call
+
+        Returns:
+            Number of snapshot files written
+        """
+        written = 0
+        for source, key in store.datasets():
+            version = store.dataset_version(source, key)
+            if self._written.get((source, key)) == version:
+                continue
+            records = store.get_dataset(source, key) or []
+            try:
+                self.write(source, key, records, store.dataset_tag(source, key) or "")
+            except Exception as e:
+                logger.error(f"Error writing snapshot for {source}/{key}: {e}")
+                continue
+            self._written[(source, key)] = version
+            written += 1
+
+        if written:
+            logger.info(f"Wrote {written} facility snapshots to {self.directory}")
+        return written
+
+    def load(self) -> Iterator[Snapshot]:
+        """Yield every readable snapshot of the current format"""
+        for source in FACILITY_SOURCES:
+            source_dir = os.path.join(self.directory, source)
+            if not os.path.isdir(source_dir):
+                continue
+            for name in sorted(os.listdir(source_dir)):
+                if not name.endswith(SNAPSHOT_SUFFIX):
+                    continue
+                path = os.path.join(source_dir, name)
+                try:
+                    with open(path, "rb") as f:
+                        payload = msgpack.unpackb(zlib.decompress(f.read()), raw=False)
+                except Exception as e:
+                    logger.warning(f"Skipping unreadable snapshot {path}: {e}")
+                    continue
+                if payload.get("format") != SNAPSHOT_FORMAT:
+                    logger.info(f"Skipping snapshot {path} in old format {payload.get('format')}")
+                    continue
+                yield Snapshot(
+                    source,
+                    unquote(name[:-len(SNAPSHOT_SUFFIX)]),
+                    payload["records"],
+                    payload.get("tag", ""),
+                    payload["written_at"],
+                )
+
+    def mark_written(self, source: str, key: str, version: int):
+        """Record that a dataset version is already on disk (e.g. just loaded)"""
+        self._written[(source, key)] = version
+
+    async def run_periodic(self, store: FacilityStore, interval: float):
+        """Write changed datasets every interval seconds until cancelled"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(self.write_changed, store)
+            except Exception as e:
+                logger.error(f"Error writing facility snapshots: {e}")
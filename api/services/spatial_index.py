@@ -0,0 +1,327 @@
+"""
+Spatial indexing for in-process geographic lookups
+Keeps utilities bucketed by geohash cell so radius queries only touch
+the cells the search circle overlaps
+"""
+
+import math
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+KM_PER_DEGREE_LAT = 111.32
+
+GEOHASH_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def _geohash_bits(precision: int) -> Tuple[int, int]:
+    """Return the (latitude, longitude) bit counts for a geohash precision"""
+    total_bits = precision * 5
+    return total_bits // 2, total_bits - total_bits // 2
+
+
+def _cell_index(latitude: float, longitude: float, precision: int) -> Tuple[int, int]:
+    """Return the integer (row, column) of the geohash cell containing a point"""
+    lat_bits, lon_bits = _geohash_bits(precision)
+    rows, cols = 1 << lat_bits, 1 << lon_bits
+    row = int((latitude + 90.0) / 180.0 * rows)
+    col = int((longitude + 180.0) / 360.0 * cols)
+    return min(max(row, 0), rows - 1), col % cols
+
+
+def _cell_hash(row: int, col: int, precision: int) -> str:
+    """Interleave a cell's row/column bits into a geohash string"""
+    lat_bits, lon_bits = _geohash_bits(precision)
+    bits = 0
+    for position in range(precision * 5):
+        # Geohash starts with a longitude bit and alternates from there
+        if position % 2 == 0:
+            lon_bits -= 1
+            bit = (col >> lon_bits) & 1
+        else:
+            lat_bits -= 1
+            bit = (row >> lat_bits) & 1
+        bits = (bits << 1) | bit
+
+    chars = []
+    for shift in range(precision * 5 - 5, -1, -5):
+        chars.append(GEOHASH_BASE32[(bits >> shift) & 31])
+    return "".join(chars)
+
+
+def geohash_encode(latitude: float, longitude: float, precision: int = 6) -> str:
+    """
+    Encode a coordinate as a geohash string
+
+    Args:
+        latitude: Latitude in degrees
+        longitude: Longitude in degrees
+        precision: Number of geohash characters
+
+    Returns:
+        Geohash of the cell containing the coordinate
+    """
+    row, col = _cell_index(latitude, longitude, precision)
+    return _cell_hash(row, col, precision)
+
+
+def geohash_decode(geohash: str) -> Tuple[float, float]:
+    """Return the (latitude, longitude) center of a geohash cell"""
+    row = col = 0
+    position = 0
+    for char in geohash:
+        value = GEOHASH_BASE32.index(char)
+        for shift in range(4, -1, -1):
+            bit = (value >> shift) & 1
+            if position % 2 == 0:
+                col = (col << 1) | bit
+            else:
+                row = (row << 1) | bit
+            position += 1
+
+    lat_size, lon_size = geohash_cell_size(len(geohash))
+    return -90.0 + (row + 0.5) * lat_size, -180.0 + (col + 0.5) * lon_size
+
+
+def geohash_cell_size(precision: int) -> Tuple[float, float]:
+    """Return the (latitude, longitude) size in degrees of a geohash cell"""
+    lat_bits, lon_bits = _geohash_bits(precision)
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lon_bits)
+
+
+def bounding_box(latitude: float, longitude: float, radius_km: float) -> Tuple[float, float, float, float]:
+    """
+    Compute the lat/lon bounding box enclosing a search circle
+
+    Returns:
+        Tuple of (min_lat, min_lon, max_lat, max_lon); longitudes may fall
+        outside [-180, 180] when the circle crosses the antimeridian
+    """
+    lat_delta = radius_km / KM_PER_DEGREE_LAT
+    min_lat = max(latitude - lat_delta, -90.0)
+    max_lat = min(latitude + lat_delta, 90.0)
+
+    # Use the widest parallel in the box so the circle is always covered
+    widest = max(abs(min_lat), abs(max_lat))
+    cos_lat = math.cos(math.radians(widest))
+    if cos_lat < 1e-6 or min_lat <= -90.0 or max_lat >= 90.0:
+        return min_lat, -180.0, max_lat, 180.0
+
+    lon_delta = min(radius_km / (KM_PER_DEGREE_LAT * cos_lat), 180.0)
+    return min_lat, longitude - lon_delta, max_lat, longitude + lon_delta
+
+
+def cell_ranges_in_bbox(
+    min_lat: float,
+    min_lon: float,
+    max_lat: float,
+    max_lon: float,
+    precision: int
+) -> Tuple[Tuple[int, int], List[Tuple[int, int]]]:
+    """
+    Inclusive row range and column ranges of the geohash cells overlapping a box
+
+    Args:
+        min_lat: Southern edge of the box
+        min_lon: Western edge of the box (may be < -180 across the antimeridian)
+        max_lat: Northern edge of the box
+        max_lon: Eastern edge of the box (may be > 180 across the antimeridian)
+        precision: Geohash precision of the cells
+
+    Returns:
+        ((row_start, row_end), column ranges); a box crossing the
+        antimeridian has two column ranges
+    """
+    _, lon_bits = _geohash_bits(precision)
+    cols = 1 << lon_bits
+    _, lon_size = geohash_cell_size(precision)
+
+    row_start, _ = _cell_index(min_lat, 0.0, precision)
+    row_end, _ = _cell_index(max_lat, 0.0, precision)
+
+    col_start = int(math.floor((min_lon + 180.0) / lon_size))
+    col_end = int(math.floor((max_lon + 180.0) / lon_size))
+    if col_end - col_start + 1 >= cols:
+        return (row_start, row_end), [(0, cols - 1)]
+
+    col_start, col_end = col_start % cols, col_end % cols
+    if col_start <= col_end:
+        return (row_start, row_end), [(col_start, col_end)]
+    return (row_start, row_end), [(col_start, cols - 1), (0, col_end)]
+
+
+def geohash_cells_in_bbox(
+    min_lat: float,
+    min_lon: float,
+    max_lat: float,
+    max_lon: float,
+    precision: int
+) -> List[str]:
+    """
+    List the geohash cells at a precision that overlap a bounding box
+
+    Enumerates every cell, so keep it to boxes spanning a handful of
+    cells; GeoGridIndex walks its occupied cells for large boxes instead.
+
+    Returns:
+        Geohash strings of every overlapping cell
+    """
+    (row_start, row_end), col_ranges = cell_ranges_in_bbox(min_lat, min_lon, max_lat, max_lon, precision)
+    return [
+        _cell_hash(row, col, precision)
+        for row in range(row_start, row_end + 1)
+        for col_start, col_end in col_ranges
+        for col in range(col_start, col_end + 1)
+    ]
+
+
+def point_in_bbox(
+    latitude: float,
+    longitude: float,
+    min_lat: float,
+    min_lon: float,
+    max_lat: float,
+    max_lon: float
+) -> bool:
+    """Whether a point lies in a box; min_lon > max_lon means it crosses the antimeridian"""
+    if not min_lat <= latitude <= max_lat:
+        return False
+    if min_lon <= max_lon:
+        return min_lon <= longitude <= max_lon
+    return longitude >= min_lon or longitude <= max_lon
+
+
+class GeoGridIndex:
+    """
+    In-process geohash grid index over point records
+
+    Records are plain dicts with at least ``id``, ``latitude`` and
+    ``longitude`` keys. Each record lives in exactly one geohash cell,
+    keyed by its integer (row, column), so a radius query only visits the
+    cells its bounding box overlaps, or only the occupied cells when the
+    box spans more cells than are occupied.
+    """
+
+    def __init__(self, precision: int = 6):
+        self.precision = precision
+        self.version = 0
+        self._cells: Dict[Tuple[int, int], Dict[str, Dict[str, Any]]] = {}
+        self._record_cells: Dict[str, Tuple[int, int]] = {}
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._record_cells)
+
+    def __contains__(self, record_id: str) -> bool:
+        return record_id in self._record_cells
+
+    def get(self, record_id: str) -> Optional[Dict[str, Any]]:
+        """Return an indexed record by ID"""
+        cell = self._record_cells.get(record_id)
+        if cell is None:
+            return None
+        return self._cells[cell].get(record_id)
+
+    def records(self) -> List[Dict[str, Any]]:
+        """Return every indexed record"""
+        with self._lock:
+            return [record for cell in self._cells.values() for record in cell.values()]
+
+    def clear(self):
+        """Drop every indexed record"""
+        with self._lock:
+            self._cells = {}
+            self._record_cells = {}
+            self.version += 1
+
+    def upsert(self, record: Dict[str, Any]):
+        """Insert a record or move it to its new cell"""
+        if record.get("latitude") is None or record.get("longitude") is None:
+            self.remove(record["id"])
+            return
+
+        record_id = record["id"]
+        cell = _cell_index(record["latitude"], record["longitude"], self.precision)
+
+        with self._lock:
+            previous_cell = self._record_cells.get(record_id)
+            if previous_cell is not None and previous_cell != cell:
+                self._discard(previous_cell, record_id)
+
+            self._cells.setdefault(cell, {})[record_id] = record
+            self._record_cells[record_id] = cell
+            self.version += 1
+
+    def bulk_load(self, records: Iterable[Dict[str, Any]]) -> int:
+        """Insert many records; returns the number indexed"""
+        count = 0
+        for record in records:
+            self.upsert(record)
+            count += 1
+        return count
+
+    def remove(self, record_id: str) -> bool:
+        """Remove a record; returns False if it was not indexed"""
+        with self._lock:
+            cell = self._record_cells.pop(record_id, None)
+            if cell is None:
+                return False
+            self._discard(cell, record_id)
+            self.version += 1
+            return True
+
+    def _discard(self, cell: Tuple[int, int], record_id: str):
+        bucket = self._cells.get(cell)
+        if bucket is None:
+            return
+        bucket.pop(record_id, None)
+        if not bucket:
+            del self._cells[cell]
+
+    def candidates_in_bbox(
+        self,
+        min_lat: float,
+        min_lon: float,
+        max_lat: float,
+        max_lon: float
+    ) -> List[Dict[str, Any]]:
+        """Return every record stored in a cell overlapping the bounding box"""
+        (row_start, row_end), col_ranges = cell_ranges_in_bbox(
+            min_lat, min_lon, max_lat, max_lon, self.precision
+        )
+        candidates = []
+        with self._lock:
+            cells = self._cells
+            span = (row_end - row_start + 1) * sum(end - start + 1 for start, end in col_ranges)
+            # Large boxes over sparse data: cost follows the occupied cells, not the area
+            if span > len(cells):
+                for (row, col), bucket in cells.items():
+                    if row_start <= row <= row_end and any(start <= col <= end for start, end in col_ranges):
+                        candidates.extend(bucket.values())
+                return candidates
+            for row in range(row_start, row_end + 1):
+                for col_start, col_end in col_ranges:
+                    for col in range(col_start, col_end + 1):
+                        bucket = cells.get((row, col))
+                        if bucket:
+                            candidates.extend(bucket.values())
+        return candidates
+
+    def query_bbox(
+        self,
+        min_lat: float,
+        min_lon: float,
+        max_lat: float,
+        max_lon: float
+    ) -> List[Dict[str, Any]]:
+        """
+        Return the records inside a bounding box
+
+        Only cells overlapping the box are visited, and records are checked
+        with plain comparisons (no distance math). A box with
+        ``min_lon > max_lon`` is treated as crossing the antimeridian.
+        """
+        cell_max_lon = max_lon + 360.0 if min_lon > max_lon else max_lon
+        return [
+            record for record in self.candidates_in_bbox(min_lat, min_lon, max_lat, cell_max_lon)
+            if point_in_bbox(record["latitude"], record["longitude"], min_lat, min_lon, max_lat, max_lon)
+        ]
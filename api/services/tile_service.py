@@ -0,0 +1,208 @@
+"""
+Mapbox Vector Tile rendering for utilities and federal facilities
+Encodes one MVT layer per data source and caches tiles per data version
+"""
+
+import math
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import mapbox_vector_tile
+
+from services.clustering import lonlat_to_mercator
+from services.dedup import DedupIndex
+from services.delta_sync import DatasetDelta
+from services.facility_store import FacilityStore
+from services.location_service import LocationService
+
+TILE_EXTENT = 4096
+
+# MVT layer name for each federal facility source
+FACILITY_LAYERS = {
+    "hrsa": "health_centers",
+    "va": "va_facilities",
+    "usda": "usda_facilities",
+}
+
+# Facility changes bump the version of every tile containing them up to
+# this zoom; deeper tiles share their ancestor's version, which keeps the
+# version table bounded
+TILE_VERSION_MAX_ZOOM = 12
+
+
+def tile_bounds(z: int, x: int, y: int) -> Tuple[float, float, float, float]:
+    """Return (min_lon, min_lat, max_lon, max_lat) of a slippy-map tile"""
+    n = 1 << z
+    min_lon = x / n * 360.0 - 180.0
+    max_lon = (x + 1) / n * 360.0 - 180.0
+    max_lat = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / n))))
+    min_lat = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * (y + 1) / n))))
+    return min_lon, min_lat, max_lon, max_lat
+
+
+def tile_for(longitude: float, latitude: float, z: int) -> Tuple[int, int]:
+    """Return the (x, y) of the slippy-map tile containing a coordinate"""
+    mx, my = lonlat_to_mercator(longitude, latitude)
+    n = 1 << z
+    return min(max(int(mx * n), 0), n - 1), min(max(int(my * n), 0), n - 1)
+
+
+def _tile_point(longitude: float, latitude: float, z: int, x: int, y: int) -> str:
+    """Project a coordinate into tile-local integer coordinates as WKT"""
+    mx, my = lonlat_to_mercator(longitude, latitude)
+    n = 1 << z
+    px = int(round((mx * n - x) * TILE_EXTENT))
+    py = int(round((my * n - y) * TILE_EXTENT))
+    return f"POINT({px} {py})"
+
+
+def _properties(**values: Any) -> Dict[str, Any]:
+    """Drop None values, which MVT cannot encode"""
+    return {key: value for key, value in values.items() if value is not None}
+
+
+class TileService:
+    """
+    Builds vector tiles on demand and keeps recently served ones in an LRU
+
+    Cache keys include the data version of the utility cluster index and
+    a per-tile facility version, so a write makes the old copies of just
+    the tiles it touched unreachable and they age out of the LRU naturally.
+    """
+
+    def __init__(
+        self,
+        location_service: LocationService,
+        facility_store: FacilityStore,
+        cache_size: int = 4096,
+        max_features_per_layer: int = 5000,
+        dedup: Optional[DedupIndex] = None
+    ):
+        self.location_service = location_service
+        self.facility_store = facility_store
+        # Listings merged into another source's record are not drawn twice
+        self.dedup = dedup
+        self.cache_size = cache_size
+        self.max_features_per_layer = max_features_per_layer
+        self._cache: "OrderedDict[Tuple[int, int, int, Tuple[int, int, int]], bytes]" = OrderedDict()
+        self._tile_versions: Dict[Tuple[int, int, int], int] = {}
+        self._lock = threading.Lock()
+        facility_store.subscribe(self._facilities_changed)
+
+    def data_version(self, z: int, x: int, y: int) -> Tuple[int, int, int]:
+        """Version of everything a tile is rendered from"""
+        if z > TILE_VERSION_MAX_ZOOM:
+            shift = z - TILE_VERSION_MAX_ZOOM
+            z, x, y = TILE_VERSION_MAX_ZOOM, x >> shift, y >> shift
+        return (
+            self.location_service.clusters.version,
+            self._tile_versions.get((z, x, y), 0),
+            self.dedup.version if self.dedup is not None else 0
+        )
+
+    def _facilities_changed(self, delta: DatasetDelta):
+        """Invalidate the tiles containing every changed facility"""
+        tiles = set()
+        for latitude, longitude in delta.points():
+            for z in range(TILE_VERSION_MAX_ZOOM + 1):
+                tiles.add((z, *tile_for(longitude, latitude, z)))
+        with self._lock:
+            for tile in tiles:
+                self._tile_versions[tile] = self._tile_versions.get(tile, 0) + 1
+
+    def get_tile(self, z: int, x: int, y: int) -> bytes:
+        """
+        Return the encoded MVT for a tile, from cache when possible
+
+        Args:
+            z: Zoom level
+            x: Tile column
+            y: Tile row
+
+        Returns:
+            Protobuf-encoded vector tile
+        """
+        key = (z, x, y, self.data_version(z, x, y))
+        with self._lock:
+            tile = self._cache.get(key)
+            if tile is not None:
+                self._cache.move_to_end(key)
+                return tile
+
+        tile = self._render(z, x, y)
+
+        with self._lock:
+            self._cache[key] = tile
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return tile
+
+    def _render(self, z: int, x: int, y: int) -> bytes:
+        min_lon, min_lat, max_lon, max_lat = tile_bounds(z, x, y)
+        layers = [self._utilities_layer(z, x, y, min_lon, min_lat, max_lon, max_lat)]
+        for source, layer_name in FACILITY_LAYERS.items():
+            # Clustered like utilities, so a zoomed-out tile never walks every facility
+            items, _ = self.facility_store.clusters_in_bbox(
+                source, min_lon, min_lat, max_lon, max_lat, z, self.max_features_per_layer
+            )
+            layers.append(self._facility_layer(layer_name, items, z, x, y))
+
+        return mapbox_vector_tile.encode(
+            [layer for layer in layers if layer["features"]],
+            default_options={"extents": TILE_EXTENT, "y_coord_down": True}
+        )
+
+    def _utilities_layer(
+        self, z: int, x: int, y: int,
+        min_lon: float, min_lat: float, max_lon: float, max_lat: float
+    ) -> Dict[str, Any]:
+        # Low zooms get cluster centroids so tile size does not grow with the table
+        items, _ = self.location_service.clusters.query(
+            min_lon, min_lat, max_lon, max_lat, z, self.max_features_per_layer
+        )
+        features = []
+        for item in items:
+            if item["type"] == "cluster":
+                properties = _properties(cluster=True, point_count=item["count"])
+            else:
+                properties = _properties(
+                    id=item["id"],
+                    name=item.get("name"),
+                    category=item.get("category"),
+                    verified=item.get("verified"),
+                    wheelchair_accessible=item.get("wheelchair_accessible")
+                )
+            features.append({
+                "geometry": _tile_point(item["longitude"], item["latitude"], z, x, y),
+                "properties": properties
+            })
+        return {"name": "utilities", "features": features}
+
+    def _facility_layer(
+        self, layer_name: str, items: List[Dict[str, Any]], z: int, x: int, y: int
+    ) -> Dict[str, Any]:
+        features = []
+        for item in items:
+            if item["type"] == "cluster":
+                properties = _properties(cluster=True, point_count=item["count"])
+            else:
+                # Listings merged into another source's record are not drawn twice
+                if self.dedup is not None and self.dedup.is_duplicate(item["id"]):
+                    continue
+                facility = self.facility_store.get(item["id"])
+                if facility is None:
+                    continue
+                properties = _properties(
+                    id=facility["id"],
+                    name=facility.get("name"),
+                    category=facility.get("category"),
+                    subcategory=facility.get("subcategory"),
+                    verified=facility.get("verification", {}).get("verified"),
+                    wheelchair_accessible=facility.get("accessibility", {}).get("wheelchair_accessible")
+                )
+            features.append({
+                "geometry": _tile_point(item["longitude"], item["latitude"], z, x, y),
+                "properties": properties
+            })
+        return {"name": layer_name, "features": features}
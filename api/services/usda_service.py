@@ -6,7 +6,11 @@ Fetches and processes data from United States Department of Agriculture
 import httpx
 import asyncio
 from typing import List, Dict, Any, Optional
-from geopy.distance import geodesic
+from services.cache import NEARBY_CANDIDATE_LIMIT, TieredCache, cached, nearby_cell, nearby_results_exact
+from services.facility_store import FacilityStore
+from services.location_service import rank_by_distance
+from services.spatial_index import geohash_decode
+from services.singleflight import SingleFlight
 import logging
 
 logger = logging.getLogger(__name__)
@@ -14,7 +18,7 @@ logger = logging.getLogger(__name__)
 class USDAService:
     """Service for integrating USDA facility data"""
     
-    def __init__(self):
+    def __init__(self, store: Optional[FacilityStore] = None, cache: Optional[TieredCache] = None):
         self.base_url = "https://www.usda.gov"
         # USDA doesn't have a unified API, so we'll use mock data and web scraping endpoints
         self.endpoints = {
@@ -23,6 +27,9 @@ class USDAService:
             "service_centers": "/api/fsa/service-centers"
         }
         self.session = None
+        self.store = store
+        self.cache = cache
+        self.flight = SingleFlight()
     
     async def get_session(self) -> httpx.AsyncClient:
         """Get or create async HTTP session"""
@@ -61,30 +68,54 @@ class USDAService:
             if facility_types is None:
                 facility_types = ['rural_development', 'snap', 'fsa', 'extension']
             
-            # Since USDA doesn't have a unified API, we'll use mock data for demonstration
-            # In production, you'd implement web scraping or use various USDA department APIs
-            usda_facilities = await self._get_mock_usda_facilities(
-                latitude, longitude, radius_km, facility_types, limit
+            # Candidates are cached per geo-cell so nearby users share them
+            cell = nearby_cell(latitude, longitude, radius_km)
+            usda_facilities = await self._get_nearby_candidates(
+                cell.geohash, cell.radius_km, facility_types
             )
             
-            # Sort by distance
-            user_location = (latitude, longitude)
-            for facility in usda_facilities:
-                if facility.get("latitude") and facility.get("longitude"):
-                    facility_location = (facility["latitude"], facility["longitude"])
-                    distance_km = geodesic(user_location, facility_location).kilometers
-                    facility["distance_km"] = round(distance_km, 2)
+            # Exact distances from this user, then sort and limit results
+            results = rank_by_distance(latitude, longitude, usda_facilities, radius_km, limit)
+            if nearby_results_exact(cell, latitude, longitude, radius_km, usda_facilities, results, limit):
+                return results
             
-            # Sort by distance and limit results
-            usda_facilities.sort(key=lambda x: x.get("distance_km", float('inf')))
-            
-            logger.info(f"Fetched {len(usda_facilities)} USDA facilities")
-            return usda_facilities[:limit]
+            # The cell's set was cut short of this user's reach (dense area)
+            usda_facilities = await self._query_nearby(latitude, longitude, radius_km, facility_types)
+            return rank_by_distance(latitude, longitude, usda_facilities, radius_km, limit)
             
         except Exception as e:
             logger.error(f"Error fetching USDA facilities: {e}")
             return []
     
+    @cached("usda")
+    async def _get_nearby_candidates(
+        self, 
+        geohash: str, 
+        radius_km: float, 
+        facility_types: List[str]
+    ) -> List[Dict[str, Any]]:
+        """USDA facilities within radius_km of a geohash cell's center"""
+        center_lat, center_lon = geohash_decode(geohash)
+        usda_facilities = await self._query_nearby(center_lat, center_lon, radius_km, facility_types)
+        
+        logger.info(f"Fetched {len(usda_facilities)} USDA facilities for cell {geohash}")
+        return usda_facilities
+    
+    async def _query_nearby(
+        self, 
+        latitude: float, 
+        longitude: float, 
+        radius_km: float, 
+        facility_types: List[str]
+    ) -> List[Dict[str, Any]]:
+        """Up to NEARBY_CANDIDATE_LIMIT USDA facilities within radius_km of a point"""
+        # Since USDA doesn't have a unified API, we'll use mock data for demonstration
+        # In production, you'd implement web scraping or use various USDA department APIs
+        return await self._get_mock_usda_facilities(
+            latitude, longitude, radius_km, facility_types, NEARBY_CANDIDATE_LIMIT
+        )
+    
+    @cached("usda")
     async def get_usda_facilities_by_state(
         self, 
         state_code: str, 
@@ -108,12 +139,32 @@ class USDAService:
             all_facilities = await self._get_mock_state_facilities(state_code, facility_types)
             
             logger.info(f"Fetched {len(all_facilities)} USDA facilities for state {state_code}")
+            if self.store is not None:
+                self.store.put_dataset(
+                    "usda", f"{state_code}:{','.join(sorted(facility_types))}", all_facilities
+                )
             return all_facilities
             
         except Exception as e:
             logger.error(f"Error fetching USDA facilities for state {state_code}: {e}")
             return []
     
+    def restore_dataset(self, key: str, usda_facilities: List[Dict[str, Any]], age: float = 0.0):
+        """
+        Load a state's USDA facilities from a snapshot into the store and cache
+        
+        Args:
+            key: Dataset key ('<STATE>:<comma-separated facility types>')
+            usda_facilities: Snapshot records
+            age: Seconds since the snapshot was written
+        """
+        state_code, facility_types = key.split(":", 1)
+        if self.store is not None:
+            self.store.put_dataset("usda", key, usda_facilities)
+        self.get_usda_facilities_by_state.prime(
+            self, state_code, facility_types.split(","), value=usda_facilities, age=age
+        )
+    
     def _transform_usda_data(self, usda_data: Dict[str, Any], facility_type: str) -> Optional[Dict[str, Any]]:
         """
         Transform USDA facility data to UrbanAid format
@@ -436,28 +487,15 @@ class USDAService:
                 }
             })
         
-        # Filter by radius and calculate distances
-        filtered_facilities = []
-        user_location = (latitude, longitude)
-        
-        for facility in mock_facilities:
-            if facility.get("latitude") and facility.get("longitude"):
-                facility_location = (facility["latitude"], facility["longitude"])
-                distance = geodesic(user_location, facility_location).kilometers
-                
-                if distance <= radius_km:
-                    facility["distance_km"] = round(distance, 2)
-                    filtered_facilities.append(facility)
-        
-        # Sort by distance and limit results
-        filtered_facilities.sort(key=lambda x: x["distance_km"])
-        return filtered_facilities[:limit]
+        # Filter by radius, calculate distances, sort and limit results
+        return rank_by_distance(latitude, longitude, mock_facilities, radius_km, limit)
     
     async def _get_mock_state_facilities(self, state_code: str, facility_types: List[str]) -> List[Dict[str, Any]]:
         """Mock facilities by state for demonstration"""
         # This would be replaced with actual USDA data retrieval
         return await self._get_mock_usda_facilities(39.0, -77.0, 1000, facility_types, 100)
     
+    @cached("usda")
     async def get_usda_facility_details(self, facility_id: str) -> Optional[Dict[str, Any]]:
         """
         Get detailed information about a specific USDA facility
@@ -5,19 +5,42 @@ Fetches and processes data from Department of Veterans Affairs
 
 import httpx
 import asyncio
-from typing import List, Dict, Any, Optional
-from geopy.distance import geodesic
+import os
+from typing import AsyncIterator, List, Dict, Any, Optional, Tuple
+from services.cache import NEARBY_CANDIDATE_LIMIT, TieredCache, cached, nearby_cell, nearby_results_exact
+from services.facility_store import FacilityStore
+from services.location_service import rank_by_distance
+from services.pagination import fetch_pages
+from services.spatial_index import geohash_decode
+from services.singleflight import SingleFlight
 import logging
 
 logger = logging.getLogger(__name__)
 
+KM_PER_MILE = 1.60934
+# VA API maximum page size
+VA_PAGE_SIZE = 200
+VA_PAGE_CONCURRENCY = int(os.getenv("VA_PAGE_CONCURRENCY", "4"))
+
+
+def va_total_pages(payload: Dict[str, Any]) -> int:
+    """Read the page count from a VA API response's pagination metadata"""
+    pagination = payload.get("meta", {}).get("pagination", {})
+    return int(pagination.get("total_pages") or pagination.get("totalPages") or 1)
+
 class VAService:
     """Service for integrating VA medical center data"""
     
-    def __init__(self):
+    def __init__(self, store: Optional[FacilityStore] = None, cache: Optional[TieredCache] = None):
         self.base_url = "https://api.va.gov"
         self.facilities_api = "/v0/facilities/va"
         self.session = None
+        self.store = store
+        self.cache = cache
+        self.flight = SingleFlight()
+        # Shared by every paginated walk so concurrent state loads together
+        # stay within the per-host limit
+        self.page_semaphore = asyncio.Semaphore(VA_PAGE_CONCURRENCY)
     
     async def get_session(self) -> httpx.AsyncClient:
         """Get or create async HTTP session"""
@@ -53,43 +76,28 @@ class VAService:
             List of nearby VA facilities
         """
         try:
-            session = await self.get_session()
-            
-            # VA API endpoint for facility search
-            url = f"{self.base_url}{self.facilities_api}"
-            params = {
-                "lat": latitude,
-                "long": longitude,
-                "radius": radius_miles,
-                "type": facility_type,
-                "per_page": limit
-            }
-            
-            response = await session.get(url, params=params)
-            response.raise_for_status()
-            
-            data = response.json()
-            
-            # Transform VA data to UrbanAid format
-            va_facilities = []
-            for facility in data.get("data", []):
-                transformed_facility = self._transform_va_data(facility)
-                if transformed_facility:
-                    va_facilities.append(transformed_facility)
-            
-            # Sort by distance if coordinates are available
-            user_location = (latitude, longitude)
-            for facility in va_facilities:
-                if facility.get("latitude") and facility.get("longitude"):
-                    facility_location = (facility["latitude"], facility["longitude"])
-                    distance_km = geodesic(user_location, facility_location).kilometers
-                    facility["distance_km"] = round(distance_km, 2)
+            # Candidates are cached per geo-cell so nearby users share them
+            cell = nearby_cell(latitude, longitude, radius_miles * KM_PER_MILE)
+            va_facilities = await self._fetch_nearby_va_facilities(
+                cell.geohash, cell.radius_km / KM_PER_MILE, facility_type
+            )
             
-            # Sort by distance and limit results
-            va_facilities.sort(key=lambda x: x.get("distance_km", float('inf')))
-            
-            logger.info(f"Fetched {len(va_facilities)} VA facilities")
-            return va_facilities[:limit]
+            # Exact distances from this user; facilities without coordinates go last
+            ranked = rank_by_distance(
+                latitude, longitude, va_facilities, radius_miles * KM_PER_MILE, limit
+            )
+            if not nearby_results_exact(
+                cell, latitude, longitude, radius_miles * KM_PER_MILE, va_facilities, ranked, limit
+            ):
+                # The cell's page was cut short of this user's reach (dense area)
+                va_facilities = await self._query_nearby_va_facilities(
+                    latitude, longitude, radius_miles, facility_type
+                )
+                ranked = rank_by_distance(
+                    latitude, longitude, va_facilities, radius_miles * KM_PER_MILE, limit
+                )
+            unlocated = [f for f in va_facilities if f.get("latitude") is None]
+            return (ranked + unlocated)[:limit]
             
         except httpx.HTTPStatusError as e:
             logger.error(f"HTTP error fetching VA data: {e}")
@@ -100,6 +108,61 @@ class VAService:
             # Return mock data for demonstration
             return await self._get_mock_va_facilities(latitude, longitude, radius_miles, limit)
     
+    @cached("va")
+    async def _fetch_nearby_va_facilities(
+        self, 
+        geohash: str, 
+        radius_miles: float,
+        facility_type: str
+    ) -> List[Dict[str, Any]]:
+        """
+        Fetch and transform a VA API search around a geohash cell's center
+        
+        Raises on upstream errors so only real responses are cached and the
+        caller can fall back to mock data.
+        """
+        latitude, longitude = geohash_decode(geohash)
+        va_facilities = await self._query_nearby_va_facilities(latitude, longitude, radius_miles, facility_type)
+        logger.info(f"Fetched {len(va_facilities)} VA facilities for cell {geohash}")
+        return va_facilities
+    
+    async def _query_nearby_va_facilities(
+        self, 
+        latitude: float, 
+        longitude: float, 
+        radius_miles: float,
+        facility_type: str
+    ) -> List[Dict[str, Any]]:
+        """One VA API page (NEARBY_CANDIDATE_LIMIT facilities, nearest first) around a point"""
+        session = await self.get_session()
+        
+        # VA API endpoint for facility search
+        url = f"{self.base_url}{self.facilities_api}"
+        params = {
+            "lat": latitude,
+            "long": longitude,
+            "radius": round(radius_miles, 2),
+            "type": facility_type,
+            "per_page": NEARBY_CANDIDATE_LIMIT
+        }
+        
+        response = await session.get(url, params=params)
+        response.raise_for_status()
+        
+        data = response.json()
+        
+        # Transform VA data to UrbanAid format
+        va_facilities = []
+        for facility in data.get("data", []):
+            transformed_facility = self._transform_va_data(facility)
+            if transformed_facility:
+                va_facilities.append(transformed_facility)
+        
+        if self.store is not None:
+            self.store.put_many(f for f in va_facilities if f.get("latitude") is not None)
+        return va_facilities
+    
+    @cached("va")
     async def get_va_facilities_by_state(self, state_code: str, facility_type: str = "health") -> List[Dict[str, Any]]:
         """
         Get VA facilities in a specific state
@@ -112,32 +175,66 @@ class VAService:
             List of VA facilities in the state
         """
         try:
-            session = await self.get_session()
+            params = {"state": state_code.upper(), "type": facility_type}
             
-            url = f"{self.base_url}{self.facilities_api}"
-            params = {
-                "state": state_code.upper(),
-                "type": facility_type,
-                "per_page": 200  # VA API max
-            }
+            # Pages arrive out of order; keep the upstream order in the result
+            pages = {}
+            async for page, va_facilities in self.iter_va_facility_pages(params):
+                pages[page] = va_facilities
+            va_facilities = [f for page in sorted(pages) for f in pages[page]]
             
-            response = await session.get(url, params=params)
-            response.raise_for_status()
+            logger.info(f"Fetched {len(va_facilities)} VA facilities for state {state_code}")
+            if self.store is not None:
+                self.store.put_dataset(
+                    "va", f"{state_code.upper()}:{facility_type}", va_facilities
+                )
+            return va_facilities
             
-            data = response.json()
+        except Exception as e:
+            logger.error(f"Error fetching VA facilities for state {state_code}: {e}")
+            return []
+    
+    async def iter_va_facility_pages(
+        self,
+        params: Dict[str, Any]
+    ) -> AsyncIterator[Tuple[int, List[Dict[str, Any]]]]:
+        """
+        Stream transformed VA facilities for every page of a search
+        
+        Args:
+            params: VA API query parameters (state, type, ...)
             
+        Yields:
+            (page number, transformed facilities) as each page arrives
+        """
+        session = await self.get_session()
+        url = f"{self.base_url}{self.facilities_api}"
+        
+        async for page, data in fetch_pages(
+            session, url, {**params, "per_page": VA_PAGE_SIZE},
+            total_pages=va_total_pages,
+            semaphore=self.page_semaphore
+        ):
             va_facilities = []
             for facility in data.get("data", []):
                 transformed_facility = self._transform_va_data(facility)
                 if transformed_facility:
                     va_facilities.append(transformed_facility)
-            
-            logger.info(f"Fetched {len(va_facilities)} VA facilities for state {state_code}")
-            return va_facilities
-            
-        except Exception as e:
-            logger.error(f"Error fetching VA facilities for state {state_code}: {e}")
-            return []
+            yield page, va_facilities
+    
+    def restore_dataset(self, key: str, va_facilities: List[Dict[str, Any]], age: float = 0.0):
+        """
+        Load a state's VA facilities from a snapshot into the store and cache
+        
+        Args:
+            key: Dataset key ('<STATE>:<facility_type>')
+            va_facilities: Snapshot records
+            age: Seconds since the snapshot was written
+        """
+        state_code, facility_type = key.split(":", 1)
+        if self.store is not None:
+            self.store.put_dataset("va", key, va_facilities)
+        self.get_va_facilities_by_state.prime(self, state_code, facility_type, value=va_facilities, age=age)
     
     def _transform_va_data(self, va_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """
@@ -406,24 +503,11 @@ class VAService:
             }
         ]
         
-        # Filter by radius (convert miles to km for comparison)
-        radius_km = radius_miles * 1.60934
-        filtered_facilities = []
-        user_location = (latitude, longitude)
-        
-        for facility in mock_facilities:
-            if facility.get("latitude") and facility.get("longitude"):
-                facility_location = (facility["latitude"], facility["longitude"])
-                distance = geodesic(user_location, facility_location).kilometers
-                
-                if distance <= radius_km:
-                    facility["distance_km"] = round(distance, 2)
-                    filtered_facilities.append(facility)
-        
-        # Sort by distance and limit results
-        filtered_facilities.sort(key=lambda x: x["distance_km"])
-        return filtered_facilities[:limit]
+        # Filter by radius (convert miles to km for comparison), sort and limit results
+        radius_km = radius_miles * KM_PER_MILE
+        return rank_by_distance(latitude, longitude, mock_facilities, radius_km, limit)
     
+    @cached("va")
     async def get_va_facility_details(self, facility_id: str) -> Optional[Dict[str, Any]]:
         """
         Get detailed information about a specific VA facility
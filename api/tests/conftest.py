@@ -0,0 +1,15 @@
+"""Shared pytest setup: make the api package modules importable"""
+
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Read at import time, so set before any test imports models or jobs:
+# a throwaway database, and Celery jobs run inline against the in-memory
+# broker and cache tier
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp(prefix='urbanaid-tests-')}/urbanaid.db"
+os.environ["CELERY_EAGER"] = "1"
+for name in ("REDIS_URL", "CELERY_BROKER_URL", "CELERY_RESULT_BACKEND"):
+    os.environ.pop(name, None)
@@ -0,0 +1,42 @@
+"""Tests for the TTL + LRU response cache"""
+
+from services.cache import MISSING, TTLCache, _sizeof
+
+
+def entry_bytes(cache: TTLCache) -> int:
+    return sum(size for _, _, size, _ in cache._entries.values())
+
+
+def test_overwriting_a_key_keeps_byte_count_exact():
+    cache = TTLCache(max_entries=100, max_bytes=1024 * 1024)
+    for i in range(50):
+        cache.set("key", {"value": "x" * i}, ttl=60)
+
+    assert len(cache) == 1
+    assert cache._bytes == entry_bytes(cache) == _sizeof({"value": "x" * 49})
+
+
+def test_max_bytes_evicts_least_recently_used():
+    value = "x" * 1000
+    size = _sizeof(value)
+    cache = TTLCache(max_entries=100, max_bytes=size * 3)
+    for _ in range(50):
+        cache.set("a", value, ttl=60)
+    cache.set("b", value, ttl=60)
+    cache.set("c", value, ttl=60)
+    cache.get("a")
+    cache.set("d", value, ttl=60)
+
+    assert cache.get("b") is MISSING
+    assert all(cache.get(key) == value for key in ("a", "c", "d"))
+    assert cache._bytes == entry_bytes(cache) == size * 3
+
+
+def test_delete_and_expiry_release_bytes():
+    cache = TTLCache()
+    cache.set("a", "value", ttl=60)
+    cache.set("b", "value", ttl=0)
+    cache.delete("a")
+
+    assert cache.get("b") is MISSING
+    assert cache._bytes == 0
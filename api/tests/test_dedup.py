@@ -0,0 +1,108 @@
+"""Tests for cross-source deduplication and its one-listing-per-source clusters"""
+
+import random
+
+from services.dedup import _Clusters, compute_merges, find_duplicates, record_source
+
+ORIGIN = (40.7128, -74.0060)
+
+
+def facility(record_id, name, latitude=ORIGIN[0], longitude=ORIGIN[1], phone=None, zip_code=None, **fields):
+    record = {"id": record_id, "name": name, "latitude": latitude, "longitude": longitude, **fields}
+    if phone:
+        record["contact"] = {"phone": phone}
+    if zip_code:
+        record["address"] = {"zip_code": zip_code}
+    return record
+
+
+def group_ids(groups):
+    return sorted(sorted(record["id"] for record in group) for group in groups)
+
+
+def test_clusters_never_join_two_listings_from_one_source():
+    clusters = _Clusters(["hrsa", "va", "hrsa", "usda", "utility", "utility"])
+
+    assert clusters.union(0, 1)
+    # hrsa 2 cannot join the cluster that already holds hrsa 0, directly or through va 1
+    assert not clusters.union(2, 0)
+    assert not clusters.union(1, 2)
+    assert clusters.union(2, 3)
+    # Joining {hrsa 0, va 1} with {hrsa 2, usda 3} would put two HRSA sites together
+    assert not clusters.union(1, 3)
+    assert clusters.union(4, 3)
+    assert not clusters.union(5, 4)
+    assert not clusters.union(0, 1)
+
+    assert sorted(map(sorted, clusters.groups())) == [[0, 1], [2, 3, 4]]
+
+
+def test_same_building_listings_from_one_source_stay_separate():
+    records = [
+        facility("hrsa_1", "Eastside Family Health", phone="(212) 555-0101"),
+        facility("hrsa_2", "Eastside Family Health", phone="212-555-0101"),
+        facility("va_9", "Eastside Family Health Clinic", phone="1 212 555 0101"),
+    ]
+
+    groups = find_duplicates(records)
+
+    assert len(groups) == 1
+    assert sorted(record_source(record) for record in groups[0]) == ["hrsa", "va"]
+
+
+def test_matches_chain_across_sources():
+    records = [
+        # hrsa and va share a phone number on opposite sides of town
+        facility("hrsa_1", "Harbor Point Veterans Clinic", phone="212-555-0199"),
+        facility("va_1", "Harbor Point Veterans Clinic", 40.80, -73.95, phone="212-555-0199"),
+        # usda and a user listing sit next to the va one
+        facility("usda_1", "Harbor Point Veterans Office", 40.8003, -73.9502),
+        facility("7", "Harbor Point Veterans", 40.8001, -73.9499),
+        # A second user listing on the spot stays out of the cluster
+        facility("8", "Public Restroom", 40.8002, -73.9500),
+    ]
+
+    assert group_ids(find_duplicates(records)) == [["7", "hrsa_1", "usda_1", "va_1"]]
+
+
+def test_random_listings_cluster_one_per_source():
+    rng = random.Random(21)
+    names = ["Riverside Health", "Riverside Health Center", "Oak Street Clinic", "Public Restroom"]
+    sources = ["hrsa", "va", "usda", ""]
+    records = []
+    for i in range(1500):
+        source = rng.choice(sources)
+        records.append(facility(
+            f"{source}_{i}" if source else str(i),
+            rng.choice(names),
+            ORIGIN[0] + rng.uniform(-0.01, 0.01),
+            ORIGIN[1] + rng.uniform(-0.01, 0.01),
+            phone=f"212-555-{rng.randint(0, 30):04d}",
+            zip_code=rng.choice(["10001", "10002"]),
+        ))
+
+    groups = find_duplicates(records)
+
+    assert groups
+    seen = set()
+    for group in groups:
+        group_sources = [record_source(record) for record in group]
+        assert len(group_sources) == len(set(group_sources))
+        ids = {record["id"] for record in group}
+        assert not ids & seen
+        seen |= ids
+
+
+def test_compute_merges_keeps_the_most_authoritative_listing():
+    records = [
+        facility("usda_4", "Lakeview Service Center", phone="212-555-0144", services=["snap"], hours="9-5"),
+        facility("hrsa_4", "Lakeview Community Health Center", phone="212-555-0144", services=["primary_care"]),
+    ]
+
+    [merged] = compute_merges(records)
+
+    assert merged["id"] == "hrsa_4"
+    assert merged["duplicate_ids"] == ["usda_4"]
+    assert [entry["source"] for entry in merged["provenance"]] == ["hrsa", "usda"]
+    assert merged["services"] == ["primary_care", "snap"]
+    assert merged["hours"] == "9-5"
@@ -0,0 +1,74 @@
+"""Tests for the federal refresh jobs running eagerly, without a broker"""
+
+import pytest
+
+from ingest.refresh import NationwideRefresher
+from jobs.celery_app import EAGER_REDIS, celery_app
+from jobs.tasks import REFRESH_MAX_RETRIES, RefreshFailed, refresh_all, refresh_dataset
+from models.database import SessionLocal, init_db
+from models.facility import SyncWatermark
+
+USDA_TYPES = "fsa,rural_development,snap"
+
+
+@pytest.fixture(autouse=True)
+def database():
+    init_db()
+    yield
+    db = SessionLocal()
+    try:
+        db.query(SyncWatermark).delete()
+        db.commit()
+    finally:
+        db.close()
+
+
+def watermarks():
+    db = SessionLocal()
+    try:
+        return {(row.source, row.dataset): row.record_count for row in db.query(SyncWatermark)}
+    finally:
+        db.close()
+
+
+def cached_keys(prefix):
+    return [key for key in EAGER_REDIS._data if key.startswith(prefix)]
+
+
+def test_refresh_dataset_runs_inline_and_records_watermark():
+    result = refresh_dataset.apply_async(kwargs={"source": "usda", "state": "ca", "variant": USDA_TYPES})
+
+    assert result.successful()
+    task = result.get()
+    assert (task["source"], task["state"], task["variant"]) == ("usda", "CA", USDA_TYPES)
+    assert task["rows"] > 0 and task["error"] is None
+    # Stored like a worker's result, and readable by job ID
+    assert celery_app.AsyncResult(result.id).result == task
+    assert watermarks()[("usda", f"CA:{USDA_TYPES}")] == task["rows"]
+    assert cached_keys(f"urbanaid:cache:usda:get_usda_facilities_by_state:ca|{USDA_TYPES}")
+
+
+def test_refresh_all_enqueues_one_job_per_dataset():
+    result = refresh_all.apply_async(kwargs={"sources": ["usda"], "states": ["NY", "TX"]})
+
+    assert result.successful()
+    job_ids = result.get()
+    assert len(job_ids) == 2
+    assert all(celery_app.AsyncResult(job_id).successful() for job_id in job_ids)
+    assert set(watermarks()) == {("usda", f"NY:{USDA_TYPES}"), ("usda", f"TX:{USDA_TYPES}")}
+
+
+def test_empty_refresh_is_retried_then_fails(monkeypatch):
+    calls = []
+
+    async def empty_fetch(self, task):
+        calls.append(task.name)
+        return []
+
+    monkeypatch.setattr(NationwideRefresher, "_fetch", empty_fetch)
+    result = refresh_dataset.apply_async(kwargs={"source": "usda", "state": "WA", "variant": USDA_TYPES})
+
+    assert result.failed()
+    assert isinstance(result.result, RefreshFailed)
+    assert len(calls) == REFRESH_MAX_RETRIES + 1
+    assert ("usda", f"WA:{USDA_TYPES}") not in watermarks()
@@ -0,0 +1,129 @@
+"""Tests for the per-category KD-tree index against brute-force haversine"""
+
+import random
+
+import numpy as np
+import pytest
+
+from services.location_service import haversine_km
+from services.nearest_index import NearestNeighborIndex, _CategoryTree, to_unit_sphere
+
+CATEGORIES = ["water_fountain", "restroom", "shelter"]
+
+
+def random_record(rng, record_id, lat_range=(30.0, 45.0), lon_range=(-120.0, -75.0)):
+    return {
+        "id": record_id,
+        "category": rng.choice(CATEGORIES),
+        "latitude": rng.uniform(*lat_range),
+        "longitude": rng.uniform(*lon_range),
+    }
+
+
+def brute_force(records, latitude, longitude, k, category=None, max_distance_km=None):
+    distances = sorted(
+        haversine_km(latitude, longitude, record["latitude"], record["longitude"])
+        for record in records
+        if category is None or record["category"] == category
+    )
+    if max_distance_km is not None:
+        distances = [distance for distance in distances if distance <= max_distance_km]
+    return distances[:k]
+
+
+def assert_matches(matches, expected, records_by_id):
+    assert [distance for distance, _ in matches] == pytest.approx(expected, abs=1e-6)
+    # Every returned record is the live version, not a stale tree copy
+    assert all(record is records_by_id[record["id"]] for _, record in matches)
+
+
+@pytest.fixture
+def churned_index():
+    """An index whose trees carry tombstones and a delta buffer at query time"""
+    rng = random.Random(3)
+    records = {f"u{i}": random_record(rng, f"u{i}") for i in range(4000)}
+    index = NearestNeighborIndex(rebuild_threshold=10_000)
+    index.load(list(records.values()))
+
+    ids = sorted(records)
+    for record_id in rng.sample(ids, 600):
+        # Moves, some across categories
+        records[record_id] = random_record(rng, record_id)
+        index.upsert(records[record_id])
+    for record_id in rng.sample(ids, 400):
+        index.remove(record_id)
+        records.pop(record_id, None)
+    for i in range(300):
+        records[f"new{i}"] = random_record(rng, f"new{i}")
+        index.upsert(records[f"new{i}"])
+
+    trees = index._trees.values()
+    assert all(tree.tombstones and tree.delta for tree in trees)
+    assert len(index) == len(records)
+    return index, records
+
+
+def test_query_matches_brute_force_with_tombstones_and_delta(churned_index):
+    index, records = churned_index
+    rng = random.Random(5)
+    for _ in range(40):
+        latitude, longitude = rng.uniform(30.0, 45.0), rng.uniform(-120.0, -75.0)
+        for category in (None, *CATEGORIES):
+            expected = brute_force(records.values(), latitude, longitude, 10, category)
+            assert_matches(index.query(latitude, longitude, 10, category), expected, records)
+
+
+def test_query_batch_matches_brute_force_with_tombstones_and_delta(churned_index):
+    index, records = churned_index
+    rng = random.Random(6)
+    latitudes = [rng.uniform(30.0, 45.0) for _ in range(60)]
+    longitudes = [rng.uniform(-120.0, -75.0) for _ in range(60)]
+
+    for category, max_distance_km in ((None, None), ("restroom", None), ("shelter", 150.0)):
+        rows = index.query_batch(np.array(latitudes), np.array(longitudes), 8, category, max_distance_km)
+        for latitude, longitude, matches in zip(latitudes, longitudes, rows):
+            expected = brute_force(records.values(), latitude, longitude, 8, category, max_distance_km)
+            assert_matches(matches, expected, records)
+
+
+def test_batch_widens_rows_whose_neighbours_are_tombstoned():
+    rng = random.Random(9)
+    # A dense cluster near the origin that is then almost entirely removed
+    cluster = [random_record(rng, f"c{i}", (40.70, 40.71), (-74.01, -74.00)) for i in range(500)]
+    spread = [random_record(rng, f"s{i}") for i in range(500)]
+    tree = _CategoryTree(rebuild_threshold=10_000)
+    tree.load(cluster + spread)
+    for record in cluster[:495]:
+        tree.remove(record["id"])
+    live = cluster[495:] + spread
+
+    origins = [(40.705, -74.005), (35.0, -100.0)]
+    chords, records = tree.query_batch(to_unit_sphere(*zip(*origins)), 20)
+    for (latitude, longitude), row_chords, row_records in zip(origins, chords, records):
+        expected = brute_force(live, latitude, longitude, 20)
+        found = sorted(
+            haversine_km(latitude, longitude, record["latitude"], record["longitude"])
+            for chord, record in zip(row_chords, row_records) if np.isfinite(chord)
+        )
+        assert found == pytest.approx(expected, abs=1e-6)
+
+
+def test_write_buffer_is_folded_into_a_rebuild():
+    rng = random.Random(12)
+    records = [random_record(rng, f"u{i}") for i in range(200)]
+    tree = _CategoryTree(rebuild_threshold=50)
+    tree.load(records)
+
+    for record in records[:20]:
+        tree.remove(record["id"])
+    # A move both tombstones the tree copy and buffers the new position
+    moved = [random_record(rng, record["id"]) for record in records[20:36]]
+    for record in moved[:15]:
+        tree.upsert(record)
+    assert len(tree.tombstones) == 35 and len(tree.delta) == 15
+    tree.upsert(moved[15])
+
+    # Past the threshold everything lands in the tree and the buffer empties
+    assert not tree.tombstones and not tree.delta
+    assert len(tree) == len(tree.ids) == 180
+    assert {record["id"] for record in tree.records} == {record["id"] for record in moved + records[36:]}
@@ -0,0 +1,101 @@
+"""Tests for the nationwide refresh against the synthetic --mock upstreams"""
+
+import asyncio
+from collections import Counter
+
+import pytest
+
+from ingest.mock_upstream import MockUpstream
+from ingest.refresh import SOURCE_HOSTS, NationwideRefresher
+from services.cache import TieredCache, TTLCache
+from services.facility_store import FacilityStore
+from services.hrsa_service import HRSAService
+from services.usda_service import USDAService
+from services.va_service import VAService
+
+STATES = ["CA", "NY", "TX", "WA", "PR"]
+VA_TYPES = ["health", "benefits"]
+
+
+class TrackingRefresher(NationwideRefresher):
+    """Records the most tasks that were ever in flight per upstream host"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.in_flight = Counter()
+        self.peak = Counter()
+
+    async def _fetch(self, task):
+        host = SOURCE_HOSTS[task.source]
+        self.in_flight[host] += 1
+        self.peak[host] = max(self.peak[host], self.in_flight[host])
+        try:
+            return await super()._fetch(task)
+        finally:
+            self.in_flight[host] -= 1
+
+
+def make_refresher(upstream, **kwargs):
+    store = FacilityStore()
+    cache = TieredCache(TTLCache())
+    hrsa_service = HRSAService(store, cache)
+    va_service = VAService(store, cache)
+    usda_service = USDAService(store, cache)
+    hrsa_service.session = upstream.client()
+    va_service.session = upstream.client()
+    return store, TrackingRefresher(hrsa_service, va_service, usda_service, va_types=VA_TYPES, **kwargs)
+
+
+@pytest.mark.asyncio
+async def test_mock_refresh_loads_every_dataset():
+    upstream = MockUpstream(hrsa_sites_per_state=7, va_facilities_per_state=450, latency=0.001)
+    store, refresher = make_refresher(upstream)
+
+    report = await refresher.run(states=STATES)
+
+    assert not report.failed
+    assert len(report.tasks) == len(STATES) * (2 + len(VA_TYPES))
+    rows = {task.name: task.rows for task in report.tasks}
+    for state in STATES:
+        assert rows[f"hrsa:{state}"] == 7
+        assert len(store.get_dataset("hrsa", state)) == 7
+        for facility_type in VA_TYPES:
+            # 450 facilities span three 200-row pages
+            assert rows[f"va:{state}:{facility_type}"] == 450
+            assert len(store.get_dataset("va", f"{state}:{facility_type}")) == 450
+        assert rows[f"usda:{state}:fsa,rural_development,snap"] > 0
+    assert report.rows == sum(rows.values())
+
+
+@pytest.mark.asyncio
+async def test_mock_refresh_respects_host_limits():
+    upstream = MockUpstream(hrsa_sites_per_state=3, va_facilities_per_state=50, latency=0.01)
+    _, refresher = make_refresher(
+        upstream,
+        max_concurrency=5,
+        host_limits={"data.hrsa.gov": 2, "api.va.gov": 3, "usda": 1},
+    )
+
+    report = await refresher.run(states=STATES)
+
+    assert not report.failed
+    assert refresher.peak["data.hrsa.gov"] <= 2
+    assert refresher.peak["api.va.gov"] <= 3
+    assert refresher.peak["usda"] <= 1
+    assert sum(refresher.in_flight.values()) == 0
+    # The caps limit concurrency without serializing everything
+    assert refresher.peak["api.va.gov"] > 1
+
+
+@pytest.mark.asyncio
+async def test_failed_refresh_keeps_previous_dataset():
+    upstream = MockUpstream(hrsa_sites_per_state=4, latency=0.0)
+    store, refresher = make_refresher(upstream)
+    await refresher.run(sources=["hrsa"], states=["CA"])
+
+    upstream.failure_rate = 1.0
+    report = await refresher.run(sources=["hrsa"], states=["CA"])
+
+    # The service swallows the 503 and returns nothing
+    assert [task.name for task in report.empty] == ["hrsa:CA"]
+    assert len(store.get_dataset("hrsa", "CA")) == 4
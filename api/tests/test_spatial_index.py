@@ -0,0 +1,83 @@
+"""Tests for the geohash grid index against brute-force haversine search"""
+
+import random
+
+import pytest
+
+from services.location_service import haversine_km
+from services.spatial_index import GeoGridIndex, bounding_box, point_in_bbox
+
+
+def random_records(rng, count, lat_range=(-89.9, 89.9), lon_range=(-180.0, 180.0), prefix="u"):
+    return [
+        {"id": f"{prefix}{index}", "latitude": rng.uniform(*lat_range), "longitude": rng.uniform(*lon_range)}
+        for index in range(count)
+    ]
+
+
+def within_radius(index, latitude, longitude, radius_km):
+    return {
+        record["id"]
+        for record in index.candidates_in_bbox(*bounding_box(latitude, longitude, radius_km))
+        if haversine_km(latitude, longitude, record["latitude"], record["longitude"]) <= radius_km
+    }
+
+
+def brute_force(records, latitude, longitude, radius_km):
+    return {
+        record["id"]
+        for record in records
+        if haversine_km(latitude, longitude, record["latitude"], record["longitude"]) <= radius_km
+    }
+
+
+@pytest.mark.parametrize("precision", [4, 5, 6])
+def test_radius_candidates_match_brute_force(precision):
+    rng = random.Random(precision)
+    # A dense city-sized cluster plus points spread over the globe
+    records = random_records(rng, 3000, (40.5, 41.0), (-74.3, -73.7), "city") + random_records(rng, 2000)
+    index = GeoGridIndex(precision)
+    assert index.bulk_load(records) == len(records)
+
+    origins = [(40.75, -73.98), (0.0, 179.99), (0.0, -179.99), (89.5, 10.0), (-89.5, -120.0)]
+    origins += [(rng.uniform(-85, 85), rng.uniform(-180, 180)) for _ in range(20)]
+    for latitude, longitude in origins:
+        for radius_km in (0.5, 5.0, 50.0, 800.0):
+            assert within_radius(index, latitude, longitude, radius_km) == brute_force(records, latitude, longitude, radius_km)
+
+
+def test_bbox_query_across_antimeridian():
+    rng = random.Random(7)
+    records = random_records(rng, 2000, (-30.0, 30.0), (170.0, 180.0))
+    records += random_records(rng, 2000, (-30.0, 30.0), (-180.0, -170.0), "w")
+    index = GeoGridIndex(5)
+    index.bulk_load(records)
+
+    box = (-10.0, 175.0, 10.0, -175.0)
+    expected = {record["id"] for record in records if point_in_bbox(record["latitude"], record["longitude"], *box)}
+    assert expected
+    assert {record["id"] for record in index.query_bbox(*box)} == expected
+
+
+def test_moves_and_removals_stay_consistent():
+    rng = random.Random(11)
+    records = {record["id"]: record for record in random_records(rng, 1000, (30.0, 50.0), (-120.0, -70.0))}
+    index = GeoGridIndex(5)
+    index.bulk_load(records.values())
+
+    for record_id in rng.sample(sorted(records), 300):
+        moved = {**records[record_id], "latitude": rng.uniform(30.0, 50.0), "longitude": rng.uniform(-120.0, -70.0)}
+        records[record_id] = moved
+        index.upsert(moved)
+    for record_id in rng.sample(sorted(records), 200):
+        assert index.remove(record_id)
+        del records[record_id]
+    assert not index.remove("u-missing")
+    # A record that loses its coordinates leaves the index
+    unlocated = next(iter(records))
+    index.upsert({"id": unlocated, "latitude": None, "longitude": None})
+    del records[unlocated]
+
+    assert len(index) == len(records)
+    for latitude, longitude in [(rng.uniform(30.0, 50.0), rng.uniform(-120.0, -70.0)) for _ in range(30)]:
+        assert within_radius(index, latitude, longitude, 300.0) == brute_force(records.values(), latitude, longitude, 300.0)
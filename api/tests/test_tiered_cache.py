@@ -0,0 +1,92 @@
+"""Tests for the L1 + shared L2 response cache, using LocalRedis as the L2"""
+
+import asyncio
+
+import pytest
+
+from services.cache import MISSING, LocalRedis, TieredCache, TTLCache
+
+
+class BrokenRedis:
+    """A Redis client whose server is down"""
+
+    async def _fail(self, *args, **kwargs):
+        raise ConnectionError("redis is down")
+
+    ping = get = set = incr = delete = _fail
+
+    async def aclose(self):
+        pass
+
+
+class CountingFill:
+    def __init__(self, value, delay=0.05):
+        self.value = value
+        self.delay = delay
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return self.value
+
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_across_workers_fill_once():
+    redis = LocalRedis()
+    workers = [TieredCache(TTLCache(), redis) for _ in range(2)]
+    fill = CountingFill({"rows": [1, 2, 3]})
+
+    results = await asyncio.gather(*(
+        cache.get_or_fill("hrsa:state:ca", fill, ttl=60)
+        for cache in workers for _ in range(3)
+    ))
+
+    assert fill.calls == 1
+    assert all(result == {"rows": [1, 2, 3]} for result in results)
+
+
+@pytest.mark.asyncio
+async def test_value_written_by_one_worker_is_read_by_another():
+    redis = LocalRedis()
+    writer, reader = TieredCache(TTLCache(), redis), TieredCache(TTLCache(), redis)
+
+    await writer.set("va:state:ny", ["a", "b"], ttl=60)
+
+    assert reader.l1.get("va:state:ny") is MISSING
+    assert await reader.get("va:state:ny") == ["a", "b"]
+    # Copied into the reader's L1 on the way out
+    assert reader.l1.get("va:state:ny") == ["a", "b"]
+
+
+@pytest.mark.asyncio
+async def test_unreachable_redis_falls_back_to_l1():
+    cache = TieredCache(TTLCache(), BrokenRedis())
+    fill = CountingFill("value", delay=0)
+
+    assert await cache.connect() is False
+    assert not cache.l2_enabled
+    assert await cache.get_or_fill("usda:state:tx", fill, ttl=60) == "value"
+    assert await cache.get_or_fill("usda:state:tx", fill, ttl=60) == "value"
+    assert fill.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_redis_failure_mid_request_falls_back_to_l1():
+    cache = TieredCache(TTLCache(), BrokenRedis())
+    fill = CountingFill("value", delay=0)
+
+    # No connect(): the first L2 call fails and disables L2 for a while
+    assert await cache.get_or_fill("hrsa:state:wa", fill, ttl=60) == "value"
+    assert not cache.l2_enabled
+    assert cache.l1.get("hrsa:state:wa") == "value"
+
+
+@pytest.mark.asyncio
+async def test_generation_bump_is_shared_through_l2():
+    redis = LocalRedis()
+    first, second = TieredCache(TTLCache(), redis), TieredCache(TTLCache(), redis)
+
+    assert await second.generation("hrsa:nearby") == 0
+    assert await first.bump_generation("hrsa:nearby") == 1
+    assert await TieredCache(TTLCache(), redis).generation("hrsa:nearby") == 1